@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'automod (fenêtres glissantes et empreintes de messages)
+
+Simule un flux de discussion réparti sur de nombreux utilisateurs actifs,
+avec quelques spammeurs (flood et messages répétés), et mesure le coût
+par message de automod_check(), les détections (vrais et faux positifs)
+et la mémoire occupée par l'état de l'automod, plafonné à
+AUTOMOD_MAX_USERS utilisateurs.
+
+Usage :
+    python benchmarks/bench_automod.py --messages 1000000 --users 100000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.chdir(BOT_DIR)
+
+import bot  # noqa: E402
+
+CHAT_MESSAGES = [
+    "salut tout le monde",
+    "quelqu'un a testé le nouveau serveur ?",
+    "mdr",
+    "ok",
+    "un message un peu plus long pour ressembler à une vraie discussion sur le serveur",
+    "!ping",
+]
+SPAM_MESSAGES = [
+    "REJOINS MON SERVEUR https://exemple.gg/promo !!!",
+    "rejoins mon serveur   https://exemple.gg/promo",
+    "Rejoiiiins mon serveur https://exemple.gg/promo !",
+]
+
+
+def build_stream(count, users, spammers, rate, seed):
+    """Flux (instant, utilisateur, contenu, spammeur ?) à `rate` messages/s
+
+    Les spammeurs pairs répètent le même message ; les impairs envoient des
+    rafales de messages tous différents (flood).
+    """
+    rng = random.Random(seed)
+    stream = []
+    now = 0.0
+    while len(stream) < count:
+        if spammers and rng.random() < 0.002:
+            spammer = rng.randrange(spammers)
+            for _ in range(bot.AUTOMOD_HISTORY):
+                now += 1.0 / rate
+                content = rng.choice(SPAM_MESSAGES) if spammer % 2 == 0 else f'promo {rng.randrange(10 ** 9)}'
+                stream.append((now, f'spam{spammer}', content, True))
+        else:
+            now += 1.0 / rate
+            stream.append((now, f'user{rng.randrange(users)}', rng.choice(CHAT_MESSAGES), False))
+    return stream[:count]
+
+
+def run_stream(stream):
+    detected = {}
+    false_positives = set()
+    start = time.perf_counter()
+    for now, user_id, content, is_spammer in stream:
+        reason = bot.automod_check(user_id, content, now)
+        if reason is not None:
+            if is_spammer:
+                detected.setdefault(user_id, reason)
+            else:
+                false_positives.add(user_id)
+            # Comme après un mute : l'historique de l'utilisateur repart de zéro
+            bot.automod_users.pop(user_id, None)
+    return time.perf_counter() - start, detected, false_positives
+
+
+def measure_memory(users):
+    """Mémoire de l'état automod pour `users` utilisateurs actifs ; retourne (octets, instant final)"""
+    bot.automod_users.clear()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    now = 0.0
+    for i in range(users):
+        # Les tableaux circulaires sont alloués pleins : un message suffit
+        now += 0.0001
+        bot.automod_check(f'mem{i}', CHAT_MESSAGES[i % len(CHAT_MESSAGES)], now)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, 'filename')), now
+
+
+def main(args):
+    bot.AUTOMOD_MAX_USERS = args.max_users
+
+    stream = build_stream(args.messages, args.users, args.spammers, args.rate, args.seed)
+    elapsed, detected, false_positives = run_stream(stream)
+    print(f'[BENCH] {args.messages:,} messages ({args.users:,} utilisateurs, {args.spammers} spammeurs) : '
+          f'{elapsed * 1e9 / args.messages:,.0f} ns/message ({args.messages / elapsed:,.0f} msg/s)')
+    reasons = {}
+    for reason in detected.values():
+        reasons[reason] = reasons.get(reason, 0) + 1
+    print(f'        spammeurs détectés : {len(detected)}/{args.spammers} '
+          f"({', '.join(f'{reason}={count}' for reason, count in sorted(reasons.items())) or 'aucun'}), "
+          f'faux positifs : {len(false_positives)}')
+    print(f"        utilisateurs suivis : {len(bot.automod_users):,}, évincés : {bot.automod_stats['evicted']:,}")
+
+    size, now = measure_memory(args.max_users)
+    print(f'[BENCH] Mémoire pour {len(bot.automod_users):,} utilisateurs actifs : {size / (1024 * 1024):.1f} Mo '
+          f'({size / max(1, len(bot.automod_users)):.0f} octets/utilisateur)')
+
+    evicted = bot.automod_stats['evicted']
+    for i in range(args.max_users // 2):
+        bot.automod_check(f'extra{i}', 'salut', now + i * 0.0001)
+    print(f'[BENCH] Après {args.max_users // 2:,} nouveaux utilisateurs : {len(bot.automod_users):,} suivis '
+          f"(plafond {args.max_users:,}), {bot.automod_stats['evicted'] - evicted:,} évincés")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1_000_000, help='messages à analyser')
+    parser.add_argument('--users', type=int, default=100_000, help='utilisateurs distincts')
+    parser.add_argument('--spammers', type=int, default=20, help='spammeurs dans le flux')
+    parser.add_argument('--rate', type=float, default=200.0, help='débit simulé (messages/s)')
+    parser.add_argument('--max-users', type=int, default=100_000, help='plafond d\'utilisateurs suivis')
+    parser.add_argument('--seed', type=int, default=1, help='graine du flux synthétique')
+    main(parser.parse_args())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark du routage des commandes
+
+Compare le coût par message de l'ancienne chaîne if/elif de startswith()
+avec la table COMMANDS (resolve_command) sur un flux réaliste : surtout
+de la discussion, quelques commandes.
+
+Usage :
+    python benchmarks/bench_command_dispatch.py --messages 200000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.chdir(BOT_DIR)
+
+import bot  # noqa: E402
+
+SAMPLE_MESSAGES = [
+    "salut tout le monde",
+    "quelqu'un a testé le nouveau serveur ?",
+    "mdr",
+    "!ping",
+    "!aide",
+    "!ban <@01KHCAG6RSNPY7DE9MDEVYKRFD> 1d Spam massif",
+    "!warnings <@01KHCAG6RSNPY7DE9MDEVYKRFD>",
+    "!inconnue avec des arguments",
+    "un message un peu plus long pour ressembler à une vraie discussion sur le serveur",
+]
+
+
+def legacy_chain(content):
+    """Ancienne chaîne de on_message (ordre d'origine, !warnings inaccessible)"""
+    if content.startswith('!ping'):
+        return 'ping'
+    elif content.startswith('!aide') or content.startswith('!help'):
+        return 'aide'
+    elif content.startswith('!moderation'):
+        return 'moderation'
+    elif content.startswith('!clear'):
+        return 'clear'
+    elif content.startswith('!ban'):
+        return 'ban'
+    elif content.startswith('!mute'):
+        return 'mute'
+    elif content.startswith('!unban'):
+        return 'unban'
+    elif content.startswith('!warn'):
+        return 'warn'
+    elif content.startswith('!warnings'):
+        return 'warnings'
+    return None
+
+
+def table_dispatch(content):
+    resolved = bot.resolve_command(content)
+    return resolved[0]['name'] if resolved else None
+
+
+def measure(label, func, messages):
+    start = time.perf_counter()
+    for content in messages:
+        func(content)
+    elapsed = time.perf_counter() - start
+    print(f'[BENCH] {label:<22} {elapsed / len(messages) * 1e9:8.0f} ns/message')
+
+
+def main(args):
+    rng = random.Random(42)
+    weights = [30, 20, 20, 3, 2, 1, 1, 3, 20]
+    messages = rng.choices(SAMPLE_MESSAGES, weights=weights, k=args.messages)
+    print(f'[BENCH] !warnings → ancienne chaîne: {legacy_chain("!warnings <@x>")}, '
+          f'table: {table_dispatch("!warnings <@x>")}')
+    for _ in range(args.rounds):
+        measure('Chaîne if/elif', legacy_chain, messages)
+        measure('Table COMMANDS', table_dispatch, messages)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200_000, help='messages simulés')
+    parser.add_argument('--rounds', type=int, default=3, help='nombre de passes')
+    main(parser.parse_args())
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Benchmark des handlers du bot avec un faux client Stoat
+
+Remplace bot.client par le client en mémoire de fake_stoat (latence REST
+et rate limit simulés), puis fait passer un flux d'événements synthétiques
+par les vrais handlers : discussion, commandes, soumissions, réactions de
+modération, arrivées et départs. Rapporte le débit (événements/s), les
+percentiles de latence par handler et le nombre d'appels REST par
+événement, et compare à une référence enregistrée pour repérer les
+régressions.
+
+Usage :
+    python benchmarks/bench_handlers.py --events 1000 --latency 0.02
+    python benchmarks/bench_handlers.py --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.chdir(BOT_DIR)
+
+import bot  # noqa: E402
+import fake_stoat  # noqa: E402
+
+BASELINE_PATH = os.path.join(BOT_DIR, 'benchmarks', 'baselines', 'handlers.json')
+
+SERVER_ID = 'BENCHSERVER'
+SUBMISSION_CHANNEL_ID = 'BENCHSUBMISSIONS'
+NOTIFICATION_CHANNEL_ID = 'BENCHNOTIFICATIONS'
+CHAT_CHANNEL_IDS = [f'BENCHCHAT{i}' for i in range(10)]
+MODERATOR_ROLE_ID = 'BENCHMODERATOR'
+
+# Répartition du flux : surtout de la discussion, comme sur le vrai serveur
+EVENT_MIX = {
+    'chat': 70,
+    'command': 10,
+    'submission': 6,
+    'reaction': 6,
+    'join': 4,
+    'leave': 4,
+}
+
+CHAT_MESSAGES = [
+    "salut tout le monde",
+    "quelqu'un a testé le nouveau serveur ?",
+    "mdr",
+    "un message un peu plus long pour ressembler à une vraie discussion sur le serveur",
+]
+COMMAND_MESSAGES = ["!ping", "!aide", "!moderation", "!inconnue"]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def setup_bot(rest):
+    """Branche le faux client et des IDs de test sur le module bot"""
+    fake = fake_stoat.FakeClient(SERVER_ID, rest)
+    bot.client = fake
+    bot.SERVER_ID = SERVER_ID
+    bot.SUBMISSION_CHANNEL_ID = SUBMISSION_CHANNEL_ID
+    bot.NOTIFICATION_CHANNEL_ID = NOTIFICATION_CHANNEL_ID
+    bot.MODERATOR_ROLE_1 = MODERATOR_ROLE_ID
+    bot.MISTRAL_API_KEY = None
+    # Les journaux ne doivent ni fausser la mesure ni inonder la console
+    bot.logger.handlers[:] = [logging.NullHandler()]
+    bot.logger.propagate = False
+    return fake
+
+
+class Scenario:
+    """Génère le flux d'événements et garde l'état nécessaire (membres, soumissions)"""
+
+    def __init__(self, fake, users, seed):
+        self.fake = fake
+        self.random = random.Random(seed)
+        self.users = [fake_stoat.FakeUser(name=f'membre{i}') for i in range(users)]
+        self.moderators = [fake.server.add_member(fake_stoat.FakeUser(name=f'modo{i}'), [MODERATOR_ROLE_ID])
+                           for i in range(3)]
+        for user in self.users:
+            fake.server.add_member(user)
+        self.reacted = set()
+
+    def next_event(self):
+        kind = self.random.choices(list(EVENT_MIX), weights=list(EVENT_MIX.values()))[0]
+        waiting = [message_id for message_id in bot.pending_submissions if message_id not in self.reacted]
+        if kind == 'reaction' and not waiting:
+            kind = 'submission'
+        author = self.random.choice(self.users)
+        if kind == 'chat':
+            return kind, fake_stoat.message_event(self.fake, self.random.choice(CHAT_CHANNEL_IDS), author,
+                                                  self.random.choice(CHAT_MESSAGES))
+        if kind == 'command':
+            return kind, fake_stoat.message_event(self.fake, self.random.choice(CHAT_CHANNEL_IDS), author,
+                                                  self.random.choice(COMMAND_MESSAGES))
+        if kind == 'submission':
+            return kind, fake_stoat.message_event(self.fake, SUBMISSION_CHANNEL_ID, author,
+                                                  f"Mon serveur https://exemple.gg/{self.random.randrange(10 ** 6)}")
+        if kind == 'reaction':
+            message_id = waiting[0]
+            self.reacted.add(message_id)
+            moderator = self.random.choice(self.moderators)
+            emoji = self.random.choice(('✅', '❌'))
+            return kind, fake_stoat.reaction_event(SUBMISSION_CHANNEL_ID, message_id, moderator.id, emoji)
+        member = self.fake.server.add_member(fake_stoat.FakeUser(name='nouveau'))
+        if kind == 'join':
+            return kind, fake_stoat.member_join_event(member)
+        return kind, fake_stoat.member_remove_event(SERVER_ID, member)
+
+
+# Handlers enregistrés pour chaque type d'événement (comme le dispatch de stoat.py)
+HANDLERS = {
+    'chat': (bot.on_message,),
+    'command': (bot.on_message,),
+    'submission': (bot.on_message,),
+    'reaction': (bot.on_reaction,),
+    'join': (bot.on_member_join,),
+    'leave': (bot.on_member_remove, bot.on_member_remove_cache),
+}
+
+
+async def run_stream(args):
+    rest = fake_stoat.FakeRest(args.latency, args.rate_limit, args.window, bot.learn_outbound_ratelimit)
+    fake = setup_bot(rest)
+    scenario = Scenario(fake, args.users, args.seed)
+    latencies = {}  # Format: {handler: [secondes]}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def dispatch(handler, event):
+        start = time.perf_counter()
+        await handler(event)
+        latencies.setdefault(handler.__name__, []).append(time.perf_counter() - start)
+
+    async def deliver(kind, event):
+        try:
+            # stoat.py lance chaque handler dans sa propre tâche
+            await asyncio.gather(*(dispatch(handler, event) for handler in HANDLERS[kind]))
+        finally:
+            semaphore.release()
+
+    start = time.perf_counter()
+    tasks = []
+    for _ in range(args.events):
+        # Flux généré au fil de l'eau : une réaction ne vise qu'une soumission déjà enregistrée
+        await semaphore.acquire()
+        kind, event = scenario.next_event()
+        tasks.append(asyncio.create_task(deliver(kind, event)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    for route in bot.outbound_routes.values():
+        if route['worker'] is not None:
+            route['worker'].cancel()
+
+    handlers = {}
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        handlers[name] = {
+            'count': len(values),
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+        }
+    return {
+        'params': {key: getattr(args, key) for key in
+                   ('events', 'users', 'latency', 'rate_limit', 'window', 'concurrency', 'seed')},
+        'events_per_second': args.events / elapsed if elapsed > 0 else 0.0,
+        'rest_calls_per_event': rest.total_calls / args.events,
+        'rest_throttled': rest.throttled,
+        'handlers': handlers,
+    }
+
+
+def print_report(result):
+    print(f"[BENCH] {result['params']['events']:,} événements : {result['events_per_second']:,.0f} évén./s")
+    print(f"        appels REST par événement : {result['rest_calls_per_event']:.2f} "
+          f"(attentes de rate limit : {result['rest_throttled']})")
+    for name, stats in result['handlers'].items():
+        print(f"        {name:<24} n={stats['count']:<6} p50 {stats['p50_ms']:7.1f} ms  "
+              f"p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms")
+
+
+def compare_with_baseline(result, baseline, tolerance):
+    """Affiche les écarts à la référence ; retourne la liste des régressions"""
+    regressions = []
+
+    def check(label, current, reference, higher_is_better=False, floor=0.0):
+        if not reference:
+            return
+        delta = (current - reference) / reference
+        worse = -delta if higher_is_better else delta
+        # En dessous du plancher, l'écart est du bruit de mesure
+        flag = ' ← RÉGRESSION' if worse > tolerance and abs(current - reference) > floor else ''
+        print(f"        {label:<40} {reference:9.2f} → {current:9.2f} ({delta:+.0%}){flag}")
+        if flag:
+            regressions.append(label)
+
+    if baseline['params'] != result['params']:
+        print('[BENCH] Attention : paramètres différents de la référence, comparaison indicative')
+    print('[BENCH] Comparaison avec la référence')
+    check('événements/s', result['events_per_second'], baseline['events_per_second'], higher_is_better=True)
+    check('appels REST/événement', result['rest_calls_per_event'], baseline['rest_calls_per_event'])
+    for name, stats in result['handlers'].items():
+        reference = baseline['handlers'].get(name)
+        if reference is not None:
+            check(f'{name} p95 (ms)', stats['p95_ms'], reference['p95_ms'], floor=1.0)
+    return regressions
+
+
+def main(args):
+    result = asyncio.run(run_stream(args))
+    print_report(result)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f'[BENCH] Référence enregistrée dans {os.path.relpath(BASELINE_PATH, BOT_DIR)}')
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print('[BENCH] Pas de référence : lancez avec --save-baseline pour en créer une')
+        return 0
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(result, baseline, args.tolerance)
+    if regressions:
+        print(f'[BENCH] {len(regressions)} régression(s) au-delà de {args.tolerance:.0%}')
+        return 1
+    print('[BENCH] Aucune régression')
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=1000, help='événements à injecter')
+    parser.add_argument('--users', type=int, default=500, help='membres distincts')
+    parser.add_argument('--latency', type=float, default=0.02, help='latence REST simulée (s)')
+    parser.add_argument('--rate-limit', type=int, default=10, help='appels autorisés par route et par fenêtre')
+    parser.add_argument('--window', type=float, default=1.0, help='durée de la fenêtre de rate limit (s)')
+    parser.add_argument('--concurrency', type=int, default=50, help='événements traités simultanément')
+    parser.add_argument('--seed', type=int, default=1, help='graine du flux synthétique')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='écart toléré avant de signaler une régression')
+    parser.add_argument('--save-baseline', action='store_true', help='enregistrer le résultat comme référence')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark du client Mistral asynchrone
+
+Lance un faux serveur Mistral local (réponses lentes), envoie plusieurs
+questions IA en parallèle et mesure pendant ce temps le retard d'un
+"battement" qui simule les autres événements du bot (modération,
+réactions, bienvenue). Compare avec un appel bloquant simulé, qui
+reproduit l'ancien comportement de requests.post dans la boucle.
+
+Usage :
+    python benchmarks/bench_mistral.py --requests 5 --delay 2
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import itertools
+import statistics
+
+from aiohttp import web
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.chdir(BOT_DIR)
+
+import bot  # noqa: E402
+
+TICK_SECONDS = 0.01
+
+
+async def fake_completion(request):
+    """Réponse Mistral factice après un délai configurable"""
+    await asyncio.sleep(request.app['delay'])
+    return web.json_response({
+        "choices": [{"message": {"content": "Réponse de test"}}]
+    })
+
+
+async def start_fake_server(delay):
+    """Démarre le faux serveur Mistral et retourne (runner, url)"""
+    app = web.Application()
+    app['delay'] = delay
+    app.router.add_post('/v1/chat/completions', fake_completion)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/v1/chat/completions'
+
+
+async def heartbeat(stop_event, lags):
+    """Simule les autres événements : mesure le retard de chaque tick"""
+    while not stop_event.is_set():
+        expected = time.perf_counter() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+
+async def blocking_request(delay):
+    """Ancien comportement : appel HTTP synchrone dans la coroutine"""
+    time.sleep(delay)
+    return "Réponse de test"
+
+
+async def run_scenario(label, make_request, count):
+    """Exécute `count` requêtes IA en parallèle et mesure le retard de la boucle"""
+    lags = []
+    stop_event = asyncio.Event()
+    ticker = asyncio.create_task(heartbeat(stop_event, lags))
+    await asyncio.sleep(TICK_SECONDS * 5)
+    start = time.perf_counter()
+    await asyncio.gather(*(make_request() for _ in range(count)))
+    elapsed = time.perf_counter() - start
+    stop_event.set()
+    await ticker
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    print(f'[BENCH] {label}')
+    print(f'        {count} requêtes IA en {elapsed:.2f} s')
+    print(f'        événements traités pendant ce temps : {len(lags)}')
+    if lags:
+        print(f'        retard boucle médian : {statistics.median(lags):.1f} ms, '
+              f'p99 : {p99:.1f} ms, max : {lags[-1]:.1f} ms')
+
+
+async def main(args):
+    runner, url = await start_fake_server(args.delay)
+    bot.MISTRAL_API_URL = url
+    bot.MISTRAL_API_KEY = 'benchmark'
+    # Questions distinctes : le cache de réponses ne doit pas fausser la mesure
+    questions = itertools.count()
+    try:
+        await run_scenario(
+            'Client aiohttp (pool keep-alive)',
+            lambda: bot.get_mistral_response(f"Question de test {next(questions)}"),
+            args.requests
+        )
+        if not args.skip_blocking:
+            await run_scenario(
+                'Appel bloquant simulé (ancien requests.post)',
+                lambda: blocking_request(args.delay),
+                args.requests
+            )
+    finally:
+        await bot.close_mistral_session()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5, help='requêtes IA simultanées')
+    parser.add_argument('--delay', type=float, default=2.0, help='latence du faux Mistral (s)')
+    parser.add_argument('--skip-blocking', action='store_true', help='ne pas lancer le scénario bloquant')
+    asyncio.run(main(parser.parse_args()))
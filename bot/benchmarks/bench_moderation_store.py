@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la base de modération (SQLite WAL + écriture différée)
+
+Insère N avertissements via add_warning() avec flush groupé, recharge la
+base comme au redémarrage, puis mesure les lectures : chemin chaud en
+mémoire (get_user_warnings, test de ban) et requêtes SQLite indexées par
+user_id et par expires_at.
+
+Usage :
+    python benchmarks/bench_moderation_store.py --warnings 1000000 --users 50000
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.chdir(BOT_DIR)
+
+import bot  # noqa: E402
+
+
+def rate(count, seconds):
+    return f'{count / seconds:,.0f} op/s' if seconds > 0 else 'n/a'
+
+
+async def insert_warnings(count, users):
+    """Insère les avertissements par la même API que !warn"""
+    start = time.perf_counter()
+    for i in range(count):
+        bot.add_warning(f'user{i % users}', 'Spam répétitif', 'benchmark')
+        if len(bot.moderation_pending_writes) >= bot.MODERATION_FLUSH_BATCH_SIZE:
+            await bot.flush_moderation_store()
+    await bot.flush_moderation_store()
+    return time.perf_counter() - start
+
+
+def insert_sanctions(count):
+    """Ajoute des bans temporaires pour exercer l'index sur expires_at"""
+    now = time.time()
+    for i in range(count):
+        bot.set_sanction('ban', f'banned{i}', {
+            'reason': 'benchmark',
+            'duration': 3600,
+            'expires_at': now + random.randint(60, 86400),
+            'banned_by': 'benchmark'
+        })
+    bot.flush_moderation_store_sync()
+
+
+def main(args):
+    bot.MODERATION_FLUSH_BATCH_SIZE = args.batch
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'moderation.db')
+        bot.open_moderation_store(path)
+
+        elapsed = asyncio.run(insert_warnings(args.warnings, args.users))
+        print(f'[BENCH] Insertion de {args.warnings:,} avertissements : {elapsed:.2f} s '
+              f'({rate(args.warnings, elapsed)}, lots de {args.batch})')
+        insert_sanctions(args.sanctions)
+
+        bot.moderation_db.close()
+        start = time.perf_counter()
+        bot.open_moderation_store(path)
+        bot.load_moderation_store()
+        elapsed = time.perf_counter() - start
+        print(f'[BENCH] Rechargement complet (redémarrage) : {elapsed:.2f} s')
+
+        user_ids = [f'user{random.randrange(args.users)}' for _ in range(args.lookups)]
+        start = time.perf_counter()
+        for user_id in user_ids:
+            bot.get_user_warnings(user_id)
+            _ = user_id in bot.banned_users
+        elapsed = time.perf_counter() - start
+        print(f'[BENCH] Lecture en mémoire (chemin chaud) : {rate(args.lookups, elapsed)}')
+
+        sql_lookups = min(args.lookups, 20000)
+        start = time.perf_counter()
+        for user_id in user_ids[:sql_lookups]:
+            bot.moderation_db.execute(
+                "SELECT reason, warned_by, timestamp FROM warnings WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        elapsed = time.perf_counter() - start
+        print(f'[BENCH] Lecture SQLite par user_id (index) : {rate(sql_lookups, elapsed)}')
+
+        start = time.perf_counter()
+        expiring = bot.moderation_db.execute(
+            "SELECT COUNT(*) FROM sanctions WHERE expires_at <= ?", (time.time() + 3600,)
+        ).fetchone()[0]
+        elapsed = time.perf_counter() - start
+        print(f'[BENCH] Sanctions expirant dans l\'heure (index expires_at) : '
+              f'{expiring} en {elapsed * 1000:.2f} ms')
+
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f'[BENCH] Taille de la base : {size_mb:.1f} Mo')
+        bot.moderation_db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--warnings', type=int, default=1_000_000, help='avertissements à insérer')
+    parser.add_argument('--users', type=int, default=50_000, help='utilisateurs distincts')
+    parser.add_argument('--sanctions', type=int, default=10_000, help='bans temporaires à insérer')
+    parser.add_argument('--lookups', type=int, default=200_000, help='lectures à mesurer')
+    parser.add_argument('--batch', type=int, default=5000, help='taille des lots d\'écriture')
+    main(parser.parse_args())
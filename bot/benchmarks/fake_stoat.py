@@ -0,0 +1,253 @@
+"""
+Faux client Stoat en mémoire pour les benchmarks
+
+Reproduit la petite partie de l'API utilisée par les handlers du bot
+(canaux, messages, serveur, membres, réactions, historique) sans réseau.
+Chaque appel REST passe par FakeRest, qui simule une latence fixe et une
+limite de débit par route (fenêtre fixe, comme les buckets Stoat), et
+transmet les en-têtes x-ratelimit-* à la file sortante du bot comme le
+ferait OutboundRateLimiter.
+"""
+import asyncio
+import itertools
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import stoat
+
+_ids = itertools.count(1)
+
+
+def new_id():
+    """ID factice de 26 caractères, croissant comme un ULID"""
+    return f'{next(_ids):026d}'
+
+
+class FakeRest:
+    """Latence et rate limit simulés, avec compteurs par route"""
+
+    def __init__(self, latency=0.02, limit=10, window=10.0, learn=None):
+        self.latency = latency
+        self.limit = limit
+        self.window = window
+        self.learn = learn
+        self.buckets = {}  # Format: {route: [restants, fin de fenêtre]}
+        self.calls = {}
+        self.throttled = 0
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    async def call(self, method, route_key):
+        now = time.monotonic()
+        bucket = self.buckets.get(route_key)
+        if bucket is None or now >= bucket[1]:
+            bucket = self.buckets[route_key] = [self.limit, now + self.window]
+        if bucket[0] <= 0:
+            # Le limiteur de stoat.py attendrait la fin de la fenêtre avant d'envoyer
+            self.throttled += 1
+            await asyncio.sleep(bucket[1] - now)
+            bucket[0], bucket[1] = self.limit, time.monotonic() + self.window
+        bucket[0] -= 1
+        self.calls[(method, route_key)] = self.calls.get((method, route_key), 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.learn is not None:
+            self.learn(route_key, {
+                'x-ratelimit-limit': str(self.limit),
+                'x-ratelimit-remaining': str(bucket[0]),
+                'x-ratelimit-reset-after': str(int(max(0.0, bucket[1] - time.monotonic()) * 1000))
+            })
+
+
+class FakeUser:
+    def __init__(self, user_id=None, name='utilisateur', bot=False, relationship=stoat.RelationshipStatus.none):
+        self.id = user_id or new_id()
+        self.name = name
+        self.bot = bot
+        self.relationship = relationship
+
+    @property
+    def mention(self):
+        return f'<@{self.id}>'
+
+
+class FakeMessage:
+    def __init__(self, client, channel, author, content, mentions=(), message_id=None):
+        self.client = client
+        self.id = message_id or new_id()
+        self.channel = channel
+        self.channel_id = channel.id
+        self.author = author
+        self.author_id = author.id
+        self.content = content
+        self.mentions = list(mentions)
+        self.reactions = {}  # Format: {emoji: (user_id, ...)}
+        self.created_at = datetime.now(timezone.utc)
+
+    def get_author(self):
+        return self.author
+
+    @property
+    def mention_ids(self):
+        return [user.id for user in self.mentions]
+
+    async def delete(self):
+        await self.client.rest.call('DELETE', f'channels/{self.channel.id}')
+        self.channel.messages.pop(self.id, None)
+
+    async def edit(self, content=None):
+        await self.client.rest.call('PATCH', f'channels/{self.channel.id}')
+        if content is not None:
+            self.content = content
+        return self
+
+
+class FakeChannel:
+    def __init__(self, client, channel_id=None):
+        self.client = client
+        self.id = channel_id or new_id()
+        self.messages = {}
+
+    async def send(self, content=None, **kwargs):
+        await self.client.rest.call('POST', f'messaging/{self.id}')
+        message = FakeMessage(self.client, self, self.client.user, content or '')
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id):
+        await self.client.rest.call('GET', f'channels/{self.id}')
+        message = self.messages.get(message_id)
+        if message is None:
+            raise LookupError(f'Message inconnu: {message_id}')
+        return message
+
+    async def add_reaction(self, message_id, emoji):
+        await self.client.rest.call('PUT', f'channels/{self.id}')
+        self.client.record_reaction(self.id, message_id, emoji)
+
+
+class FakeMember(FakeUser):
+    def __init__(self, client, server, user, role_ids=()):
+        super().__init__(user.id, user.name, user.bot, user.relationship)
+        self.client = client
+        self.server = server
+        self.server_id = server.id
+        self.role_ids = list(role_ids)
+        self.is_owner = False
+
+    @property
+    def roles(self):
+        return [SimpleNamespace(id=role_id) for role_id in self.role_ids]
+
+    async def edit(self, *, roles=None, **kwargs):
+        await self.client.rest.call('PATCH', f'servers/{self.server.id}')
+        if roles is not None:
+            self.role_ids = [getattr(role, 'id', role) for role in roles]
+        return self
+
+
+class FakeServer:
+    def __init__(self, client, server_id):
+        self.client = client
+        self.id = server_id
+        self.members = {}
+
+    def add_member(self, user, role_ids=()):
+        member = FakeMember(self.client, self, user, role_ids)
+        self.members[user.id] = member
+        return member
+
+    async def fetch_member(self, user_id):
+        await self.client.rest.call('GET', f'servers/{self.id}')
+        member = self.members.get(user_id)
+        if member is None:
+            raise LookupError(f'Membre inconnu: {user_id}')
+        return member
+
+
+class FakeHTTP:
+    """Sous-ensemble de client.http utilisé par !clear"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def get_messages(self, channel_id, *, limit=100, before=None, after=None, sort=None, **kwargs):
+        await self.client.rest.call('GET', f'channels/{channel_id}')
+        channel = self.client.channels[channel_id]
+        messages = sorted(channel.messages.values(), key=lambda m: m.id, reverse=sort != stoat.MessageSort.oldest)
+        if before is not None:
+            messages = [m for m in messages if m.id < before]
+        if after is not None:
+            messages = [m for m in messages if m.id > after]
+        return messages[:limit]
+
+    async def delete_messages(self, channel_id, message_ids):
+        await self.client.rest.call('DELETE', f'channels/{channel_id}')
+        for message_id in message_ids:
+            self.client.channels[channel_id].messages.pop(message_id, None)
+
+    async def delete_message(self, channel_id, message_id):
+        await self.client.rest.call('DELETE', f'channels/{channel_id}')
+        self.client.channels[channel_id].messages.pop(message_id, None)
+
+
+class FakeClient:
+    """Remplace bot.client : même surface que stoat.Client pour les handlers"""
+
+    def __init__(self, server_id, rest):
+        self.rest = rest
+        self.user = FakeUser(name='Quokka', bot=True, relationship=stoat.RelationshipStatus.user)
+        self.server = FakeServer(self, server_id)
+        self.channels = {}
+        self.http = FakeHTTP(self)
+        self.shard = None
+
+    def channel(self, channel_id):
+        """Crée (ou retourne) un canal sans appel REST"""
+        if channel_id not in self.channels:
+            self.channels[channel_id] = FakeChannel(self, channel_id)
+        return self.channels[channel_id]
+
+    async def fetch_channel(self, channel_id):
+        await self.rest.call('GET', f'channels/{channel_id}')
+        return self.channel(channel_id)
+
+    async def fetch_server(self, server_id):
+        await self.rest.call('GET', f'servers/{server_id}')
+        return self.server
+
+    async def add_reaction(self, channel_id, message_id, emoji):
+        await self.rest.call('PUT', f'channels/{channel_id}')
+        self.record_reaction(channel_id, message_id, emoji)
+
+    def record_reaction(self, channel_id, message_id, emoji):
+        """Garde la réaction du bot sur le message, comme le ferait l'historique Stoat"""
+        message = self.channel(channel_id).messages.get(message_id)
+        if message is not None and self.user.id not in message.reactions.get(emoji, ()):
+            message.reactions[emoji] = message.reactions.get(emoji, ()) + (self.user.id,)
+
+
+# ----------------------------------------------------------------------------
+# Événements synthétiques (mêmes attributs que les événements stoat.py)
+# ----------------------------------------------------------------------------
+
+def message_event(client, channel_id, author, content, mentions=(), message_id=None):
+    channel = client.channel(channel_id)
+    message = FakeMessage(client, channel, author, content, mentions, message_id)
+    channel.messages[message.id] = message
+    return SimpleNamespace(message=message)
+
+
+def reaction_event(channel_id, message_id, user_id, emoji):
+    return SimpleNamespace(channel_id=channel_id, message_id=message_id, user_id=user_id, emoji=emoji)
+
+
+def member_join_event(member):
+    return SimpleNamespace(member=member)
+
+
+def member_remove_event(server_id, member, reason=stoat.MemberRemovalIntention.leave):
+    return SimpleNamespace(server_id=server_id, user_id=member.id, member=member, reason=reason)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Rejeu d'un journal d'événements enregistré contre le faux client Stoat
+
+Relit le journal gzip écrit par l'enregistreur du bot (section
+"event_recorder" de config.json) et renvoie chaque événement dans les
+vrais handlers, branchés sur le client en mémoire de fake_stoat (latence
+REST et rate limit simulés). Le rythme d'origine peut être conservé (1x),
+accéléré (Nx) ou ignoré (max) pour reproduire un raid ou un afflux de
+soumissions.
+
+Usage :
+    python benchmarks/replay_events.py recordings/events.jsonl.gz --speed 1
+    python benchmarks/replay_events.py recordings/events.jsonl.gz --speed 10 --max-gap 2
+    python benchmarks/replay_events.py recordings/events.jsonl.gz --speed max --concurrency 100
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import asyncio
+import argparse
+from collections import Counter
+
+import stoat
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.chdir(BOT_DIR)
+
+import bot  # noqa: E402
+import fake_stoat  # noqa: E402
+from bench_handlers import percentile, setup_bot  # noqa: E402
+
+# Handlers enregistrés pour chaque type d'événement du journal
+HANDLERS = {
+    'message': (bot.on_message,),
+    'reaction': (bot.on_reaction,),
+    'join': (bot.on_member_join,),
+    'remove': (bot.on_member_remove, bot.on_member_remove_cache),
+}
+
+
+def parse_speed(value):
+    """'max' → None (sans attente), sinon un multiplicateur > 0"""
+    if value == 'max':
+        return None
+    speed = float(value.rstrip('x'))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError('la vitesse doit être positive')
+    return speed
+
+
+def read_records(path, limit=None):
+    """Lit le journal ; une fin tronquée (arrêt brutal du bot) est ignorée"""
+    records = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+                if limit is not None and len(records) >= limit:
+                    break
+    except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+        print(f'[REPLAY] Journal tronqué, lecture arrêtée après {len(records)} lignes ({e})')
+    return records
+
+
+class Replayer:
+    """Reconstruit les objets Stoat factices à partir des lignes du journal"""
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.users = {}
+
+    def apply_meta(self, record):
+        """En-tête de session : IDs du serveur et des canaux au moment de l'enregistrement"""
+        bot.SERVER_ID = record.get('server_id') or bot.SERVER_ID
+        bot.SUBMISSION_CHANNEL_ID = record.get('submission_channel_id') or bot.SUBMISSION_CHANNEL_ID
+        bot.NOTIFICATION_CHANNEL_ID = record.get('notification_channel_id') or bot.NOTIFICATION_CHANNEL_ID
+        roles = record.get('moderator_role_ids') or []
+        if roles:
+            bot.MODERATOR_ROLE_1 = roles[0]
+        self.fake.server.id = bot.SERVER_ID
+        if record.get('bot_id'):
+            self.fake.user.id = record['bot_id']
+
+    def user(self, user_id, name=None, is_bot=False):
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = fake_stoat.FakeUser(user_id, name or 'membre', is_bot)
+        return user
+
+    def member(self, user_id, name=None, role_ids=()):
+        member = self.fake.server.members.get(user_id)
+        if member is None:
+            member = self.fake.server.add_member(self.user(user_id, name), role_ids)
+        return member
+
+    def build_event(self, record):
+        kind = record['type']
+        if kind == 'message':
+            if record.get('self'):
+                author = self.fake.user
+            else:
+                author = self.user(record['author_id'], record.get('author_name'), record.get('author_bot'))
+                self.member(author.id)
+            mentions = [self.fake.user if user_id == self.fake.user.id else self.user(user_id)
+                        for user_id in record.get('mentions', ())]
+            return fake_stoat.message_event(self.fake, record['channel_id'], author, record.get('content') or '',
+                                            mentions, record['message_id'])
+        if kind == 'reaction':
+            # Les réactions sur le canal de soumission viennent des modérateurs
+            self.member(record['user_id'], role_ids=[bot.MODERATOR_ROLE_1])
+            return fake_stoat.reaction_event(record['channel_id'], record['message_id'],
+                                             record['user_id'], record['emoji'])
+        member = self.member(record['user_id'], record.get('name'))
+        if kind == 'join':
+            return fake_stoat.member_join_event(member)
+        reason = stoat.MemberRemovalIntention[record.get('reason', 'leave')]
+        return fake_stoat.member_remove_event(record['server_id'], member, reason)
+
+
+async def replay(records, args):
+    rest = fake_stoat.FakeRest(args.latency, args.rate_limit, args.window, bot.learn_outbound_ratelimit)
+    fake = setup_bot(rest)
+    replayer = Replayer(fake)
+    latencies = {}  # Format: {handler: [secondes]}
+    lateness = []
+    counts = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def dispatch(handler, event):
+        start = time.perf_counter()
+        await handler(event)
+        latencies.setdefault(handler.__name__, []).append(time.perf_counter() - start)
+
+    async def deliver(kind, event):
+        try:
+            # stoat.py lance chaque handler dans sa propre tâche
+            await asyncio.gather(*(dispatch(handler, event) for handler in HANDLERS[kind]))
+        finally:
+            if args.speed is None:
+                semaphore.release()
+
+    start = time.perf_counter()
+    offset = 0.0  # Temps du journal rejoué, en secondes depuis le premier événement
+    previous_ts = None
+    tasks = []
+    for record in records:
+        if record['type'] == 'meta':
+            replayer.apply_meta(record)
+            continue
+        if record['type'] not in HANDLERS:
+            continue
+        if previous_ts is not None:
+            # Les longues pauses (nuit, redémarrage) sont raccourcies à --max-gap
+            offset += min(max(0.0, record['ts'] - previous_ts), args.max_gap)
+        previous_ts = record['ts']
+
+        if args.speed is None:
+            await semaphore.acquire()
+        else:
+            due = start + offset / args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lateness.append(max(0.0, time.perf_counter() - due))
+        counts[record['type']] += 1
+        tasks.append(asyncio.create_task(deliver(record['type'], replayer.build_event(record))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    for route in bot.outbound_routes.values():
+        if route['worker'] is not None:
+            route['worker'].cancel()
+
+    total = sum(counts.values())
+    speed = 'max' if args.speed is None else f'{args.speed:g}x'
+    print(f'[REPLAY] {total:,} événements rejoués en {elapsed:.2f} s à {speed} '
+          f'({total / elapsed if elapsed > 0 else 0:,.0f} évén./s)')
+    print(f"         par type : {', '.join(f'{kind}={count}' for kind, count in counts.most_common())}")
+    if total:
+        print(f'         appels REST par événement : {rest.total_calls / total:.2f} '
+              f'(attentes de rate limit : {rest.throttled})')
+    if lateness:
+        lateness.sort()
+        print(f'         retard sur le rythme d\'origine : p99 {percentile(lateness, 0.99) * 1000:.1f} ms')
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        print(f'         {name:<24} n={len(values):<6} p50 {percentile(values, 0.50) * 1000:7.1f} ms  '
+              f'p95 {percentile(values, 0.95) * 1000:7.1f} ms  p99 {percentile(values, 0.99) * 1000:7.1f} ms')
+
+
+def main(args):
+    records = read_records(args.path, args.limit)
+    if not records:
+        print(f'[REPLAY] Aucun événement dans {args.path}')
+        return 1
+    asyncio.run(replay(records, args))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help='journal gzip écrit par l\'enregistreur')
+    parser.add_argument('--speed', type=parse_speed, default=1.0, help='1, 10 (ou 10x), ou max')
+    parser.add_argument('--max-gap', type=float, default=5.0, help='pause maximale entre deux événements (s)')
+    parser.add_argument('--concurrency', type=int, default=50, help='événements simultanés en mode max')
+    parser.add_argument('--limit', type=int, default=None, help='nombre maximal de lignes à lire')
+    parser.add_argument('--latency', type=float, default=0.02, help='latence REST simulée (s)')
+    parser.add_argument('--rate-limit', type=int, default=10, help='appels autorisés par route et par fenêtre')
+    parser.add_argument('--window', type=float, default=1.0, help='durée de la fenêtre de rate limit (s)')
+    sys.exit(main(parser.parse_args()))
@@ -8,16 +8,36 @@ Toutes les fonctionnalités en un seul fichier :
 - Commandes diverses
 """
 import os
+import sys
+import threading
+import traceback
 import json
+import gzip
+import hashlib
+import re
+import queue
+import logging
+import logging.handlers
+import sqlite3
 import random
+import heapq
+import cProfile
+import pstats
+import mmap
+import array
+import struct
+import bisect
+import itertools
 import asyncio
 import time
-import socket
 import urllib.parse
-from datetime import datetime
+from collections import OrderedDict, deque
+from itertools import groupby
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 import stoat
-import requests
+import aiohttp
+import aiohttp.web
 from dotenv import load_dotenv
 
 # ============================================================================
@@ -34,7 +54,9 @@ LEAVE_CHANNEL_ID = os.getenv('LEAVE_CHANNEL_ID')
 SUBMISSION_CHANNEL_ID = os.getenv('SUBMISSION_CHANNEL_ID')
 MODERATOR_ROLE_1 = os.getenv('MODERATOR_ROLE_1')
 MODERATOR_ROLE_2 = os.getenv('MODERATOR_ROLE_2')
+SANCTION_LOG_CHANNEL_ID = os.getenv('SANCTION_LOG_CHANNEL_ID')
 MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY')
+ADMIN_ROLE_ID = os.getenv('ADMIN_ROLE_ID')
 DEFAULT_NOTIFICATION_CHANNEL_ID = "01KHCH5Y324FH1HP45S6JZJ1H4"
 NOTIFICATION_CHANNEL_ID = os.getenv('NOTIFICATION_CHANNEL_ID') or WELCOME_CHANNEL_ID or LEAVE_CHANNEL_ID or DEFAULT_NOTIFICATION_CHANNEL_ID
 NEW_MEMBER_ROLE_ID = "01KHCHDCWRMYZM3W81ZBZWRSZN"
@@ -67,8 +89,121 @@ except FileNotFoundError:
         "logging": {"verbose": True}
     }
 
+# ============================================================================
+# JOURNALISATION STRUCTURÉE
+# ============================================================================
+
+LOGGING_SETTINGS = config.get('logging', {})
+LOG_VERBOSE = LOGGING_SETTINGS.get('verbose', True)
+LOG_FILE = LOGGING_SETTINGS.get('file', 'logs/bot.jsonl')
+LOG_MAX_BYTES = int(LOGGING_SETTINGS.get('max_bytes', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(LOGGING_SETTINGS.get('backup_count', 5))
+LOG_DEBUG_SAMPLE_RATE = float(LOGGING_SETTINGS.get('debug_sample_rate', 0.05))
+
+logger = logging.getLogger('quokka')
+log_listener = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Formate un enregistrement en une ligne JSON"""
+
+    def format(self, record):
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'event': getattr(record, 'event', record.name),
+            'msg': record.getMessage()
+        }
+        payload.update(getattr(record, 'fields', {}))
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class QueuedRecordFormatter(logging.Formatter):
+    """Avant la mise en file : garde le message brut et range la trace dans les champs"""
+
+    def format(self, record):
+        if record.exc_info:
+            record.fields = {**getattr(record, 'fields', {}), 'exc': self.formatException(record.exc_info)}
+        return record.getMessage()
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Format console historique : [TAG] message clé=valeur"""
+
+    def format(self, record):
+        line = f"[{getattr(record, 'event', record.name).upper()}] {record.getMessage()}"
+        fields = dict(getattr(record, 'fields', {}))
+        exc = fields.pop('exc', None)
+        stack = fields.pop('stack', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        for block in (stack, exc):
+            if block:
+                line += '\n' + block.rstrip('\n')
+        return line
+
+
+def setup_logging():
+    """Branche le logger sur une file : l'écriture (console + fichier JSON) se fait dans un thread"""
+    global log_listener
+    if log_listener is not None:
+        return log_listener
+    
+    handlers = []
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(ConsoleFormatter())
+    handlers.append(console_handler)
+    if LOG_FILE:
+        log_dir = os.path.dirname(LOG_FILE)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonLineFormatter())
+        handlers.append(file_handler)
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(QueuedRecordFormatter())
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.DEBUG if LOG_VERBOSE else logging.INFO)
+    logger.propagate = False
+    log_listener = logging.handlers.QueueListener(log_queue, *handlers)
+    log_listener.start()
+    return log_listener
+
+
+def stop_logging():
+    """Vide la file de logs et arrête le thread d'écriture"""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+def log_event(level, event, message, exc_info=False, **fields):
+    """Journalise un événement ; ne coûte qu'un test de niveau si désactivé"""
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, message, exc_info=exc_info, extra={'event': event, 'fields': fields})
+
+
+def log_sampled(event, message, **fields):
+    """Log debug échantillonné pour les événements à fort volume (messages, réactions)"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if LOG_DEBUG_SAMPLE_RATE < 1 and random.random() >= LOG_DEBUG_SAMPLE_RATE:
+        return
+    logger.log(logging.DEBUG, message, extra={
+        'event': event,
+        'fields': {**fields, 'sample_rate': LOG_DEBUG_SAMPLE_RATE}
+    })
+
 # Stockage des soumissions en attente
-pending_submissions = {}
+pending_submissions = {}  # Format: {message_id: {'author': str, 'author_name': str, 'content': str, 'channel': str}}
+submission_checkpoint = None  # ID du plus récent message du canal de soumission déjà pris en compte
+submission_reconcile_running = False  # Pendant la reprise, seul le réconciliateur avance le point de reprise
 
 # Stockage des utilisateurs bannis
 banned_users = {}  # Format: {user_id: {'reason': str, 'duration': int, 'expires_at': float, 'banned_by': str}}
@@ -79,8 +214,19 @@ muted_users = {}  # Format: {user_id: {'reason': str, 'duration': int, 'expires_
 # Stockage des avertissements
 user_warnings = {}  # Format: {user_id: [{'reason': str, 'warned_by': str, 'timestamp': float}]}
 
+class QuokkaClient(stoat.Client):
+    """Client Stoat qui ferme les sessions HTTP du bot à l'arrêt, dans la boucle d'événements"""
+
+    async def start(self):
+        try:
+            await super().start()
+        finally:
+            # Aussi sur Ctrl+C : asyncio.run annule la tâche sans appeler close()
+            await close_http_sessions()
+
+
 # Créer le client
-client = stoat.Client()
+client = QuokkaClient()
 monitoring_task = None
 monitoring_message_id = None
 monitoring_last_content = None
@@ -220,28 +366,461 @@ def pick_thinking_response(mood):
     return template.format(mood=mood["id"], tone=mood["tone"])
 
 # ============================================================================
-# FONCTIONS UTILITAIRES
+# PERSISTANCE DE LA MODÉRATION (SQLite WAL, écriture différée)
 # ============================================================================
 
-def add_warning(user_id, reason, warned_by):
-    """Ajoute un avertissement à un utilisateur"""
-    if user_id not in user_warnings:
-        user_warnings[user_id] = []
+MODERATION_STORE_SETTINGS = config.get('moderation_store', {})
+MODERATION_DB_PATH = os.getenv('MODERATION_DB_PATH') or MODERATION_STORE_SETTINGS.get('path', 'moderation.db')
+MODERATION_FLUSH_INTERVAL_SECONDS = float(MODERATION_STORE_SETTINGS.get('flush_interval_seconds', 2))
+MODERATION_FLUSH_BATCH_SIZE = int(MODERATION_STORE_SETTINGS.get('flush_batch_size', 500))
+
+# Les dicts en mémoire restent la source de vérité pour on_message ;
+# SQLite ne sert qu'à survivre aux redémarrages.
+SANCTION_STORES = {
+    'ban': (banned_users, 'banned_by'),
+    'mute': (muted_users, 'muted_by')
+}
+
+moderation_db = None
+moderation_pending_writes = []  # Format: [(sql, params)]
+moderation_flush_lock = asyncio.Lock()
+moderation_flush_task = None
+
+SQL_UPSERT_SANCTION = (
+    "INSERT OR REPLACE INTO sanctions (kind, user_id, reason, duration, expires_at, issued_by) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+SQL_DELETE_SANCTION = "DELETE FROM sanctions WHERE kind = ? AND user_id = ?"
+SQL_INSERT_WARNING = "INSERT INTO warnings (user_id, reason, warned_by, timestamp) VALUES (?, ?, ?, ?)"
+SQL_UPSERT_SUBMISSION = (
+    "INSERT OR REPLACE INTO submissions (message_id, author, author_name, content, channel) VALUES (?, ?, ?, ?, ?)"
+)
+SQL_DELETE_SUBMISSION = "DELETE FROM submissions WHERE message_id = ?"
+SQL_SET_STORE_STATE = "INSERT OR REPLACE INTO store_state (key, value) VALUES (?, ?)"
+
+
+def open_moderation_store(path=None):
+    """Ouvre (ou crée) la base SQLite de modération en mode WAL"""
+    global moderation_db
+    moderation_db = sqlite3.connect(path or MODERATION_DB_PATH, check_same_thread=False)
+    moderation_db.execute("PRAGMA journal_mode=WAL")
+    moderation_db.execute("PRAGMA synchronous=NORMAL")
+    with moderation_db:
+        moderation_db.execute(
+            "CREATE TABLE IF NOT EXISTS sanctions ("
+            " kind TEXT NOT NULL,"
+            " user_id TEXT NOT NULL,"
+            " reason TEXT,"
+            " duration INTEGER,"
+            " expires_at REAL,"
+            " issued_by TEXT,"
+            " PRIMARY KEY (kind, user_id))"
+        )
+        moderation_db.execute("CREATE INDEX IF NOT EXISTS idx_sanctions_expires_at ON sanctions (expires_at)")
+        moderation_db.execute(
+            "CREATE TABLE IF NOT EXISTS warnings ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_id TEXT NOT NULL,"
+            " reason TEXT,"
+            " warned_by TEXT,"
+            " timestamp REAL NOT NULL)"
+        )
+        moderation_db.execute("CREATE INDEX IF NOT EXISTS idx_warnings_user_id ON warnings (user_id)")
+        moderation_db.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            " message_id TEXT PRIMARY KEY,"
+            " author TEXT,"
+            " author_name TEXT,"
+            " content TEXT,"
+            " channel TEXT)"
+        )
+        moderation_db.execute("CREATE TABLE IF NOT EXISTS store_state (key TEXT PRIMARY KEY, value TEXT)")
+    return moderation_db
+
+
+def load_moderation_store():
+    """Recharge bans, mutes et avertissements depuis SQLite dans les dicts en mémoire"""
+    now = time.time()
+    with moderation_db:
+        moderation_db.execute("DELETE FROM sanctions WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
     
-    warning = {
-        'reason': reason,
-        'warned_by': warned_by,
-        'timestamp': time.time()
-    }
+    for store, _ in SANCTION_STORES.values():
+        store.clear()
+    rows = moderation_db.execute(
+        "SELECT kind, user_id, reason, duration, expires_at, issued_by FROM sanctions"
+    )
+    for kind, user_id, reason, duration, expires_at, issued_by in rows:
+        if kind not in SANCTION_STORES:
+            continue
+        store, issued_by_key = SANCTION_STORES[kind]
+        store[user_id] = {
+            'reason': reason,
+            'duration': duration,
+            'expires_at': expires_at,
+            issued_by_key: issued_by
+        }
     
-    user_warnings[user_id].append(warning)
-    return len(user_warnings[user_id])
+    user_warnings.clear()
+    rows = moderation_db.execute("SELECT user_id, reason, warned_by, timestamp FROM warnings ORDER BY id")
+    warning_count = 0
+    for user_id, reason, warned_by, timestamp in rows:
+        user_warnings.setdefault(user_id, []).append({
+            'reason': reason,
+            'warned_by': warned_by,
+            'timestamp': timestamp
+        })
+        warning_count += 1
+    
+    global submission_checkpoint
+    pending_submissions.clear()
+    rows = moderation_db.execute("SELECT message_id, author, author_name, content, channel FROM submissions")
+    for message_id, author, author_name, content, channel in rows:
+        pending_submissions[message_id] = {
+            'author': author,
+            'author_name': author_name,
+            'content': content,
+            'channel': channel
+        }
+    row = moderation_db.execute("SELECT value FROM store_state WHERE key = 'submission_checkpoint'").fetchone()
+    submission_checkpoint = row[0] if row else None
+    
+    rebuild_sanction_expiry_heap()
+    log_event(logging.INFO, 'store', 'Base de modération chargée', bans=len(banned_users), mutes=len(muted_users),
+              warnings=warning_count, pending_submissions=len(pending_submissions))
 
 
-def get_user_warnings(user_id):
-    """Récupère les avertissements d'un utilisateur"""
-    return user_warnings.get(user_id, [])
+def queue_moderation_write(sql, params):
+    """Met une écriture en attente ; elle sera appliquée au prochain flush groupé"""
+    if moderation_db is None:
+        return
+    moderation_pending_writes.append((sql, params))
+    if len(moderation_pending_writes) >= MODERATION_FLUSH_BATCH_SIZE:
+        try:
+            asyncio.get_running_loop().create_task(flush_moderation_store())
+        except RuntimeError:
+            pass  # Pas de boucle active : le flush final de main() s'en charge
+
+
+def write_moderation_batch(batch):
+    """Applique un lot d'écritures dans une seule transaction"""
+    with moderation_db:
+        for sql, group in groupby(batch, key=lambda write: write[0]):
+            moderation_db.executemany(sql, [params for _, params in group])
+
+
+async def flush_moderation_store():
+    """Écrit les modifications en attente sans bloquer la boucle d'événements"""
+    if moderation_db is None:
+        return 0
+    async with moderation_flush_lock:
+        if not moderation_pending_writes:
+            return 0
+        batch = moderation_pending_writes[:]
+        del moderation_pending_writes[:len(batch)]
+        try:
+            await asyncio.to_thread(write_moderation_batch, batch)
+        except Exception as e:
+            log_event(logging.ERROR, 'store', f'Échec écriture: {e}', operations=len(batch))
+            moderation_pending_writes[:0] = batch
+            return 0
+        return len(batch)
+
+
+def flush_moderation_store_sync():
+    """Flush final synchrone (arrêt du bot)"""
+    if moderation_db is None or not moderation_pending_writes:
+        return
+    batch = moderation_pending_writes[:]
+    moderation_pending_writes.clear()
+    write_moderation_batch(batch)
+
+
+async def moderation_flush_loop():
+    """Flush périodique de l'écriture différée"""
+    while True:
+        await asyncio.sleep(MODERATION_FLUSH_INTERVAL_SECONDS)
+        await flush_moderation_store()
+
+
+def set_sanction(kind, user_id, info):
+    """Enregistre un ban/mute en mémoire et le persiste"""
+    store, issued_by_key = SANCTION_STORES[kind]
+    store[user_id] = info
+    queue_moderation_write(SQL_UPSERT_SANCTION, (
+        kind, user_id, info['reason'], info['duration'], info['expires_at'], info.get(issued_by_key)
+    ))
+    schedule_sanction_expiry(kind, user_id, info['expires_at'])
+
+
+def remember_submission(message_id, submission):
+    """Enregistre une soumission en attente et avance le point de reprise du réconciliateur"""
+    global submission_checkpoint
+    pending_submissions[message_id] = submission
+    queue_moderation_write(SQL_UPSERT_SUBMISSION, (
+        message_id, submission['author'], submission['author_name'], submission['content'], submission['channel']
+    ))
+    # Les ULID se comparent comme des chaînes dans l'ordre chronologique ; pendant la reprise,
+    # avancer ici sauterait la partie de l'historique pas encore parcourue
+    if submission_reconcile_running:
+        return
+    if submission_checkpoint is None or message_id > submission_checkpoint:
+        submission_checkpoint = message_id
+        queue_moderation_write(SQL_SET_STORE_STATE, ('submission_checkpoint', message_id))
+
+
+def forget_submission(message_id):
+    """Retire une soumission traitée (approuvée ou refusée)"""
+    pending_submissions.pop(message_id, None)
+    queue_moderation_write(SQL_DELETE_SUBMISSION, (message_id,))
+
+
+def remove_sanction(kind, user_id):
+    """Retire un ban/mute en mémoire et en base ; retourne l'ancienne entrée"""
+    store, _ = SANCTION_STORES[kind]
+    info = store.pop(user_id, None)
+    if info is not None:
+        queue_moderation_write(SQL_DELETE_SANCTION, (kind, user_id))
+    return info
+
+
+# ============================================================================
+# EXPIRATION DES SANCTIONS (tas min)
+# ============================================================================
+
+# Tas des échéances : les entrées devenues obsolètes (unban, nouvelle durée)
+# sont ignorées au moment du pop, ce qui garde push/pop en O(log n).
+sanction_expiry_heap = []  # Format: [(expires_at, kind, user_id)]
+sanction_expiry_wakeup = asyncio.Event()
+sanction_expiry_task = None
+
+
+def schedule_sanction_expiry(kind, user_id, expires_at):
+    """Planifie la levée automatique d'une sanction temporaire"""
+    if expires_at is None:
+        return
+    heapq.heappush(sanction_expiry_heap, (expires_at, kind, user_id))
+    if sanction_expiry_heap[0][0] == expires_at:
+        # Nouvelle échéance la plus proche : réveiller la boucle
+        sanction_expiry_wakeup.set()
+
+
+def rebuild_sanction_expiry_heap():
+    """Reconstruit le tas depuis les sanctions en mémoire (après chargement)"""
+    sanction_expiry_heap[:] = [
+        (info['expires_at'], kind, user_id)
+        for kind, (store, _) in SANCTION_STORES.items()
+        for user_id, info in store.items()
+        if info.get('expires_at') is not None
+    ]
+    heapq.heapify(sanction_expiry_heap)
+    sanction_expiry_wakeup.set()
+
+
+def pop_expired_sanctions(now):
+    """Lève toutes les sanctions échues ; retourne [(kind, user_id, info)]"""
+    expired = []
+    while sanction_expiry_heap and sanction_expiry_heap[0][0] <= now:
+        expires_at, kind, user_id = heapq.heappop(sanction_expiry_heap)
+        store, _ = SANCTION_STORES[kind]
+        info = store.get(user_id)
+        if info is None or info.get('expires_at') != expires_at:
+            continue  # Entrée obsolète
+        remove_sanction(kind, user_id)
+        expired.append((kind, user_id, info))
+    return expired
+
+
+async def notify_sanction_expired(kind, user_id, info):
+    """Annonce la fin d'une sanction dans le canal de logs (optionnel)"""
+    if not SANCTION_LOG_CHANNEL_ID:
+        return
+    label = "ban" if kind == 'ban' else "mute"
+    try:
+        channel = await get_cached_channel(SANCTION_LOG_CHANNEL_ID)
+        await send_message(
+            channel,
+            f"⏱️ **Fin du {label}** pour <@{user_id}>\n"
+            f"📝 **Raison initiale:** {info.get('reason') or 'Aucune raison fournie'}",
+            priority=PRIORITY_MODERATION
+        )
+    except Exception as e:
+        log_event(logging.WARNING, 'expiration', f'Notification impossible: {e}', kind=kind, user_id=user_id)
+
+
+async def sanction_expiry_loop():
+    """Lève les bans/mutes à leur échéance exacte"""
+    while True:
+        for kind, user_id, info in pop_expired_sanctions(time.time()):
+            log_event(logging.INFO, 'expiration', f'{kind} levé', kind=kind, user_id=user_id)
+            await notify_sanction_expired(kind, user_id, info)
+        
+        timeout = None
+        if sanction_expiry_heap:
+            timeout = max(0.0, sanction_expiry_heap[0][0] - time.time())
+        sanction_expiry_wakeup.clear()
+        try:
+            await asyncio.wait_for(sanction_expiry_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ============================================================================
+# FILE D'ENVOI SORTANTE (rate limit par route, priorités)
+# ============================================================================
+
+OUTBOUND_SETTINGS = config.get('outbound', {})
+OUTBOUND_DEFAULT_CAPACITY = int(OUTBOUND_SETTINGS.get('default_capacity', 10))
+OUTBOUND_DEFAULT_WINDOW_SECONDS = float(OUTBOUND_SETTINGS.get('default_window_seconds', 10))
+
+# Voies de priorité : un envoi de modération passe toujours avant le bavardage
+PRIORITY_MODERATION = 0
+PRIORITY_NORMAL = 1
+PRIORITY_CHATTER = 2
+PRIORITY_NAMES = {PRIORITY_MODERATION: 'moderation', PRIORITY_NORMAL: 'normal', PRIORITY_CHATTER: 'chatter'}
+
+# Une route = une clé de rate limit Stoat ('messaging/<canal>' pour les envois,
+# 'channels/<canal>' pour le reste). Chaque route a son seau de jetons et
+# un worker qui exécute les appels un par un, dans l'ordre des priorités.
+outbound_routes = {}  # Format: {route_key: {'queue': heap, 'tokens': float, 'capacity': int, 'window': float, 'reset_at': float, 'worker': Task}}
+outbound_sequence = itertools.count()
+outbound_stats = {'sent': 0, 'failed': 0, 'throttled': 0, 'learned': 0}
+
+
+def message_route_key(channel_id):
+    """Clé de route pour l'envoi de messages dans un canal"""
+    return f'messaging/{channel_id}'
+
+
+def channel_route_key(channel_id):
+    """Clé de route pour les autres appels sur un canal (réactions, suppressions, éditions)"""
+    return f'channels/{channel_id}'
+
+
+def get_outbound_route(key):
+    """Retourne (ou crée) l'état d'une route sortante"""
+    route = outbound_routes.get(key)
+    if route is None:
+        route = {
+            'queue': [],
+            'tokens': float(OUTBOUND_DEFAULT_CAPACITY),
+            'capacity': OUTBOUND_DEFAULT_CAPACITY,
+            'window': OUTBOUND_DEFAULT_WINDOW_SECONDS,
+            'reset_at': time.monotonic() + OUTBOUND_DEFAULT_WINDOW_SECONDS,
+            'worker': None
+        }
+        outbound_routes[key] = route
+    return route
+
+
+def learn_outbound_ratelimit(key, headers):
+    """Met à jour le seau d'une route depuis les en-têtes x-ratelimit-* de la réponse"""
+    try:
+        remaining = int(headers['x-ratelimit-remaining'])
+        reset_after = int(headers['x-ratelimit-reset-after']) / 1000
+    except (KeyError, ValueError):
+        return
+    route = get_outbound_route(key)
+    limit = headers.get('x-ratelimit-limit')
+    if limit is not None and limit.isdigit():
+        route['capacity'] = int(limit)
+    route['tokens'] = float(remaining)
+    if remaining == route['capacity'] - 1:
+        # Premier appel d'une fenêtre neuve : reset_after en donne la durée complète
+        # (plus courte ou plus longue que la valeur connue, sans garder un maximum)
+        route['window'] = reset_after
+    route['reset_at'] = time.monotonic() + reset_after
+    outbound_stats['learned'] += 1
+
+
+def take_outbound_token(route):
+    """Consomme un jeton ; retourne 0 si l'appel peut partir, sinon le délai à attendre"""
+    now = time.monotonic()
+    if now >= route['reset_at']:
+        route['tokens'] = float(route['capacity'])
+        route['reset_at'] = now + route['window']
+    if route['tokens'] >= 1:
+        route['tokens'] -= 1
+        return 0
+    return route['reset_at'] - now
+
+
+async def outbound_worker(key):
+    """Exécute les appels en attente d'une route, en respectant son seau"""
+    route = outbound_routes[key]
+    try:
+        while route['queue']:
+            delay = take_outbound_token(route)
+            if delay > 0:
+                outbound_stats['throttled'] += 1
+                log_sampled('outbound', f'Route {key} saturée, attente {delay:.2f}s',
+                            route=key, delay=round(delay, 3), depth=len(route['queue']))
+                await asyncio.sleep(delay)
+                continue
+            _, _, factory, future = heapq.heappop(route['queue'])
+            if future.done():
+                route['tokens'] += 1  # Appel annulé : rendre le jeton
+                continue
+            try:
+                result = await factory()
+            except Exception as e:
+                outbound_stats['failed'] += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                outbound_stats['sent'] += 1
+                if not future.done():
+                    future.set_result(result)
+    finally:
+        route['worker'] = None
+
+
+def queue_outbound(key, factory, priority=PRIORITY_NORMAL):
+    """Met un appel REST en file sur une route ; retourne un future avec son résultat"""
+    route = get_outbound_route(key)
+    future = asyncio.get_running_loop().create_future()
+    heapq.heappush(route['queue'], (priority, next(outbound_sequence), factory, future))
+    if route['worker'] is None:
+        route['worker'] = asyncio.create_task(outbound_worker(key))
+    return future
+
+
+async def send_message(channel, content, priority=PRIORITY_NORMAL):
+    """Envoie un message via la file sortante du canal"""
+    return await queue_outbound(message_route_key(channel.id), lambda: channel.send(content), priority)
+
 
+async def run_on_channel(channel_id, factory, priority=PRIORITY_NORMAL):
+    """Exécute un appel sur un canal (réaction, suppression, édition) via la file sortante"""
+    return await queue_outbound(channel_route_key(channel_id), factory, priority)
+
+
+def get_outbound_stats():
+    """Profondeur des files par voie de priorité, plus les compteurs globaux"""
+    depth = {name: 0 for name in PRIORITY_NAMES.values()}
+    busiest = None
+    for key, route in outbound_routes.items():
+        for entry in route['queue']:
+            depth[PRIORITY_NAMES.get(entry[0], 'normal')] += 1
+        if route['queue'] and (busiest is None or len(route['queue']) > busiest[1]):
+            busiest = (key, len(route['queue']))
+    return {**outbound_stats, 'depth': depth, 'routes': len(outbound_routes), 'busiest_route': busiest}
+
+
+class OutboundRateLimiter(stoat.DefaultRateLimiter):
+    """Limiteur Stoat qui transmet les en-têtes de rate limit à la file sortante"""
+
+    async def on_response(self, route, path, response, /):
+        await super().on_response(route, path, response)
+        learn_outbound_ratelimit(self.get_ratelimit_key_for(route), response.headers)
+        record_rest_call(route.route.method, route.route.path, response.status)
+
+
+client.http.rate_limiter = OutboundRateLimiter()
+
+
+# ============================================================================
+# FONCTIONS UTILITAIRES
+# ============================================================================
 
 def parse_duration(duration_str):
     """Parse une durée string et retourne le nombre de secondes"""
@@ -278,48 +857,323 @@ def parse_duration(duration_str):
 async def cleanup_user_messages(channel, user_id, limit=100):
     """Nettoie les messages d'un utilisateur dans un canal"""
     try:
-        messages = await client.fetch_messages(channel.id, limit=limit)
-        deleted_count = 0
-        
-        for msg in messages:
-            if msg.author.id == user_id:
-                try:
-                    await msg.delete()
-                    deleted_count += 1
-                    # Petit délai pour éviter le rate limiting
-                    await asyncio.sleep(0.1)
-                except Exception as e:
-                    print(f'[ERREUR] Impossible de supprimer le message: {e}')
-        
-        return deleted_count
+        stats = await clear_channel_messages(channel.id, limit, {'user': user_id}, max_scanned=limit)
+        return stats['deleted']
     except Exception as e:
-        print(f'[ERREUR] Erreur lors du nettoyage des messages: {e}')
+        log_event(logging.ERROR, 'erreur', f'Nettoyage des messages: {e}', channel_id=channel.id, user_id=user_id)
         return 0
 
 import time
 
-async def check_moderator_permission(user_id):
+# ============================================================================
+# NETTOYAGE DE MESSAGES (!clear)
+# ============================================================================
+
+CLEAR_SETTINGS = config.get('clear', {})
+CLEAR_MAX_MESSAGES = int(CLEAR_SETTINGS.get('max_messages', 1000))
+CLEAR_MAX_SCANNED = int(CLEAR_SETTINGS.get('max_scanned', 5000))
+CLEAR_DELETE_CONCURRENCY = int(CLEAR_SETTINGS.get('delete_concurrency', 5))
+CLEAR_PROGRESS_INTERVAL_SECONDS = float(CLEAR_SETTINGS.get('progress_interval_seconds', 2))
+CLEAR_PAGE_SIZE = 100  # Maximum de messages par page d'historique
+CLEAR_BULK_SIZE = 100  # Maximum d'IDs par suppression groupée
+CLEAR_BULK_MAX_AGE = timedelta(days=7)  # Au-delà, l'API refuse la suppression groupée
+
+
+CLEAR_BOUND_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_clear_bound(value):
+    """Borne before:/after: : une durée ('2h' = il y a 2h) donne une date, sinon un ID de message
+
+    L'unité est obligatoire et la durée strictement positive : `-5m` (date
+    future) ou `5` (ambigu) sont refusés plutôt que de tout sélectionner.
+    """
+    match = re.fullmatch(r'(\d+)([smhdw])', value.lower())
+    if match and int(match.group(1)) > 0:
+        seconds = int(match.group(1)) * CLEAR_BOUND_UNITS[match.group(2)]
+        return datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    if len(value) != 26 or not value.isalnum():
+        raise ValueError(f"Borne invalide : `{value}` (durée comme `2h` ou ID de message)")
+    return value.upper()
+
+
+def parse_clear_filters(tokens):
+    """Parse les filtres de !clear : user:@x, contains:mot, before:, after:, bots"""
+    filters = {}
+    for token in tokens:
+        key, sep, value = token.partition(':')
+        key = key.lower()
+        if key == 'bots' and not sep:
+            filters['bots'] = True
+        elif not value:
+            raise ValueError(f"Filtre invalide : `{token}`")
+        elif key == 'user':
+            user_id = parse_user_mention(value)
+            if not user_id:
+                raise ValueError("Merci de mentionner un utilisateur valide pour `user:`.")
+            filters['user'] = user_id
+        elif key == 'contains':
+            filters['contains'] = value.lower()
+        elif key in ('before', 'after'):
+            filters[key] = parse_clear_bound(value)
+        else:
+            raise ValueError(f"Filtre inconnu : `{token}`")
+    return filters
+
+
+def message_matches_clear_filters(msg, filters):
+    """Vérifie si un message correspond aux filtres de nettoyage"""
+    if 'user' in filters and msg.author_id != filters['user']:
+        return False
+    if 'contains' in filters and filters['contains'] not in (msg.content or '').lower():
+        return False
+    # msg.author lève NoData si l'auteur n'est pas en cache ; get_author() retourne None
+    if filters.get('bots') and not getattr(msg.get_author(), 'bot', None):
+        return False
+    before, after = filters.get('before'), filters.get('after')
+    if isinstance(before, datetime) and msg.created_at >= before:
+        return False
+    if isinstance(after, datetime) and msg.created_at <= after:
+        return False
+    return True
+
+
+async def clear_channel_messages(channel_id, limit, filters, exclude=(), on_progress=None, max_scanned=None):
+    """Parcourt l'historique d'un canal et supprime jusqu'à `limit` messages filtrés
+
+    Les messages de moins de 7 jours partent par lots de 100 (suppression
+    groupée) ; les plus anciens un par un, avec au plus
+    CLEAR_DELETE_CONCURRENCY suppressions en vol. Tout passe par la file
+    sortante du canal.
+    """
+    max_scanned = max_scanned or CLEAR_MAX_SCANNED
+    stats = {'scanned': 0, 'deleted': 0, 'failed': 0}
+    in_flight = asyncio.Semaphore(CLEAR_DELETE_CONCURRENCY)
+    singles = set()
+    bulk = []
+    bulk_cutoff = datetime.now(timezone.utc) - CLEAR_BULK_MAX_AGE
+    before, after = filters.get('before'), filters.get('after')
+    cursor = before if isinstance(before, str) else None
+    after_id = after if isinstance(after, str) else None
+
+    async def delete_one(message_id):
+        try:
+            await run_on_channel(
+                channel_id,
+                lambda: client.http.delete_message(channel_id, message_id),
+                PRIORITY_MODERATION
+            )
+            stats['deleted'] += 1
+        except Exception as e:
+            stats['failed'] += 1
+            log_sampled('clear', f'Suppression impossible de {message_id}: {e}')
+        finally:
+            in_flight.release()
+
+    async def start_delete_one(message_id):
+        await in_flight.acquire()
+        task = asyncio.create_task(delete_one(message_id))
+        singles.add(task)
+        task.add_done_callback(singles.discard)
+
+    async def flush_bulk():
+        batch = bulk[:]
+        bulk.clear()
+        if len(batch) == 1:
+            await start_delete_one(batch[0])
+            return
+        try:
+            await run_on_channel(
+                channel_id,
+                lambda: client.http.delete_messages(channel_id, batch),
+                PRIORITY_MODERATION
+            )
+            stats['deleted'] += len(batch)
+        except Exception as e:
+            # Permission manquante ou message trop ancien : repli un par un
+            log_event(logging.WARNING, 'clear', f'Suppression groupée refusée, repli unitaire: {e}')
+            for message_id in batch:
+                await start_delete_one(message_id)
+        if on_progress:
+            await on_progress(stats)
+
+    matched = 0
+    while matched < limit and stats['scanned'] < max_scanned:
+        page = await client.http.get_messages(
+            channel_id,
+            limit=CLEAR_PAGE_SIZE,
+            before=cursor,
+            after=after_id,
+            sort=stoat.MessageSort.latest,
+            populate_users=bool(filters.get('bots'))  # Auteurs nécessaires pour savoir qui est un bot
+        )
+        if not page:
+            break
+        reached_after = False
+        for msg in page:
+            stats['scanned'] += 1
+            if isinstance(after, datetime) and msg.created_at <= after:
+                reached_after = True  # Historique trié du plus récent au plus ancien
+                break
+            if msg.id in exclude or not message_matches_clear_filters(msg, filters):
+                continue
+            matched += 1
+            if msg.created_at > bulk_cutoff:
+                bulk.append(msg.id)
+                if len(bulk) >= CLEAR_BULK_SIZE:
+                    await flush_bulk()
+            else:
+                await start_delete_one(msg.id)
+            if matched >= limit or stats['scanned'] >= max_scanned:
+                break
+        if on_progress:
+            await on_progress(stats)
+        if reached_after or len(page) < CLEAR_PAGE_SIZE:
+            break
+        cursor = page[-1].id
+
+    if bulk:
+        await flush_bulk()
+    if singles:
+        await asyncio.gather(*singles)
+    return stats
+
+
+# ============================================================================
+# CACHE D'ENTITÉS (serveur, canaux, rôles)
+# ============================================================================
+
+# Rempli une fois depuis le payload Ready puis tenu à jour par les événements
+# de la passerelle (les rôles vivent dans server.roles). Une absence est
+# récupérée une seule fois via l'API, puis gardée.
+entity_servers = {}  # Format: {server_id: Server}
+entity_channels = {}  # Format: {channel_id: Channel}
+entity_cache_stats = {'hits': 0, 'misses': 0, 'updates': 0, 'invalidations': 0}
+
+
+def hydrate_entity_cache(servers, channels):
+    """Remplit le cache depuis Ready ; une reconnexion repart d'un état complet"""
+    entity_servers.clear()
+    entity_channels.clear()
+    entity_servers.update((server.id, server) for server in servers)
+    entity_channels.update((channel.id, channel) for channel in channels)
+
+
+async def get_cached_server(server_id=None):
+    """Serveur (principal par défaut) depuis le cache d'entités, sinon via l'API"""
+    server_id = server_id or SERVER_ID
+    server = entity_servers.get(server_id)
+    if server is not None:
+        entity_cache_stats['hits'] += 1
+        return server
+    entity_cache_stats['misses'] += 1
+    server = await client.fetch_server(server_id)
+    entity_servers[server_id] = server
+    return server
+
+
+async def get_cached_channel(channel_id):
+    """Canal depuis le cache d'entités, sinon via l'API"""
+    channel = entity_channels.get(channel_id)
+    if channel is not None:
+        entity_cache_stats['hits'] += 1
+        return channel
+    entity_cache_stats['misses'] += 1
+    channel = await client.fetch_channel(channel_id)
+    entity_channels[channel_id] = channel
+    return channel
+
+
+def store_cached_entity(store, entity):
+    store[entity.id] = entity
+    entity_cache_stats['updates'] += 1
+
+
+def invalidate_cached_entity(store, entity_id):
+    """Oublie une entité : le prochain accès repassera par l'API"""
+    if store.pop(entity_id, None) is not None:
+        entity_cache_stats['invalidations'] += 1
+
+
+# ============================================================================
+# CACHE MEMBRES / RÔLES
+# ============================================================================
+
+MEMBER_CACHE_SETTINGS = config.get('member_cache', {})
+MEMBER_CACHE_TTL_SECONDS = float(MEMBER_CACHE_SETTINGS.get('ttl_seconds', 300))
+MEMBER_CACHE_MAX_SIZE = int(MEMBER_CACHE_SETTINGS.get('max_size', 1000))
+
+# Cache LRU des membres du serveur
+member_cache = OrderedDict()  # Format: {user_id: (expires_at, member)}
+member_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+
+async def get_cached_member(user_id):
+    """Retourne un membre du serveur depuis le cache (TTL + LRU), sinon via l'API"""
+    now = time.monotonic()
+    entry = member_cache.get(user_id)
+    if entry is not None and entry[0] > now:
+        member_cache.move_to_end(user_id)
+        member_cache_stats['hits'] += 1
+        return entry[1]
+    
+    member_cache_stats['misses'] += 1
+    server = await get_cached_server()
+    member = await server.fetch_member(user_id)
+    
+    member_cache[user_id] = (now + MEMBER_CACHE_TTL_SECONDS, member)
+    member_cache.move_to_end(user_id)
+    while len(member_cache) > MEMBER_CACHE_MAX_SIZE:
+        member_cache.popitem(last=False)
+        member_cache_stats['evictions'] += 1
+    return member
+
+
+def invalidate_cached_member(user_id):
+    """Retire un membre du cache (mise à jour ou départ)"""
+    if member_cache.pop(user_id, None) is not None:
+        member_cache_stats['invalidations'] += 1
+
+
+def clear_member_cache():
+    """Vide tout le cache (un changement de rôle peut toucher tous les membres)"""
+    member_cache_stats['invalidations'] += len(member_cache)
+    member_cache.clear()
+
+
+def get_member_cache_stats():
+    """Retourne les compteurs du cache membres avec le taux de succès"""
+    lookups = member_cache_stats['hits'] + member_cache_stats['misses']
+    hit_ratio = member_cache_stats['hits'] / lookups if lookups else 0.0
+    return {**member_cache_stats, 'size': len(member_cache), 'hit_ratio': hit_ratio}
+
+
+def get_member_role_ids(member):
+    """Liste des IDs de rôles d'un membre"""
+    return [role.id for role in member.roles] if hasattr(member, 'roles') and member.roles else []
+
+
+async def check_moderator_permission(user_id, member=None):
     """Vérifie si un utilisateur a les permissions de modérateur"""
     try:
-        server = await client.fetch_server(SERVER_ID)
-        member = await server.fetch_member(user_id)
+        if member is None:
+            member = await get_cached_member(user_id)
         
-        member_role_ids = [role.id for role in member.roles] if hasattr(member, 'roles') and member.roles else []
+        member_role_ids = get_member_role_ids(member)
         
         if MODERATOR_ROLE_1 in member_role_ids or MODERATOR_ROLE_2 in member_role_ids:
             return True
         
         return False
     except Exception as e:
-        print(f'[ERREUR] Verification permissions: {e}')
+        log_event(logging.ERROR, 'permissions', f'Vérification modérateur: {e}', user_id=user_id)
         return False
 
 
 async def check_admin_permission(user_id):
     """Vérifie si un utilisateur a les permissions d'administrateur"""
     try:
-        server = await client.fetch_server(SERVER_ID)
-        member = await server.fetch_member(user_id)
+        member = await get_cached_member(user_id)
         
         # Vérifier si l'utilisateur est propriétaire du serveur
         if hasattr(member, 'is_owner') and member.is_owner:
@@ -331,17 +1185,14 @@ async def check_admin_permission(user_id):
                 return True
         
         # Vérifier les rôles d'administrateur (si définis dans l'env)
-        admin_role = os.getenv('ADMIN_ROLE_ID')
-        if admin_role:
-            member_role_ids = [role.id for role in member.roles] if hasattr(member, 'roles') and member.roles else []
-            if admin_role in member_role_ids:
-                return True
+        if ADMIN_ROLE_ID and ADMIN_ROLE_ID in get_member_role_ids(member):
+            return True
         
         # Si aucun des critères n'est rempli, vérifier s'il a les permissions de modérateur
-        return await check_moderator_permission(user_id)
+        return await check_moderator_permission(user_id, member)
         
     except Exception as e:
-        print(f'[ERREUR] Verification permissions admin: {e}')
+        log_event(logging.ERROR, 'permissions', f'Vérification admin: {e}', user_id=user_id)
         return False
 
 
@@ -380,7 +1231,7 @@ def is_user_banned(user_id):
     
     # Si la durée est dépassée, retirer le ban
     if time.time() > ban_info['expires_at']:
-        del banned_users[user_id]
+        remove_sanction('ban', user_id)
         return False
     
     return True
@@ -399,7 +1250,7 @@ def is_user_muted(user_id):
     
     # Si la durée est dépassée, retirer le mute
     if time.time() > mute_info['expires_at']:
-        del muted_users[user_id]
+        remove_sanction('mute', user_id)
         return False
     
     return True
@@ -417,6 +1268,7 @@ def add_warning(user_id, reason, warned_by):
     }
     
     user_warnings[user_id].append(warning)
+    queue_moderation_write(SQL_INSERT_WARNING, (user_id, reason, warned_by, warning['timestamp']))
     return len(user_warnings[user_id])  # Retourne le nombre total d'avertissements
 
 
@@ -426,61 +1278,701 @@ def get_user_warnings(user_id):
 
 
 # ============================================================================
-# MISTRAL AI INTEGRATION
+# AUTOMOD (flood et messages répétés)
 # ============================================================================
 
-async def get_mistral_response(prompt, user_name="Utilisateur", mood=None):
-    """Obtient une réponse de Mistral AI"""
-    if not MISTRAL_API_KEY:
-        return pick_ai_fallback(mood)
-    
-    try:
-        # Préparer le contexte pour Mistral
-        mood_text = ""
-        if mood:
-            mood_text = f" Ton humeur actuelle est \"{mood['id']}\" ({mood['tone']})."
+AUTOMOD_SETTINGS = config.get('automod', {})
+AUTOMOD_ENABLED = bool(AUTOMOD_SETTINGS.get('enabled', True))
+AUTOMOD_RATE_MAX_MESSAGES = int(AUTOMOD_SETTINGS.get('rate_max_messages', 8))
+AUTOMOD_RATE_WINDOW_SECONDS = float(AUTOMOD_SETTINGS.get('rate_window_seconds', 10))
+AUTOMOD_DUPLICATE_MAX = int(AUTOMOD_SETTINGS.get('duplicate_max', 4))
+AUTOMOD_DUPLICATE_WINDOW_SECONDS = float(AUTOMOD_SETTINGS.get('duplicate_window_seconds', 60))
+AUTOMOD_HISTORY = max(AUTOMOD_RATE_MAX_MESSAGES, int(AUTOMOD_SETTINGS.get('history', 10)))
+AUTOMOD_MAX_HASHED_CHARS = int(AUTOMOD_SETTINGS.get('max_hashed_chars', 500))
+AUTOMOD_MUTE_SECONDS = int(AUTOMOD_SETTINGS.get('mute_seconds', 600))
+AUTOMOD_CLEANUP_MESSAGES = int(AUTOMOD_SETTINGS.get('cleanup_messages', 20))
+AUTOMOD_IDLE_SECONDS = float(AUTOMOD_SETTINGS.get('idle_seconds', 600))
+AUTOMOD_MAX_USERS = int(AUTOMOD_SETTINGS.get('max_users', 100000))
 
-        system_prompt = (
-            "Tu es QUOKKA, un assistant IA sur un serveur Stoat. "
-            "Tu aides les membres avec leurs questions, tu es poli et informatif. "
-            "Réponds de manière concise mais utile. Si tu ne sais pas quelque chose, "
-            f"dis-le honnêtement.{mood_text} Tu tutoies toujours et tu restes naturel. "
-            "Tu es français mais peux répondre dans la langue de la question."
-        )
-        
-        # Appel à l'API Mistral
-        headers = {
-            'Authorization': f'Bearer {MISTRAL_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-        
-        data = {
-            "model": "mistral-tiny",  # Modèle gratuit
+AUTOMOD_REASONS = {'flood': 'envoi de messages trop rapide', 'duplicate': 'messages répétés'}
+
+# Utilisateurs actifs, du moins récent au plus récent : l'éviction des inactifs
+# ne regarde que la tête, et la taille reste bornée à AUTOMOD_MAX_USERS.
+automod_users = OrderedDict()  # Format: {user_id: AutomodHistory}
+automod_in_progress = set()
+automod_stats = {'checked': 0, 'flood': 0, 'duplicate': 0, 'mutes': 0, 'exempted': 0, 'evicted': 0}
+
+AUTOMOD_STRIP_PATTERN = re.compile(r'[\W_]+')
+AUTOMOD_REPEAT_PATTERN = re.compile(r'(.)\1+')
+
+
+class AutomodHistory:
+    """Derniers messages d'un utilisateur : horodatages et empreintes dans deux tableaux circulaires"""
+
+    __slots__ = ('times', 'hashes', 'position', 'count')
+
+    def __init__(self):
+        self.times = array.array('d', bytes(8 * AUTOMOD_HISTORY))
+        self.hashes = array.array('q', bytes(8 * AUTOMOD_HISTORY))
+        self.position = 0
+        self.count = 0
+
+    def push(self, now, content_hash):
+        self.times[self.position] = now
+        self.hashes[self.position] = content_hash
+        self.position = (self.position + 1) % AUTOMOD_HISTORY
+        self.count = min(self.count + 1, AUTOMOD_HISTORY)
+
+    def last_seen(self):
+        return self.times[(self.position - 1) % AUTOMOD_HISTORY]
+
+    def rate_exceeded(self, now):
+        """Vrai si les AUTOMOD_RATE_MAX_MESSAGES derniers messages tiennent dans la fenêtre"""
+        if self.count < AUTOMOD_RATE_MAX_MESSAGES:
+            return False
+        oldest = self.times[(self.position - AUTOMOD_RATE_MAX_MESSAGES) % AUTOMOD_HISTORY]
+        return now - oldest <= AUTOMOD_RATE_WINDOW_SECONDS
+
+    def duplicates(self, now, content_hash):
+        """Nombre de messages récents ayant la même empreinte (taille fixe : coût constant)"""
+        total = 0
+        for index in range(self.count):
+            if self.hashes[index] == content_hash and now - self.times[index] <= AUTOMOD_DUPLICATE_WINDOW_SECONDS:
+                total += 1
+        return total
+
+
+def automod_fingerprint(content):
+    """Empreinte du texte normalisé : casse, ponctuation, espaces et lettres répétées ignorés"""
+    text = AUTOMOD_STRIP_PATTERN.sub('', content[:AUTOMOD_MAX_HASHED_CHARS].casefold())
+    if not text:
+        return 0
+    return hash(AUTOMOD_REPEAT_PATTERN.sub(r'\1', text)) or 1
+
+
+def evict_automod_users(now):
+    """Retire les utilisateurs inactifs (tête de l'OrderedDict) puis applique le plafond"""
+    while automod_users:
+        user_id, history = next(iter(automod_users.items()))
+        if now - history.last_seen() <= AUTOMOD_IDLE_SECONDS and len(automod_users) <= AUTOMOD_MAX_USERS:
+            break
+        del automod_users[user_id]
+        automod_stats['evicted'] += 1
+
+
+def automod_check(user_id, content, now=None):
+    """Enregistre un message ; retourne 'flood' ou 'duplicate' si un seuil est dépassé, sinon None"""
+    now = time.monotonic() if now is None else now
+    automod_stats['checked'] += 1
+    content_hash = automod_fingerprint(content) if content else 0
+    history = automod_users.get(user_id)
+    if history is None:
+        history = automod_users[user_id] = AutomodHistory()
+        history.push(now, content_hash)
+        evict_automod_users(now)
+    else:
+        automod_users.move_to_end(user_id)
+        history.push(now, content_hash)
+    if history.rate_exceeded(now):
+        automod_stats['flood'] += 1
+        return 'flood'
+    if content_hash and history.duplicates(now, content_hash) >= AUTOMOD_DUPLICATE_MAX:
+        automod_stats['duplicate'] += 1
+        return 'duplicate'
+    return None
+
+
+async def apply_automod_mute(message, reason):
+    """Mute automatique (même flux que !mute) ; retourne False si l'auteur est exempté"""
+    user_id = message.author.id
+    if user_id in automod_in_progress or is_user_muted(user_id):
+        return True
+    automod_in_progress.add(user_id)
+    try:
+        if await check_moderator_permission(user_id):
+            automod_stats['exempted'] += 1
+            automod_users.pop(user_id, None)
+            return False
+        
+        label = AUTOMOD_REASONS[reason]
+        set_sanction('mute', user_id, {
+            'reason': f'Automod : {label}',
+            'duration': AUTOMOD_MUTE_SECONDS,
+            'expires_at': time.time() + AUTOMOD_MUTE_SECONDS,
+            'muted_by': 'automod'
+        })
+        automod_users.pop(user_id, None)
+        automod_stats['mutes'] += 1
+        log_event(logging.INFO, 'automod', f'{message.author.name} muté automatiquement ({label})',
+                  user_id=user_id, reason=reason)
+        
+        await send_message(
+            message.channel,
+            f"🤖🔇 {message.author.mention} a été muté automatiquement pour {AUTOMOD_MUTE_SECONDS // 60} min "
+            f"({label}).",
+            priority=PRIORITY_MODERATION
+        )
+        await cleanup_user_messages(message.channel, user_id, AUTOMOD_CLEANUP_MESSAGES)
+        return True
+    except Exception as e:
+        log_event(logging.ERROR, 'erreur', f'Automod: {e}')
+        return True
+    finally:
+        automod_in_progress.discard(user_id)
+
+
+# ============================================================================
+# MISTRAL AI INTEGRATION
+# ============================================================================
+
+MISTRAL_API_URL = os.getenv('MISTRAL_API_URL') or 'https://api.mistral.ai/v1/chat/completions'
+MISTRAL_SETTINGS = config.get('mistral', {})
+MISTRAL_CONNECT_TIMEOUT = float(MISTRAL_SETTINGS.get('connect_timeout', 5))
+MISTRAL_READ_TIMEOUT = float(MISTRAL_SETTINGS.get('read_timeout', 30))
+MISTRAL_MAX_RETRIES = int(MISTRAL_SETTINGS.get('max_retries', 3))
+MISTRAL_BACKOFF_BASE = float(MISTRAL_SETTINGS.get('backoff_base', 0.5))
+MISTRAL_BACKOFF_MAX = float(MISTRAL_SETTINGS.get('backoff_max', 8))
+MISTRAL_POOL_SIZE = int(MISTRAL_SETTINGS.get('pool_size', 10))
+MISTRAL_KEEPALIVE_SECONDS = float(MISTRAL_SETTINGS.get('keepalive_seconds', 60))
+MISTRAL_STREAM = bool(MISTRAL_SETTINGS.get('stream', True))
+MISTRAL_STREAM_EDIT_INTERVAL_SECONDS = float(MISTRAL_SETTINGS.get('stream_edit_interval_seconds', 1))
+
+# Session HTTP partagée (un seul pool de connexions keep-alive pour tout le bot)
+mistral_session = None
+
+
+def get_mistral_session():
+    """Retourne la session HTTP Mistral, créée à la première utilisation"""
+    global mistral_session
+    if mistral_session is None or mistral_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=MISTRAL_POOL_SIZE,
+            keepalive_timeout=MISTRAL_KEEPALIVE_SECONDS
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=MISTRAL_CONNECT_TIMEOUT,
+            sock_read=MISTRAL_READ_TIMEOUT
+        )
+        mistral_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={
+                'Authorization': f'Bearer {MISTRAL_API_KEY}',
+                'Content-Type': 'application/json'
+            }
+        )
+    return mistral_session
+
+
+async def close_mistral_session():
+    """Ferme proprement la session HTTP Mistral"""
+    global mistral_session
+    if mistral_session is not None and not mistral_session.closed:
+        await mistral_session.close()
+    mistral_session = None
+
+
+async def close_http_sessions():
+    """Ferme les sessions HTTP partagées du bot (arrêt du client)"""
+    for label, close in (('Mistral', close_mistral_session), ('monitoring', close_monitoring_session)):
+        try:
+            await close()
+        except Exception as e:
+            log_event(logging.WARNING, 'arret', f'Fermeture de la session {label}: {e}')
+
+
+def parse_retry_after(value):
+    """Parse l'en-tête Retry-After (en secondes), None si absent ou invalide"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def mistral_backoff_delay(attempt, retry_after=None):
+    """Délai avant la tentative suivante : backoff exponentiel avec jitter complet"""
+    if retry_after is not None:
+        return min(retry_after, MISTRAL_BACKOFF_MAX)
+    ceiling = min(MISTRAL_BACKOFF_MAX, MISTRAL_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+async def request_mistral(payload, read_body):
+    """Boucle de requête commune à post_mistral et stream_mistral
+
+    Retry sur 429/5xx et erreurs de connexion, uniquement avant le début du
+    corps d'une réponse 200 : read_body(response, start) lit ce corps et ses
+    erreurs ne sont jamais rejouées (un flux déjà transmis serait réémis).
+    Les timeouts ne sont pas rejoués pour ne pas multiplier l'attente de
+    l'utilisateur. Retourne (status, résultat de read_body), ou (status,
+    texte brut de la dernière réponse) en cas d'erreur HTTP.
+    """
+    session = get_mistral_session()
+    attempt = 0
+    while True:
+        retry_after = None
+        start = time.monotonic()
+        reading = False
+        try:
+            async with session.post(MISTRAL_API_URL, json=payload) as response:
+                if response.status == 200:
+                    reading = True
+                    return response.status, await read_body(response, start)
+                body = await response.text()
+                if response.status != 429 and response.status < 500:
+                    return response.status, body
+                if attempt >= MISTRAL_MAX_RETRIES:
+                    return response.status, body
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                log_event(logging.WARNING, 'mistral', f'Statut {response.status}, nouvelle tentative',
+                          attempt=attempt + 1, max_retries=MISTRAL_MAX_RETRIES)
+        except (aiohttp.ServerTimeoutError, asyncio.TimeoutError):
+            # ServerTimeoutError hérite de ClientConnectionError : à exclure avant le retry
+            raise
+        except aiohttp.ClientConnectionError as e:
+            if reading or attempt >= MISTRAL_MAX_RETRIES:
+                raise
+            log_event(logging.WARNING, 'mistral', f'Connexion interrompue ({e}), nouvelle tentative',
+                      attempt=attempt + 1, max_retries=MISTRAL_MAX_RETRIES)
+        await asyncio.sleep(mistral_backoff_delay(attempt, retry_after))
+        attempt += 1
+
+
+async def post_mistral(payload):
+    """Envoie une requête à Mistral ; retourne (status, JSON décodé si 200, sinon texte brut)"""
+    return await request_mistral(payload, lambda response, start: response.json())
+
+
+async def stream_mistral(payload, on_delta):
+    """Envoie une requête Mistral en mode streaming (SSE), avec les mêmes retries que post_mistral.
+
+    Appelle on_delta(texte_cumulé) à chaque fragment reçu. Retourne
+    (status, texte complet ou corps d'erreur, délai du premier token en s).
+    """
+    async def read_stream(response, start):
+        parts = []
+        first_token = None
+        async for raw_line in response.content:
+            line = raw_line.decode('utf-8').strip()
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+            if not delta:
+                continue
+            if first_token is None:
+                first_token = time.monotonic() - start
+            parts.append(delta)
+            await on_delta(''.join(parts))
+        return ''.join(parts), first_token
+
+    status, result = await request_mistral({**payload, "stream": True}, read_stream)
+    if status != 200:
+        return status, result, None
+    text, first_token = result
+    return status, text, first_token
+
+
+async def fetch_mistral_answer(prompt, mood=None, on_delta=None, history=()):
+    """Interroge Mistral ; retourne (réponse, latence) ou (None, latence) en cas d'échec
+
+    Avec on_delta et le streaming activé, la réponse arrive par fragments
+    et on_delta(texte_cumulé) est appelé au fil de l'eau.
+    """
+    start = time.monotonic()
+    try:
+        # Préparer le contexte pour Mistral
+        mood_text = ""
+        if mood:
+            mood_text = f" Ton humeur actuelle est \"{mood['id']}\" ({mood['tone']})."
+
+        system_prompt = (
+            "Tu es QUOKKA, un assistant IA sur un serveur Stoat. "
+            "Tu aides les membres avec leurs questions, tu es poli et informatif. "
+            "Réponds de manière concise mais utile. Si tu ne sais pas quelque chose, "
+            f"dis-le honnêtement.{mood_text} Tu tutoies toujours et tu restes naturel. "
+            "Tu es français mais peux répondre dans la langue de la question."
+        )
+        
+        data = {
+            "model": "mistral-tiny",  # Modèle gratuit
             "messages": [
                 {"role": "system", "content": system_prompt},
+                *history,
                 {"role": "user", "content": prompt}
             ],
             "max_tokens": 500,
             "temperature": 0.7
         }
         
-        response = requests.post(
-            'https://api.mistral.ai/v1/chat/completions',
-            headers=headers,
-            json=data,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result['choices'][0]['message']['content'].strip()
+        # Appel à l'API Mistral (non bloquant pour la boucle d'événements)
+        if MISTRAL_STREAM and on_delta is not None:
+            status, result, first_token = await stream_mistral(data, on_delta)
+            if status == 200:
+                if first_token is not None:
+                    log_event(logging.INFO, 'ai', f'Premier token après {first_token * 1000:.0f} ms',
+                              ttft_ms=round(first_token * 1000), total_ms=round((time.monotonic() - start) * 1000))
+                answer = result.strip()
         else:
-            print(f"[MISTRAL] Erreur API: {response.status_code} - {response.text}")
-            return pick_ai_fallback(mood)
+            status, result = await post_mistral(data)
+            if status == 200:
+                answer = (result['choices'][0]['message']['content'] or '').strip()
+        
+        if status == 200:
+            if answer:
+                record_mistral_metrics(time.monotonic() - start)
+                return answer, time.monotonic() - start
+            # Réponse vide : repli côté appelant, donc un échec pour /metrics comme pour le disjoncteur
+            log_event(logging.WARNING, 'mistral', 'Réponse vide')
+            record_mistral_metrics(time.monotonic() - start, 'empty')
+            return None, time.monotonic() - start
+        
+        log_event(logging.ERROR, 'mistral', f'Erreur API: {status} - {result}', status=status)
+        record_mistral_metrics(time.monotonic() - start, f'http_{status}')
             
+    except asyncio.TimeoutError:
+        log_event(logging.WARNING, 'mistral', 'Timeout')
+        record_mistral_metrics(time.monotonic() - start, 'timeout')
     except Exception as e:
-        print(f"[MISTRAL] Exception: {e}")
+        log_event(logging.ERROR, 'mistral', f'Exception: {e}', exc_info=True)
+        record_mistral_metrics(time.monotonic() - start, 'exception')
+    return None, time.monotonic() - start
+
+
+# ----------------------------------------------------------------------------
+# Cache des réponses (TTL + LRU) et requêtes identiques fusionnées
+# ----------------------------------------------------------------------------
+
+MISTRAL_CACHE_SETTINGS = config.get('mistral_cache', {})
+MISTRAL_CACHE_TTL_SECONDS = float(MISTRAL_CACHE_SETTINGS.get('ttl_seconds', 600))
+MISTRAL_CACHE_MAX_SIZE = int(MISTRAL_CACHE_SETTINGS.get('max_size', 500))
+
+mistral_cache = OrderedDict()  # Format: {(question normalisée, ton): (expire_à, réponse, latence)}
+mistral_inflight = {}  # Format: {(question normalisée, ton): Future}
+mistral_cache_stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'saved_seconds': 0.0}
+
+
+def normalize_prompt(prompt):
+    """Normalise une question pour le cache : sans mention du bot, casse et espaces unifiés"""
+    if client.user is not None:
+        prompt = prompt.replace(f"<@{client.user.id}>", " ").replace(f"<@!{client.user.id}>", " ")
+    return ' '.join(prompt.casefold().split())
+
+
+def mistral_cache_key(prompt, mood=None):
+    """Clé du cache : question normalisée + ton de l'humeur"""
+    return normalize_prompt(prompt), mood['tone'] if mood else None
+
+
+async def get_cached_mistral_answer(prompt, mood=None, on_delta=None):
+    """Réponse Mistral à une question sans contexte, via le cache ; None en cas d'échec"""
+    key = mistral_cache_key(prompt, mood)
+    now = time.monotonic()
+    entry = mistral_cache.get(key)
+    if entry is not None and entry[0] > now:
+        mistral_cache.move_to_end(key)
+        mistral_cache_stats['hits'] += 1
+        mistral_cache_stats['saved_seconds'] += entry[2]
+        log_sampled('ai', 'Réponse servie depuis le cache', question=key[0][:80])
+        return entry[1]
+    
+    # Une même question déjà en cours : attendre sa réponse plutôt que rappeler Mistral
+    pending = mistral_inflight.get(key)
+    if pending is not None:
+        mistral_cache_stats['coalesced'] += 1
+        answer, latency = await asyncio.shield(pending)
+        mistral_cache_stats['saved_seconds'] += latency
+        return answer
+    
+    # Disjoncteur ouvert (panne Mistral) : repli immédiat au lieu d'attendre le timeout
+    if not mistral_circuit_allows():
+        mistral_breaker['short_circuited'] += 1
+        return None
+    
+    mistral_cache_stats['misses'] += 1
+    pending = asyncio.get_running_loop().create_future()
+    mistral_inflight[key] = pending
+    try:
+        answer, latency = await fetch_mistral_answer(prompt, mood, on_delta)
+    except BaseException:
+        pending.set_result((None, 0.0))
+        raise
+    finally:
+        mistral_inflight.pop(key, None)
+    pending.set_result((answer, latency))
+    record_mistral_result(answer is not None)
+    
+    if answer is None:
+        return None  # Les échecs ne sont pas mis en cache
+    
+    mistral_cache[key] = (time.monotonic() + MISTRAL_CACHE_TTL_SECONDS, answer, latency)
+    mistral_cache.move_to_end(key)
+    while len(mistral_cache) > MISTRAL_CACHE_MAX_SIZE:
+        mistral_cache.popitem(last=False)
+        mistral_cache_stats['evictions'] += 1
+    return answer
+
+
+def get_mistral_cache_stats():
+    """Retourne les compteurs du cache Mistral avec le taux de succès"""
+    lookups = mistral_cache_stats['hits'] + mistral_cache_stats['coalesced'] + mistral_cache_stats['misses']
+    served = mistral_cache_stats['hits'] + mistral_cache_stats['coalesced']
+    hit_ratio = served / lookups if lookups else 0.0
+    return {**mistral_cache_stats, 'size': len(mistral_cache), 'inflight': len(mistral_inflight), 'hit_ratio': hit_ratio}
+
+# ----------------------------------------------------------------------------
+# Mémoire de conversation par canal (budget de tokens, éviction LRU/TTL)
+# ----------------------------------------------------------------------------
+
+CONVERSATION_SETTINGS = config.get('conversation_memory', {})
+CONVERSATION_MAX_TURNS = int(CONVERSATION_SETTINGS.get('max_turns', 10))
+CONVERSATION_TOKEN_BUDGET = int(CONVERSATION_SETTINGS.get('token_budget', 1500))
+CONVERSATION_TTL_SECONDS = float(CONVERSATION_SETTINGS.get('ttl_seconds', 1800))
+CONVERSATION_MAX_CHANNELS = int(CONVERSATION_SETTINGS.get('max_channels', 500))
+
+# Format: {channel_id: (dernier_accès, deque[(question, réponse, tokens)])}
+# L'ordre des clés suit le dernier accès : les canaux inactifs sont en tête.
+conversation_memory = OrderedDict()
+
+
+def estimate_tokens(text):
+    """Estimation locale du nombre de tokens (~4 caractères par token)"""
+    return len(text) // 4 + 1
+
+
+def evict_idle_conversations(now):
+    """Oublie les canaux inactifs depuis plus que le TTL, puis les plus anciens au-delà du plafond"""
+    while conversation_memory:
+        channel_id, (touched, _) = next(iter(conversation_memory.items()))
+        if now - touched < CONVERSATION_TTL_SECONDS and len(conversation_memory) <= CONVERSATION_MAX_CHANNELS:
+            break
+        del conversation_memory[channel_id]
+
+
+def get_conversation_history(channel_id):
+    """Derniers échanges du canal au format Mistral, tronqués au budget de tokens"""
+    evict_idle_conversations(time.monotonic())
+    entry = conversation_memory.get(channel_id)
+    if entry is None:
+        return []
+    history = []
+    budget = CONVERSATION_TOKEN_BUDGET
+    for question, answer, tokens in reversed(entry[1]):
+        if tokens > budget:
+            break
+        budget -= tokens
+        history.append({"role": "assistant", "content": answer})
+        history.append({"role": "user", "content": question})
+    history.reverse()
+    return history
+
+
+def remember_exchange(channel_id, question, answer):
+    """Ajoute un échange à la mémoire du canal (tampon circulaire de CONVERSATION_MAX_TURNS)"""
+    now = time.monotonic()
+    entry = conversation_memory.pop(channel_id, None)
+    turns = entry[1] if entry is not None else deque(maxlen=CONVERSATION_MAX_TURNS)
+    turns.append((question, answer, estimate_tokens(question) + estimate_tokens(answer)))
+    conversation_memory[channel_id] = (now, turns)
+    evict_idle_conversations(now)
+
+
+async def get_mistral_response(prompt, user_name="Utilisateur", mood=None, on_delta=None, channel_id=None):
+    """Obtient une réponse de Mistral AI (avec la mémoire du canal si channel_id est fourni)"""
+    if not MISTRAL_API_KEY:
         return pick_ai_fallback(mood)
+    
+    history = get_conversation_history(channel_id) if channel_id is not None else []
+    if not history:
+        answer = await get_cached_mistral_answer(prompt, mood, on_delta)
+    elif mistral_circuit_allows():
+        # Une question de suivi dépend du contexte : ni cache ni fusion
+        answer, _ = await fetch_mistral_answer(prompt, mood, on_delta, history)
+        record_mistral_result(answer is not None)
+    else:
+        mistral_breaker['short_circuited'] += 1
+        answer = None
+    
+    if answer is None:
+        return pick_ai_fallback(mood)
+    if channel_id is not None:
+        remember_exchange(channel_id, prompt, answer)
+    return answer
+
+
+# ----------------------------------------------------------------------------
+# Disjoncteur Mistral
+# ----------------------------------------------------------------------------
+
+AI_QUEUE_SETTINGS = config.get('ai_queue', {})
+MISTRAL_BREAKER_THRESHOLD = int(AI_QUEUE_SETTINGS.get('breaker_failure_threshold', 5))
+MISTRAL_BREAKER_COOLDOWN_SECONDS = float(AI_QUEUE_SETTINGS.get('breaker_cooldown_seconds', 30))
+
+# Fermé : opened_at None. Ouvert : replis immédiats. Après le délai de
+# refroidissement, une seule requête d'essai passe (semi-ouvert).
+mistral_breaker = {'failures': 0, 'opened_at': None, 'trial': False, 'trips': 0, 'short_circuited': 0}
+
+
+def mistral_circuit_allows():
+    """Indique si un appel Mistral peut partir selon l'état du disjoncteur"""
+    if mistral_breaker['opened_at'] is None:
+        return True
+    if mistral_breaker['trial']:
+        return False
+    if time.monotonic() - mistral_breaker['opened_at'] >= MISTRAL_BREAKER_COOLDOWN_SECONDS:
+        mistral_breaker['trial'] = True
+        return True
+    return False
+
+
+def record_mistral_result(success):
+    """Met à jour le disjoncteur après un appel Mistral (erreur ou timeout = échec)"""
+    was_open = mistral_breaker['opened_at'] is not None
+    mistral_breaker['trial'] = False
+    if success:
+        mistral_breaker['failures'] = 0
+        mistral_breaker['opened_at'] = None
+        if was_open:
+            log_event(logging.INFO, 'mistral', 'Disjoncteur refermé, Mistral répond à nouveau')
+        return
+    mistral_breaker['failures'] += 1
+    if was_open or mistral_breaker['failures'] >= MISTRAL_BREAKER_THRESHOLD:
+        mistral_breaker['opened_at'] = time.monotonic()
+        if not was_open:
+            mistral_breaker['trips'] += 1
+            log_event(logging.WARNING, 'mistral',
+                      f'Disjoncteur ouvert après {mistral_breaker["failures"]} échecs consécutifs',
+                      cooldown_seconds=MISTRAL_BREAKER_COOLDOWN_SECONDS)
+
+
+# ----------------------------------------------------------------------------
+# File de travail IA (plafond global, tour de rôle par utilisateur)
+# ----------------------------------------------------------------------------
+
+AI_MAX_CONCURRENCY = int(AI_QUEUE_SETTINGS.get('max_concurrency', 3))
+AI_MAX_PENDING = int(AI_QUEUE_SETTINGS.get('max_pending', 20))
+AI_MAX_PENDING_PER_USER = int(AI_QUEUE_SETTINGS.get('max_pending_per_user', 2))
+
+ai_queues = OrderedDict()  # Format: {user_id: deque de jobs} ; l'ordre des clés donne le tour de rôle
+ai_queue_wakeup = asyncio.Event()
+ai_workers = []
+ai_queue_stats = {'accepted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'pending': 0, 'active': 0}
+
+
+def next_ai_job():
+    """Retire le prochain job : un par utilisateur à tour de rôle"""
+    user_id, jobs = next(iter(ai_queues.items()))
+    job = jobs.popleft()
+    if jobs:
+        ai_queues.move_to_end(user_id)
+    else:
+        del ai_queues[user_id]
+    ai_queue_stats['pending'] -= 1
+    return job
+
+
+async def ai_worker():
+    """Exécute les jobs IA en file, au plus AI_MAX_CONCURRENCY à la fois"""
+    while True:
+        while not ai_queues:
+            ai_queue_wakeup.clear()
+            await ai_queue_wakeup.wait()
+        job = next_ai_job()
+        ai_queue_stats['active'] += 1
+        try:
+            await job()
+            ai_queue_stats['completed'] += 1
+        except Exception as e:
+            ai_queue_stats['failed'] += 1
+            log_event(logging.ERROR, 'ai', f'Job IA en échec: {e}', exc_info=True)
+        finally:
+            ai_queue_stats['active'] -= 1
+
+
+def submit_ai_job(user_id, job):
+    """Met un job IA en file ; retourne False (sans attendre) si la file est pleine"""
+    if (ai_queue_stats['pending'] >= AI_MAX_PENDING
+            or len(ai_queues.get(user_id, ())) >= AI_MAX_PENDING_PER_USER):
+        ai_queue_stats['rejected'] += 1
+        return False
+    ai_queues.setdefault(user_id, deque()).append(job)
+    ai_queue_stats['pending'] += 1
+    ai_queue_stats['accepted'] += 1
+    ai_workers[:] = [worker for worker in ai_workers if not worker.done()]
+    while len(ai_workers) < AI_MAX_CONCURRENCY:
+        ai_workers.append(asyncio.create_task(ai_worker()))
+    ai_queue_wakeup.set()
+    return True
+
+
+def get_ai_queue_stats():
+    """Retourne l'état de la file IA et du disjoncteur"""
+    breaker_state = 'closed'
+    if mistral_breaker['opened_at'] is not None:
+        breaker_state = 'half-open' if mistral_breaker['trial'] else 'open'
+    return {
+        **ai_queue_stats,
+        'users_waiting': len(ai_queues),
+        'breaker': breaker_state,
+        'breaker_trips': mistral_breaker['trips'],
+        'short_circuited': mistral_breaker['short_circuited']
+    }
+
+
+def make_stream_editor(reply, channel_id, prefix=''):
+    """Retourne (on_delta, finish) pour afficher une réponse en cours dans le message `reply`
+
+    on_delta édite au plus une fois par MISTRAL_STREAM_EDIT_INTERVAL_SECONDS,
+    sans bloquer la lecture du flux ; finish attend l'édition en vol puis
+    écrit le texte final.
+    """
+    state = {'last_edit': 0.0, 'task': None}
+
+    async def edit(content):
+        await run_on_channel(channel_id, lambda: reply.edit(content=content), PRIORITY_CHATTER)
+
+    async def on_delta(text):
+        if state['task'] is not None and not state['task'].done():
+            return
+        now = time.monotonic()
+        if now - state['last_edit'] < MISTRAL_STREAM_EDIT_INTERVAL_SECONDS:
+            return
+        state['last_edit'] = now
+        state['task'] = asyncio.create_task(edit(f"{prefix}{text} ▌"))
+
+    async def finish(text):
+        if state['task'] is not None:
+            await asyncio.gather(state['task'], return_exceptions=True)
+        await edit(f"{prefix}{text}")
+
+    return on_delta, finish
+
+
+async def answer_ai_question(message, question):
+    """Répond à une question IA : message "je réfléchis" puis réponse éditée en place"""
+    mood = pick_mood()
+    reply = await send_message(message.channel, f"🤖 {pick_thinking_response(mood)}", priority=PRIORITY_CHATTER)
+    
+    # La réponse remplace le message "je réfléchis", éditée au fil du streaming
+    on_delta, finish = make_stream_editor(reply, message.channel.id, f"{message.author.mention} ")
+    if is_wellbeing_question(question):
+        ai_response = pick_wellbeing_response(mood)
+    else:
+        ai_response = await get_mistral_response(question, message.author.name, mood, on_delta, message.channel.id)
+    
+    # Envoyer la réponse
+    try:
+        await finish(ai_response)
+    except Exception as e:
+        log_event(logging.WARNING, 'ai', f'Édition impossible, envoi d\'un nouveau message: {e}')
+        await send_message(message.channel, f"{message.author.mention} {ai_response}", priority=PRIORITY_CHATTER)
+    log_event(logging.INFO, 'ai', f'Réponse envoyée à {message.author.name}')
+
 
 def is_bot_mentioned(message, bot_id):
     """Vérifie si le bot est mentionné dans le message"""
@@ -495,180 +1987,1285 @@ def is_bot_mentioned(message, bot_id):
         return True
     return False
 
+
+# ============================================================================
+# DÉGRADÉS DE RÔLES
+# ============================================================================
+
+ROLE_GRADIENT_SETTINGS = config.get('role_gradients', {})
+ROLE_GRADIENT_CONCURRENCY = int(ROLE_GRADIENT_SETTINGS.get('concurrency', 3))
+
+role_gradient_lock = asyncio.Lock()
+role_gradient_stats = {'edited': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+
+
+def build_role_gradients():
+    """Dégradés nommés de config.json ; à défaut, le dégradé historique (GRADIENT_*)"""
+    gradients = []
+    for entry in ROLE_GRADIENT_SETTINGS.get('gradients', []):
+        colors = entry.get('colors', [])
+        steps = int(entry.get('steps', len(colors)))
+        gradients.append({
+            'name': entry['name'],
+            'start_role_id': entry.get('start_role_id') or GRADIENT_ROLE_ID,
+            'colors': colors[:steps]
+        })
+    if not gradients:
+        gradients.append({'name': 'principal', 'start_role_id': GRADIENT_ROLE_ID,
+                          'colors': GRADIENT_COLORS[:GRADIENT_STEPS]})
+    return gradients
+
+
+def normalize_color(color):
+    return color.strip().lower() if color else None
+
+
+def plan_role_changes(pairs, bot_top_rank):
+    """{role_id: (rôle, couleur)} pour les paires (rôle, couleur) dont la couleur diffère
+
+    Les rôles au-dessus du bot (non modifiables) sont ignorés sans appel.
+    """
+    plan = {}
+    for role, color in pairs:
+        if normalize_color(role.color) == normalize_color(color):
+            role_gradient_stats['unchanged'] += 1
+        elif bot_top_rank is not None and role.rank <= bot_top_rank:
+            role_gradient_stats['skipped'] += 1
+        else:
+            plan[role.id] = (role, color)
+    return plan
+
+
+async def plan_role_gradient(server, gradient, bot_top_rank):
+    """Rôles à modifier pour un dégradé, pris dans l'ordre des rangs à partir du rôle de départ
+
+    Si le rôle de départ n'est pas dans server.roles, il est récupéré
+    directement et reçoit seulement la première couleur.
+    """
+    roles_sorted = sorted(server.roles.values(), key=lambda role: role.rank)
+    start_index = next((index for index, role in enumerate(roles_sorted) if role.id == gradient['start_role_id']), None)
+    if start_index is not None:
+        return plan_role_changes(zip(roles_sorted[start_index:], gradient['colors']), bot_top_rank)
+    try:
+        role = await server.fetch_role(gradient['start_role_id'])
+    except Exception as e:
+        log_event(logging.WARNING, 'gradient', f'Rôle de départ introuvable: {e}', gradient=gradient['name'],
+                  role_id=gradient['start_role_id'])
+        return {}
+    return plan_role_changes([(role, gradient['colors'][0])], bot_top_rank)
+
+
 async def apply_role_gradient():
-    if not SERVER_ID or not GRADIENT_ROLE_ID:
-        print('[GRADIENT] Configuration manquante.')
+    """Applique les dégradés : seuls les rôles dont la couleur diffère sont modifiés, en parallèle borné"""
+    if not SERVER_ID:
+        log_event(logging.WARNING, 'gradient', 'Configuration manquante')
+        return
+    if role_gradient_lock.locked():
+        return  # Reconnexion pendant une application déjà en cours
+    async with role_gradient_lock:
+        try:
+            server = await get_cached_server()
+        except Exception as e:
+            log_event(logging.ERROR, 'gradient', f'Impossible de récupérer le serveur: {e}')
+            return
+        bot_top_rank = None
+        try:
+            bot_member = await get_cached_member(client.user.id)
+            role_ranks = [server.roles[role_id].rank for role_id in bot_member.role_ids if role_id in server.roles]
+            if role_ranks:
+                bot_top_rank = min(role_ranks)
+        except Exception as e:
+            log_event(logging.WARNING, 'gradient', f'Impossible de récupérer le rôle du bot: {e}')
+        if bot_top_rank is None:
+            log_event(logging.WARNING, 'gradient', 'Impossible de déterminer le rang du bot')
+
+        # Un rôle présent dans plusieurs dégradés prend la couleur du dernier
+        plan = {}
+        unchanged, skipped = role_gradient_stats['unchanged'], role_gradient_stats['skipped']
+        for gradient in build_role_gradients():
+            if gradient['colors']:
+                plan.update(await plan_role_gradient(server, gradient, bot_top_rank))
+        unchanged = role_gradient_stats['unchanged'] - unchanged
+        skipped = role_gradient_stats['skipped'] - skipped
+        if not plan:
+            log_event(logging.INFO, 'gradient', 'Couleurs déjà à jour, aucun appel', unchanged=unchanged,
+                      skipped=skipped)
+            return
+
+        in_flight = asyncio.Semaphore(ROLE_GRADIENT_CONCURRENCY)
+
+        async def edit_role(role, color):
+            async with in_flight:
+                try:
+                    await role.edit(color=color)
+                    role_gradient_stats['edited'] += 1
+                    return True
+                except Exception as e:
+                    role_gradient_stats['failed'] += 1
+                    log_event(logging.WARNING, 'gradient', f'Échec pour {role.name}: {e}', role_id=role.id)
+                    return False
+
+        results = await asyncio.gather(*(edit_role(role, color) for role, color in plan.values()))
+        log_event(logging.INFO, 'gradient', 'Rôles mis à jour', edited=sum(results), planned=len(plan),
+                  unchanged=unchanged, skipped=skipped)
+
+
+# ============================================================================
+# MONITORING DES SERVICES
+# ============================================================================
+
+MONITORING_SETTINGS = config.get('monitoring', {})
+MONITORING_HTTP_TIMEOUT = float(MONITORING_SETTINGS.get('http_timeout', 8))
+MONITORING_TCP_TIMEOUT = float(MONITORING_SETTINGS.get('tcp_timeout', 6))
+# Filet de sécurité d'une sonde (DNS, lecture du corps...) : juste au-dessus des timeouts HTTP/TCP,
+# pour que ceux-ci, plus précis, se déclenchent d'abord
+MONITORING_PROBE_BUDGET_SECONDS = float(MONITORING_SETTINGS.get(
+    'probe_budget_seconds', max(MONITORING_HTTP_TIMEOUT, MONITORING_TCP_TIMEOUT) + 1
+))
+MONITORING_DEFAULT_INTERVAL_SECONDS = float(MONITORING_SETTINGS.get('interval_seconds', MONITORING_INTERVAL_SECONDS))
+MONITORING_MIN_INTERVAL_SECONDS = float(MONITORING_SETTINGS.get('min_interval_seconds', 15))
+MONITORING_MAX_INTERVAL_SECONDS = float(MONITORING_SETTINGS.get('max_interval_seconds', 300))
+MONITORING_JITTER = float(MONITORING_SETTINGS.get('jitter', 0.1))
+MONITORING_STABLE_AFTER = int(MONITORING_SETTINGS.get('stable_after', 5))
+MONITORING_CONFIRM_FAILURES = int(MONITORING_SETTINGS.get('confirm_failures', 3))
+MONITORING_REFRESH_SECONDS = float(MONITORING_SETTINGS.get('refresh_seconds', 30))
+
+def build_monitoring_services():
+    """Services surveillés, lus depuis la section monitoring.services de config.json"""
+    services = []
+    for entry in MONITORING_SETTINGS.get('services', []):
+        service = {
+            "label": entry["label"],
+            "kind": entry.get("kind", "http"),
+            "interval": float(entry.get("interval_seconds", MONITORING_DEFAULT_INTERVAL_SECONDS))
+        }
+        if entry.get("id"):
+            service["id"] = entry["id"]
+        if service["kind"] == "http":
+            service["target"] = entry["target"]
+        else:
+            # "host" direct, ou extrait d'une URL ("target")
+            service["host"] = entry.get("host") or urllib.parse.urlparse(entry.get("target", "")).hostname
+            service["port"] = int(entry["port"])
+        services.append(service)
+    return services
+
+# Session HTTP des sondes (distincte de celle de Mistral : timeouts différents)
+monitoring_session = None
+
+
+def get_monitoring_session():
+    """Retourne la session HTTP utilisée par les sondes de monitoring"""
+    global monitoring_session
+    if monitoring_session is None or monitoring_session.closed:
+        # force_close : chaque sonde mesure une connexion neuve, comme un vrai visiteur
+        connector = aiohttp.TCPConnector(limit=0, force_close=True)
+        monitoring_session = aiohttp.ClientSession(connector=connector)
+    return monitoring_session
+
+
+async def close_monitoring_session():
+    """Ferme la session HTTP des sondes"""
+    global monitoring_session
+    if monitoring_session is not None and not monitoring_session.closed:
+        await monitoring_session.close()
+    monitoring_session = None
+
+async def check_http(url, timeout=None):
+    start = time.perf_counter()
+    timeout = MONITORING_HTTP_TIMEOUT if timeout is None else timeout
+    try:
+        session = get_monitoring_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            return response.status < 400, str(response.status), duration_ms
+    except asyncio.TimeoutError:
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        return False, f"timeout ({timeout:g} s)", duration_ms
+    except Exception as e:
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        return False, str(e), duration_ms
+
+async def check_tcp(host, port, timeout=None):
+    start = time.perf_counter()
+    timeout = MONITORING_TCP_TIMEOUT if timeout is None else timeout
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return True, "OK", duration_ms
+    except asyncio.TimeoutError:
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        return False, f"timeout ({timeout:g} s)", duration_ms
+    except Exception as e:
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        return False, str(e), duration_ms
+
+async def run_probe(service):
+    """Exécute la sonde d'un service ; None si la cible est invalide"""
+    if service["kind"] == "http":
+        return await check_http(service["target"])
+    if service["host"] is None:
+        return None
+    return await check_tcp(service["host"], service["port"])
+
+def format_status_line(label, ok, info, duration_ms):
+    if ok:
+        return f"- ✅ OK - {label} ({duration_ms} ms)"
+    return f"- ❌ ERREUR - {label} ({duration_ms} ms)"
+
+# ----------------------------------------------------------------------------
+# Historique des sondes (tampon circulaire mmap, agrégats horaires)
+# ----------------------------------------------------------------------------
+
+MONITORING_HISTORY_DIR = MONITORING_SETTINGS.get('history_dir', 'monitoring_history')
+MONITORING_HISTORY_CAPACITY = int(MONITORING_SETTINGS.get('history_capacity', 20160))  # 7 j à 30 s
+
+# Fichier : en-tête (magic, capacité, prochain index, nombre) puis trois
+# colonnes de taille fixe : horodatage (u32), latence ms (u32), statut (u8)
+PROBE_HISTORY_MAGIC = b'QKMH'
+PROBE_HISTORY_HEADER = struct.Struct('<4sIII')
+
+# Bornes (ms) de l'histogramme de latence utilisé pour les percentiles
+LATENCY_BUCKETS_MS = (10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000)
+UPTIME_WINDOW_HOURS = {'24h': 24, '7d': 168}
+
+probe_histories = {}  # Format: {service_id: ProbeHistory}
+
+
+class ProbeHistory:
+    """Historique d'un service : tampon circulaire dans un fichier mmap + agrégats par heure
+
+    Les agrégats (compteurs et histogramme de latence par heure, sur 7 jours)
+    sont mis à jour à chaque sonde ; l'uptime et les percentiles se calculent
+    sur au plus 168 seaux, jamais sur les échantillons bruts.
+    """
+
+    def __init__(self, path, capacity=MONITORING_HISTORY_CAPACITY):
+        size = PROBE_HISTORY_HEADER.size + capacity * 9
+        new_file = not os.path.exists(path) or os.path.getsize(path) != size
+        self.file = open(path, 'w+b' if new_file else 'r+b')
+        if new_file:
+            self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), size)
+        magic, stored_capacity, head, count = PROBE_HISTORY_HEADER.unpack_from(self.mm, 0)
+        if magic != PROBE_HISTORY_MAGIC or stored_capacity != capacity:
+            head, count = 0, 0
+            PROBE_HISTORY_HEADER.pack_into(self.mm, 0, PROBE_HISTORY_MAGIC, capacity, 0, 0)
+        self.capacity, self.head, self.count = capacity, head, count
+        offset = PROBE_HISTORY_HEADER.size
+        view = memoryview(self.mm)
+        self.timestamps = view[offset:offset + 4 * capacity].cast('I')
+        self.latencies = view[offset + 4 * capacity:offset + 8 * capacity].cast('I')
+        self.statuses = view[offset + 8 * capacity:offset + 9 * capacity]
+        self.hours = OrderedDict()  # Format: {heure: [total, ok, histogramme]}
+        self.last = None
+        for index in self.indexes():
+            self.aggregate(self.timestamps[index], self.latencies[index], bool(self.statuses[index]))
+        if self.count:
+            index = (self.head - 1) % capacity
+            self.last = (self.timestamps[index], self.latencies[index], bool(self.statuses[index]))
+
+    def indexes(self):
+        """Indices des échantillons du plus ancien au plus récent"""
+        start = (self.head - self.count) % self.capacity
+        return ((start + i) % self.capacity for i in range(self.count))
+
+    def aggregate(self, timestamp, latency_ms, ok):
+        hour = timestamp // 3600
+        bucket = self.hours.get(hour)
+        if bucket is None:
+            bucket = self.hours[hour] = [0, 0, array.array('I', bytes(4 * (len(LATENCY_BUCKETS_MS) + 1)))]
+            while len(self.hours) > max(UPTIME_WINDOW_HOURS.values()) + 1:
+                self.hours.popitem(last=False)
+        bucket[0] += 1
+        if ok:
+            bucket[1] += 1
+            bucket[2][bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def record(self, ok, latency_ms, timestamp=None):
+        """Ajoute un résultat de sonde (écrase le plus ancien quand le tampon est plein)"""
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        latency_ms = max(0, int(latency_ms))
+        self.timestamps[self.head] = timestamp
+        self.latencies[self.head] = latency_ms
+        self.statuses[self.head] = 1 if ok else 0
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        PROBE_HISTORY_HEADER.pack_into(self.mm, 0, PROBE_HISTORY_MAGIC, self.capacity, self.head, self.count)
+        self.aggregate(timestamp, latency_ms, ok)
+        self.last = (timestamp, latency_ms, ok)
+
+    def summary(self, window, now=None):
+        """Uptime (%) et percentiles p50/p95/p99 (ms) sur une fenêtre '24h' ou '7d'"""
+        first_hour = int(time.time() if now is None else now) // 3600 - UPTIME_WINDOW_HOURS[window] + 1
+        total = ok = 0
+        histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for hour, (bucket_total, bucket_ok, bucket_histogram) in self.hours.items():
+            if hour < first_hour:
+                continue
+            total += bucket_total
+            ok += bucket_ok
+            for i, value in enumerate(bucket_histogram):
+                histogram[i] += value
+        return {
+            'samples': total,
+            'latency_samples': sum(histogram),
+            'uptime': 100 * ok / total if total else None,
+            'p50': histogram_percentile(histogram, 0.50),
+            'p95': histogram_percentile(histogram, 0.95),
+            'p99': histogram_percentile(histogram, 0.99)
+        }
+
+    def close(self):
+        self.timestamps.release()
+        self.latencies.release()
+        self.statuses.release()
+        self.mm.flush()
+        self.mm.close()
+        self.file.close()
+
+
+def histogram_percentile(histogram, fraction):
+    """Percentile approché : borne haute du seau qui contient le rang demandé"""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for i, value in enumerate(histogram):
+        seen += value
+        if seen >= rank:
+            return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+
+def monitoring_service_id(service):
+    """Identifiant stable d'un service (nom de fichier de son historique)"""
+    if service.get('id'):
+        return service['id']
+    return '-'.join(''.join(c if c.isalnum() else ' ' for c in service['label'].lower()).split())
+
+
+def get_probe_history(service):
+    """Retourne l'historique d'un service, ouvert (ou créé) à la première utilisation"""
+    service_id = monitoring_service_id(service)
+    history = probe_histories.get(service_id)
+    if history is None:
+        os.makedirs(MONITORING_HISTORY_DIR, exist_ok=True)
+        history = ProbeHistory(os.path.join(MONITORING_HISTORY_DIR, f'{service_id}.bin'))
+        probe_histories[service_id] = history
+    return history
+
+
+def close_probe_histories():
+    """Ferme les fichiers d'historique (à l'arrêt du bot)"""
+    for history in probe_histories.values():
+        history.close()
+    probe_histories.clear()
+
+
+def format_percentiles(summary):
+    """p50/p95/p99 lisibles ('>10000' au-delà du dernier seau)"""
+    if not summary['latency_samples']:
+        return "n/a"
+    values = [summary[key] for key in ('p50', 'p95', 'p99')]
+    return '/'.join(str(value) if value is not None else f'>{LATENCY_BUCKETS_MS[-1]}' for value in values) + ' ms'
+
+
+def format_uptime(summary):
+    return f"{summary['uptime']:.2f}%" if summary['uptime'] is not None else "n/a"
+
+
+# ----------------------------------------------------------------------------
+# Ordonnancement des sondes (cadence fixe par service, intervalle adaptatif)
+# ----------------------------------------------------------------------------
+
+monitoring_probe_tasks = {}  # Format: {service_id: Task}
+monitoring_states = {}  # Format: {service_id: {'result', 'checked_at', 'interval', 'successes', 'failures'}}
+
+
+def next_probe_interval(service, state, ok):
+    """Intervalle avant la prochaine sonde selon les derniers résultats
+
+    Une cible stable (MONITORING_STABLE_AFTER succès d'affilée) voit son
+    intervalle doubler jusqu'au maximum ; une cible en échec est resondée
+    au minimum jusqu'à confirmation de la panne, puis à son rythme normal.
+    """
+    if ok:
+        state['successes'] += 1
+        state['failures'] = 0
+        if state['successes'] >= MONITORING_STABLE_AFTER:
+            return min(state['interval'] * 2, MONITORING_MAX_INTERVAL_SECONDS)
+        return service['interval']
+    state['successes'] = 0
+    state['failures'] += 1
+    if state['failures'] < MONITORING_CONFIRM_FAILURES:
+        return min(MONITORING_MIN_INTERVAL_SECONDS, service['interval'])
+    return service['interval']
+
+
+async def probe_service(service):
+    """Exécute une sonde bornée par le budget ; (ok, info, durée ms)"""
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(run_probe(service), MONITORING_PROBE_BUDGET_SECONDS)
+    except asyncio.TimeoutError:
+        return False, "budget de la sonde dépassé", int((time.perf_counter() - start) * 1000)
+    if result is None:
+        return False, "hôte invalide", 0
+    return result
+
+
+async def service_probe_loop(service):
+    """Sonde un service à cadence fixe : les échéances ne dérivent pas avec la durée des sondes"""
+    loop = asyncio.get_running_loop()
+    service_id = monitoring_service_id(service)
+    state = monitoring_states.setdefault(service_id, {
+        'result': None, 'checked_at': None, 'interval': service['interval'], 'successes': 0, 'failures': 0
+    })
+    history = get_probe_history(service)
+    # Départs étalés pour ne pas sonder tous les services au même instant
+    deadline = loop.time() + random.uniform(0, min(service['interval'], MONITORING_MIN_INTERVAL_SECONDS))
+    while True:
+        # Gigue appliquée au réveil seulement : l'échéance de référence reste fixe
+        jitter = random.uniform(-MONITORING_JITTER, MONITORING_JITTER) * state['interval']
+        await asyncio.sleep(max(0.0, deadline + jitter - loop.time()))
+        try:
+            ok, info, duration_ms = await probe_service(service)
+            history.record(ok, duration_ms)
+            state['result'] = (ok, info, duration_ms)
+            state['checked_at'] = time.time()
+            interval = next_probe_interval(service, state, ok)
+            if interval != state['interval']:
+                log_sampled('monitoring', f"{service['label']}: intervalle {state['interval']:g}s -> {interval:g}s",
+                            service=service_id, ok=ok)
+            state['interval'] = interval
+        except Exception as e:
+            log_event(logging.ERROR, 'monitoring', f"Sonde {service['label']} en erreur: {e}")
+        deadline += state['interval']
+        now = loop.time()
+        if deadline <= now:
+            # Sonde plus longue qu'un intervalle : sauter les échéances manquées
+            deadline += ((now - deadline) // state['interval'] + 1) * state['interval']
+
+
+def build_monitoring_message(services):
+    """Message de statut à partir des derniers résultats et de l'historique"""
+    lines = ["📡 **Monitoring services**"]
+    last_check = None
+    for service in services:
+        state = monitoring_states.get(monitoring_service_id(service))
+        if state is None or state['result'] is None:
+            lines.append(f"- ⏳ {service['label']} (en attente de la première sonde)")
+            continue
+        ok, info, duration_ms = state['result']
+        if info == "hôte invalide":
+            lines.append(f"- {service['label']}: ❌ ERREUR (hôte invalide)")
+            continue
+        history = get_probe_history(service)
+        day, week = history.summary('24h'), history.summary('7d')
+        lines.append(
+            f"{format_status_line(service['label'], ok, info, duration_ms)}"
+            f" · 24h {format_uptime(day)} · 7j {format_uptime(week)} · p50/p95/p99 {format_percentiles(day)}"
+        )
+        last_check = max(last_check or 0, state['checked_at'])
+    if last_check is not None:
+        timestamp = datetime.fromtimestamp(last_check, ZoneInfo("Europe/Paris")).strftime('%d/%m/%Y %H:%M:%S')
+        lines.append(f"🕒 Vérifié le {timestamp}")
+    return "\n".join(lines)
+
+def start_probe_tasks(services):
+    """Démarre (ou relance) une tâche de sonde par service"""
+    for service in services:
+        service_id = monitoring_service_id(service)
+        task = monitoring_probe_tasks.get(service_id)
+        if task is None or task.done():
+            monitoring_probe_tasks[service_id] = asyncio.create_task(service_probe_loop(service))
+
+
+async def monitoring_loop():
+    global monitoring_message_id, monitoring_last_content, monitoring_message
+    services = build_monitoring_services()
+    start_probe_tasks(services)
+    if not MONITORING_CHANNEL_ID:
+        log_event(logging.WARNING, 'monitoring', 'Canal non défini')
         return
-    colors = GRADIENT_COLORS[:GRADIENT_STEPS]
-    if not colors:
-        print('[GRADIENT] Aucune couleur définie.')
+    try:
+        channel = await get_cached_channel(MONITORING_CHANNEL_ID)
+    except Exception as e:
+        log_event(logging.ERROR, 'monitoring', f'Impossible de récupérer le canal: {e}', channel_id=MONITORING_CHANNEL_ID)
         return
+    if monitoring_message_id is None:
+        initial_message = "📡 **Monitoring services**\n⏳ Initialisation..."
+        try:
+            monitoring_message = await send_message(channel, initial_message, priority=PRIORITY_CHATTER)
+            monitoring_message_id = monitoring_message.id
+            monitoring_last_content = initial_message
+        except Exception as e:
+            log_event(logging.ERROR, 'monitoring', f'Envoi initial échoué: {e}')
+            return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time()
+    while True:
+        try:
+            content = build_monitoring_message(services)
+            if content != monitoring_last_content:
+                try:
+                    if monitoring_message is not None:
+                        await run_on_channel(
+                            channel.id,
+                            lambda: monitoring_message.edit(content=content),
+                            PRIORITY_CHATTER
+                        )
+                    else:
+                        raise RuntimeError("Message monitoring introuvable")
+                except Exception:
+                    previous_message = monitoring_message
+                    monitoring_message = await send_message(channel, content, priority=PRIORITY_CHATTER)
+                    monitoring_message_id = monitoring_message.id
+                    if previous_message is not None:
+                        try:
+                            await run_on_channel(channel.id, previous_message.delete, PRIORITY_CHATTER)
+                        except Exception:
+                            pass
+                monitoring_last_content = content
+        except Exception as e:
+            log_event(logging.ERROR, 'monitoring', f'Erreur boucle: {e}')
+        # Rafraîchissement à cadence fixe, indépendant de la durée des envois
+        deadline += MONITORING_REFRESH_SECONDS
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+
+# ============================================================================
+# MÉTRIQUES ET SANTÉ (HTTP /healthz et /metrics)
+# ============================================================================
+
+METRICS_SETTINGS = config.get('metrics', {})
+METRICS_ENABLED = bool(METRICS_SETTINGS.get('enabled', True))
+METRICS_HOST = METRICS_SETTINGS.get('host', '0.0.0.0')
+METRICS_PORT = int(os.getenv('METRICS_PORT') or METRICS_SETTINGS.get('port', 26002))
+
+LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+bot_ready = False
+bot_started_at = time.time()
+metrics_event_counts = {}  # Format: {type d'événement: nombre}
+metrics_handler_latency = {}  # Format: {handler: histogramme}
+metrics_handler_errors = {}  # Format: {handler: nombre}
+metrics_rest_calls = {}  # Format: {(méthode, route, statut): nombre}
+metrics_mistral_errors = {}  # Format: {type d'erreur: nombre}
+metrics_runner = None
+
+
+def new_histogram(bounds=LATENCY_BUCKETS_SECONDS):
+    """Histogramme cumulatif au format Prometheus"""
+    return {'bounds': bounds, 'counts': [0] * (len(bounds) + 1), 'sum': 0.0, 'count': 0}
+
+
+def observe_histogram(histogram, value):
+    histogram['counts'][bisect.bisect_left(histogram['bounds'], value)] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+
+metrics_mistral_latency = new_histogram()
+metrics_loop_lag = new_histogram((0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+
+
+def record_rest_call(method, route, status):
+    """Compte un appel REST Stoat par route (gabarit de chemin) et statut"""
+    key = (str(method), route, status)
+    metrics_rest_calls[key] = metrics_rest_calls.get(key, 0) + 1
+
+
+def record_mistral_metrics(latency, error=None):
+    """Enregistre la latence d'un appel Mistral, ou son type d'erreur"""
+    if error is None:
+        observe_histogram(metrics_mistral_latency, latency)
+    else:
+        metrics_mistral_errors[error] = metrics_mistral_errors.get(error, 0) + 1
+
+
+def on_event(event_type):
+    """Comme client.on, en mesurant la durée et les erreurs du handler"""
+    def decorator(handler):
+        name = handler.__name__
+        histogram = metrics_handler_latency.setdefault(name, new_histogram())
+
+        async def timed_handler(event, /):
+            start = time.perf_counter()
+            try:
+                return await handler(event)
+            except Exception:
+                metrics_handler_errors[name] = metrics_handler_errors.get(name, 0) + 1
+                raise
+            finally:
+                observe_histogram(histogram, time.perf_counter() - start)
+
+        timed_handler.__name__ = name
+        timed_handler.__doc__ = handler.__doc__
+        client.on(event_type)(timed_handler)
+        return handler
+    return decorator
+
+
+@client.on(stoat.BaseEvent)
+async def count_event(event, /):
+    """Compte chaque événement reçu, par type"""
+    name = type(event).__name__
+    metrics_event_counts[name] = metrics_event_counts.get(name, 0) + 1
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_histogram(lines, name, histogram, labels=''):
+    cumulative = 0
+    for bound, count in zip(histogram['bounds'], histogram['counts']):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {histogram["count"]}')
+    labels = labels.rstrip(',')
+    suffix = f'{{{labels}}}' if labels else ''
+    lines.append(f'{name}_sum{suffix} {histogram["sum"]:.6f}')
+    lines.append(f'{name}_count{suffix} {histogram["count"]}')
+
+
+def render_metrics():
+    """Métriques du bot au format texte Prometheus"""
+    lines = [
+        '# HELP quokka_up Bot connecté à la passerelle et prêt (1/0)',
+        '# TYPE quokka_up gauge',
+        f'quokka_up {1 if is_gateway_healthy() else 0}',
+        '# HELP quokka_start_time_seconds Démarrage du processus (epoch)',
+        '# TYPE quokka_start_time_seconds gauge',
+        f'quokka_start_time_seconds {bot_started_at:.0f}',
+        '# HELP quokka_events_total Événements reçus par type',
+        '# TYPE quokka_events_total counter'
+    ]
+    for name, count in sorted(metrics_event_counts.items()):
+        lines.append(f'quokka_events_total{{type="{escape_label(name)}"}} {count}')
+    lines += ['# HELP quokka_handler_duration_seconds Durée des handlers d\'événements',
+              '# TYPE quokka_handler_duration_seconds histogram']
+    for name, histogram in sorted(metrics_handler_latency.items()):
+        render_histogram(lines, 'quokka_handler_duration_seconds', histogram, f'handler="{escape_label(name)}",')
+    lines += ['# HELP quokka_handler_errors_total Exceptions levées par les handlers',
+              '# TYPE quokka_handler_errors_total counter']
+    for name, count in sorted(metrics_handler_errors.items()):
+        lines.append(f'quokka_handler_errors_total{{handler="{escape_label(name)}"}} {count}')
+    lines += ['# HELP quokka_rest_requests_total Appels REST Stoat par route et statut',
+              '# TYPE quokka_rest_requests_total counter']
+    for (method, route, status), count in sorted(metrics_rest_calls.items()):
+        lines.append(
+            f'quokka_rest_requests_total{{method="{escape_label(method)}",route="{escape_label(route)}",'
+            f'status="{status}"}} {count}'
+        )
+    outbound = get_outbound_stats()
+    lines += ['# HELP quokka_outbound_queue_depth Appels en attente dans la file sortante par priorité',
+              '# TYPE quokka_outbound_queue_depth gauge']
+    for lane, depth in outbound['depth'].items():
+        lines.append(f'quokka_outbound_queue_depth{{lane="{lane}"}} {depth}')
+    lines += ['# HELP quokka_mistral_duration_seconds Latence des appels Mistral réussis',
+              '# TYPE quokka_mistral_duration_seconds histogram']
+    render_histogram(lines, 'quokka_mistral_duration_seconds', metrics_mistral_latency)
+    lines += ['# HELP quokka_mistral_errors_total Appels Mistral en échec par type',
+              '# TYPE quokka_mistral_errors_total counter']
+    for error, count in sorted(metrics_mistral_errors.items()):
+        lines.append(f'quokka_mistral_errors_total{{error="{escape_label(error)}"}} {count}')
+    lines += ['# HELP quokka_event_loop_lag_seconds Retard de la boucle d\'événements (mesuré par le watchdog)',
+              '# TYPE quokka_event_loop_lag_seconds histogram']
+    render_histogram(lines, 'quokka_event_loop_lag_seconds', metrics_loop_lag)
+    lines += ['# HELP quokka_event_loop_lag_quantile_seconds Percentiles glissants du retard de boucle',
+              '# TYPE quokka_event_loop_lag_quantile_seconds gauge']
+    for quantile, value in get_loop_lag_percentiles().items():
+        lines.append(f'quokka_event_loop_lag_quantile_seconds{{quantile="{quantile}"}} {value:.6f}')
+    lines += ['# HELP quokka_event_loop_stalls_total Blocages de la boucle au-delà du seuil du watchdog',
+              '# TYPE quokka_event_loop_stalls_total counter',
+              f'quokka_event_loop_stalls_total {watchdog_stats["stalls"]}']
+    lines += ['# HELP quokka_member_notifications_total Arrivées/départs annoncés seuls ou regroupés en résumé',
+              '# TYPE quokka_member_notifications_total counter']
+    for mode in ('single', 'coalesced'):
+        lines.append(f'quokka_member_notifications_total{{mode="{mode}"}} {member_notification_stats[mode]}')
+    lines += ['# HELP quokka_role_grant_queue_depth Attributions de rôle en attente (mode rafale)',
+              '# TYPE quokka_role_grant_queue_depth gauge',
+              f'quokka_role_grant_queue_depth {len(role_grant_queue)}']
+    lines += ['# HELP quokka_entity_cache_total Accès au cache serveur/canaux (hit = appel REST évité)',
+              '# TYPE quokka_entity_cache_total counter']
+    for outcome in ('hits', 'misses', 'updates', 'invalidations'):
+        lines.append(f'quokka_entity_cache_total{{outcome="{outcome}"}} {entity_cache_stats[outcome]}')
+    lines += ['# HELP quokka_pending_submissions Soumissions en attente de modération',
+              '# TYPE quokka_pending_submissions gauge',
+              f'quokka_pending_submissions {len(pending_submissions)}']
+    lines += ['# HELP quokka_submissions_recovered_total Soumissions réindexées depuis l\'historique au démarrage',
+              '# TYPE quokka_submissions_recovered_total counter',
+              f'quokka_submissions_recovered_total {submission_reconcile_stats["recovered"]}']
+    lines += ['# HELP quokka_automod_total Déclenchements et mutes de l\'automod',
+              '# TYPE quokka_automod_total counter']
+    for outcome in ('flood', 'duplicate', 'mutes', 'exempted'):
+        lines.append(f'quokka_automod_total{{outcome="{outcome}"}} {automod_stats[outcome]}')
+    lines += ['# HELP quokka_automod_tracked_users Utilisateurs suivis par l\'automod',
+              '# TYPE quokka_automod_tracked_users gauge',
+              f'quokka_automod_tracked_users {len(automod_users)}']
+    if RECORDER_ENABLED:
+        lines += ['# HELP quokka_recorded_events_total Événements écrits ou abandonnés par l\'enregistreur',
+                  '# TYPE quokka_recorded_events_total counter']
+        for outcome in ('recorded', 'dropped'):
+            lines.append(f'quokka_recorded_events_total{{outcome="{outcome}"}} {recorder_stats[outcome]}')
+    return '\n'.join(lines) + '\n'
+
+
+def is_gateway_connected():
+    """Websocket de la passerelle ouvert"""
+    try:
+        socket = client.shard.socket
+    except (AttributeError, TypeError):
+        return False  # Pas encore connecté (ou en reconnexion)
+    return not socket.closed
+
+
+def is_gateway_healthy():
+    """Passerelle connectée et ReadyEvent reçu"""
+    return bot_ready and is_gateway_connected()
+
+
+async def handle_healthz(request):
+    """GET /healthz : 200 si le bot est connecté et prêt, 503 sinon"""
+    connected = is_gateway_connected()
+    body = {
+        'status': 'ok' if connected and bot_ready else 'unavailable',
+        'gateway_connected': connected,
+        'ready': bot_ready,
+        'uptime_seconds': int(time.time() - bot_started_at)
+    }
+    return aiohttp.web.json_response(body, status=200 if connected and bot_ready else 503)
+
+
+async def handle_metrics(request):
+    """GET /metrics : exposition Prometheus"""
+    return aiohttp.web.Response(text=render_metrics(), content_type='text/plain', charset='utf-8')
+
+
+async def start_metrics_server():
+    """Démarre le listener HTTP de santé/métriques"""
+    global metrics_runner
+    if not METRICS_ENABLED or metrics_runner is not None:
+        return
+    app = aiohttp.web.Application()
+    app.router.add_get('/healthz', handle_healthz)
+    app.router.add_get('/metrics', handle_metrics)
+    runner = aiohttp.web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await aiohttp.web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        await runner.cleanup()
+        log_event(logging.ERROR, 'metrics', f'Écoute impossible sur {METRICS_HOST}:{METRICS_PORT}: {e}')
+        return
+    metrics_runner = runner
+    log_event(logging.INFO, 'metrics', f'/healthz et /metrics sur {METRICS_HOST}:{METRICS_PORT}')
+
+
+# ============================================================================
+# WATCHDOG DE LA BOUCLE D'ÉVÉNEMENTS
+# ============================================================================
+
+WATCHDOG_SETTINGS = config.get('watchdog', {})
+WATCHDOG_ENABLED = bool(WATCHDOG_SETTINGS.get('enabled', True))
+WATCHDOG_INTERVAL_SECONDS = float(WATCHDOG_SETTINGS.get('interval_seconds', 0.5))
+WATCHDOG_STALL_THRESHOLD_SECONDS = float(WATCHDOG_SETTINGS.get('stall_threshold_seconds', 0.25))
+WATCHDOG_WINDOW = int(WATCHDOG_SETTINGS.get('window', 1200))  # Échantillons gardés (~10 min à 0,5 s)
+
+watchdog_thread = None
+watchdog_stop = threading.Event()
+watchdog_lags = deque(maxlen=WATCHDOG_WINDOW)
+watchdog_stats = {'stalls': 0, 'worst_stall_seconds': 0.0}
+
+
+def find_running_event(frame):
+    """Remonte la pile jusqu'au handler instrumenté ; retourne (handler, type d'événement)"""
+    while frame is not None:
+        if frame.f_code.co_name == 'timed_handler':
+            event = frame.f_locals.get('event')
+            handler = frame.f_locals.get('name')
+            return handler, type(event).__name__ if event is not None else None
+        frame = frame.f_back
+    return None, None
+
+
+def report_stall(main_thread_id, waited):
+    """Capture la pile du thread de la boucle pendant un blocage et la journalise"""
+    frame = sys._current_frames().get(main_thread_id)
+    if frame is None:
+        return
+    handler, event_type = find_running_event(frame)
+    stack = ''.join(traceback.format_stack(frame, limit=30))
+    watchdog_stats['stalls'] += 1
+    log_event(
+        logging.WARNING, 'watchdog',
+        f'Boucle bloquée depuis {waited * 1000:.0f} ms (handler: {handler or "?"}, événement: {event_type or "?"})',
+        handler=handler, event_type=event_type, blocked_ms=round(waited * 1000), stack=stack
+    )
+
+
+def run_loop_watchdog(loop, main_thread_id):
+    """Thread : mesure le délai de prise en charge d'un callback par la boucle"""
+    while not watchdog_stop.is_set():
+        answered = threading.Event()
+        sent = time.monotonic()
+        try:
+            loop.call_soon_threadsafe(answered.set)
+        except RuntimeError:
+            return  # Boucle fermée
+        if not answered.wait(WATCHDOG_STALL_THRESHOLD_SECONDS):
+            report_stall(main_thread_id, time.monotonic() - sent)
+            while not answered.wait(WATCHDOG_INTERVAL_SECONDS):
+                if watchdog_stop.is_set() or loop.is_closed():
+                    return
+            stall = time.monotonic() - sent
+            watchdog_stats['worst_stall_seconds'] = max(watchdog_stats['worst_stall_seconds'], stall)
+            log_event(logging.WARNING, 'watchdog', f'Boucle débloquée, blocage observé : {stall * 1000:.0f} ms',
+                      blocked_ms=round(stall * 1000))
+        lag = time.monotonic() - sent
+        watchdog_lags.append(lag)
+        observe_histogram(metrics_loop_lag, lag)
+        watchdog_stop.wait(WATCHDOG_INTERVAL_SECONDS)
+
+
+def start_loop_watchdog():
+    """Démarre le thread watchdog sur la boucle courante (une seule fois)"""
+    global watchdog_thread
+    if not WATCHDOG_ENABLED or (watchdog_thread is not None and watchdog_thread.is_alive()):
+        return
+    watchdog_stop.clear()
+    watchdog_thread = threading.Thread(
+        target=run_loop_watchdog,
+        args=(asyncio.get_running_loop(), threading.get_ident()),
+        name='quokka-watchdog',
+        daemon=True
+    )
+    watchdog_thread.start()
+
+
+def stop_loop_watchdog():
+    watchdog_stop.set()
+
+
+def get_loop_lag_percentiles():
+    """p50/p95/p99 du retard de boucle sur la fenêtre glissante du watchdog"""
+    samples = sorted(watchdog_lags)
+    if not samples:
+        return {}
+    return {
+        quantile: samples[min(len(samples) - 1, int(len(samples) * fraction))]
+        for quantile, fraction in (('0.5', 0.50), ('0.95', 0.95), ('0.99', 0.99))
+    }
+
+
+# ============================================================================
+# ENREGISTREMENT DES ÉVÉNEMENTS (rejeu pour tests de charge)
+# ============================================================================
+
+RECORDER_SETTINGS = config.get('event_recorder', {})
+RECORDER_ENABLED = bool(RECORDER_SETTINGS.get('enabled', False))
+RECORDER_PATH = RECORDER_SETTINGS.get('path', 'recordings/events.jsonl.gz')
+RECORDER_SCRUB_PII = bool(RECORDER_SETTINGS.get('scrub_pii', True))
+RECORDER_FLUSH_INTERVAL_SECONDS = float(RECORDER_SETTINGS.get('flush_interval_seconds', 5))
+RECORDER_MAX_PENDING = int(RECORDER_SETTINGS.get('max_pending', 10000))
+# Sel fixe (env) pour relier plusieurs enregistrements entre eux, sinon aléatoire à chaque démarrage
+RECORDER_KEY = hashlib.sha256((os.getenv('EVENT_RECORDER_SALT') or os.urandom(16).hex()).encode()).digest()
+
+RECORDED_EVENT_TYPES = (
+    stoat.MessageCreateEvent, stoat.MessageReactEvent, stoat.ServerMemberJoinEvent, stoat.ServerMemberRemoveEvent
+)
+
+# Journal gzip en ajout seul : chaque session ajoute un membre gzip, une ligne JSON
+# par événement. Sérialisation et compression dans un thread ; la boucle ne fait qu'un put().
+recorder_queue = queue.Queue(maxsize=RECORDER_MAX_PENDING)
+recorder_thread = None
+recorder_stats = {'recorded': 0, 'dropped': 0}
+
+MENTION_PATTERN = re.compile(r'<@!?([0-9A-Za-z]+)>')
+LETTER_PATTERN = re.compile(r'[^\W\d_]')
+DIGIT_PATTERN = re.compile(r'\d')
+
+
+def scrub_id(user_id):
+    """Pseudonyme stable d'un ID utilisateur, au format d'un ULID"""
+    if not RECORDER_SCRUB_PII or user_id is None:
+        return user_id
+    return hashlib.blake2b(str(user_id).encode(), key=RECORDER_KEY, digest_size=16).hexdigest()[:26].upper()
+
+
+def scrub_name(user_id, name):
+    if not RECORDER_SCRUB_PII:
+        return name
+    return f'membre-{scrub_id(user_id)[:8].lower()}'
+
+
+def mask_text(text):
+    return DIGIT_PATTERN.sub('0', LETTER_PATTERN.sub('x', text))
+
+
+def scrub_content(content):
+    """Masque le texte libre ; garde la longueur, le nom de commande et les mentions (pseudonymisées)"""
+    if not RECORDER_SCRUB_PII or not content:
+        return content
+    head = ''
+    if content.startswith(COMMAND_PREFIX):
+        name, sep, content = content.partition(' ')
+        head = name + sep
+    parts = []
+    last = 0
+    for match in MENTION_PATTERN.finditer(content):
+        parts.append(mask_text(content[last:match.start()]))
+        parts.append(f'<@{scrub_id(match.group(1))}>')
+        last = match.end()
+    parts.append(mask_text(content[last:]))
+    return head + ''.join(parts)
+
+
+def serialize_event(event):
+    """Ligne de journal (dict) pour un événement rejouable"""
+    if isinstance(event, stoat.MessageCreateEvent):
+        message = event.message
+        author = message.author
+        return {
+            'type': 'message',
+            'channel_id': message.channel_id,
+            'message_id': message.id,
+            'author_id': scrub_id(author.id),
+            'author_name': scrub_name(author.id, author.name),
+            'author_bot': bool(author.bot),
+            'self': author.relationship is stoat.RelationshipStatus.user,
+            'content': scrub_content(message.content),
+            'mentions': [scrub_id(user_id) for user_id in message.mention_ids]
+        }
+    if isinstance(event, stoat.MessageReactEvent):
+        return {
+            'type': 'reaction',
+            'channel_id': event.channel_id,
+            'message_id': event.message_id,
+            'user_id': scrub_id(event.user_id),
+            'emoji': event.emoji
+        }
+    if isinstance(event, stoat.ServerMemberJoinEvent):
+        member = event.member
+        return {
+            'type': 'join',
+            'server_id': member.server_id,
+            'user_id': scrub_id(member.id),
+            'name': scrub_name(member.id, member.name)
+        }
+    member = event.member
+    return {
+        'type': 'remove',
+        'server_id': event.server_id,
+        'user_id': scrub_id(event.user_id),
+        'name': scrub_name(event.user_id, member.name) if member else None,
+        'reason': event.reason.name
+    }
+
+
+def run_event_recorder(path):
+    """Thread : écrit les lignes en file dans le journal gzip, vidé régulièrement"""
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = recorder_queue.get(timeout=RECORDER_FLUSH_INTERVAL_SECONDS)
+                if record is None:
+                    break
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            except queue.Empty:
+                pass
+            if time.monotonic() - last_flush >= RECORDER_FLUSH_INTERVAL_SECONDS:
+                # Bloc gzip synchronisé : le journal reste lisible jusqu'ici en cas de crash
+                f.flush()
+                last_flush = time.monotonic()
+
+
+def start_event_recorder():
+    """Ouvre le journal et écrit l'en-tête de session (IDs nécessaires au rejeu)"""
+    global recorder_thread
+    if not RECORDER_ENABLED or (recorder_thread is not None and recorder_thread.is_alive()):
+        return
+    recorder_dir = os.path.dirname(RECORDER_PATH)
+    if recorder_dir:
+        os.makedirs(recorder_dir, exist_ok=True)
+    recorder_queue.put({
+        'type': 'meta',
+        'ts': round(time.time(), 3),
+        'server_id': SERVER_ID,
+        'submission_channel_id': SUBMISSION_CHANNEL_ID,
+        'notification_channel_id': NOTIFICATION_CHANNEL_ID,
+        'moderator_role_ids': [role_id for role_id in (MODERATOR_ROLE_1, MODERATOR_ROLE_2) if role_id],
+        'bot_id': scrub_id(client.user.id),
+        'scrubbed': RECORDER_SCRUB_PII
+    })
+    recorder_thread = threading.Thread(
+        target=run_event_recorder, args=(RECORDER_PATH,), name='quokka-recorder', daemon=True
+    )
+    recorder_thread.start()
+    log_event(logging.INFO, 'recorder', f'Enregistrement des événements dans {RECORDER_PATH}')
+
+
+def stop_event_recorder():
+    """Vide la file et ferme le journal"""
+    global recorder_thread
+    if recorder_thread is None:
+        return
+    recorder_queue.put(None)
+    recorder_thread.join(timeout=5)
+    recorder_thread = None
+
+
+async def record_event(event, /):
+    """Met l'événement en file pour le journal (abandonné si l'écriture ne suit pas)"""
+    if recorder_thread is None:
+        return
+    try:
+        record = serialize_event(event)
+    except Exception as e:
+        log_event(logging.ERROR, 'recorder', f'Sérialisation impossible ({type(event).__name__}): {e}')
+        return
+    record['ts'] = round(time.time(), 3)
+    try:
+        recorder_queue.put_nowait(record)
+        recorder_stats['recorded'] += 1
+    except queue.Full:
+        recorder_stats['dropped'] += 1
+
+
+# Désactivé : aucun listener enregistré, coût nul
+if RECORDER_ENABLED:
+    for recorded_type in RECORDED_EVENT_TYPES:
+        client.on(recorded_type)(record_event)
+
+
+# ============================================================================
+# ARRIVÉES ET DÉPARTS EN RAFALE (résumés, attribution des rôles bornée)
+# ============================================================================
+
+MEMBER_NOTIFICATION_SETTINGS = config.get('member_notifications', {})
+MEMBER_BURST_THRESHOLD = int(MEMBER_NOTIFICATION_SETTINGS.get('burst_threshold', 5))
+MEMBER_BURST_WINDOW_SECONDS = float(MEMBER_NOTIFICATION_SETTINGS.get('burst_window_seconds', 60))
+MEMBER_SUMMARY_DELAY_SECONDS = float(MEMBER_NOTIFICATION_SETTINGS.get('summary_delay_seconds', 10))
+MEMBER_SUMMARY_MAX_NAMES = int(MEMBER_NOTIFICATION_SETTINGS.get('summary_max_names', 25))
+ROLE_GRANT_CONCURRENCY = int(MEMBER_NOTIFICATION_SETTINGS.get('role_grant_concurrency', 2))
+ROLE_GRANT_MAX_PENDING = int(MEMBER_NOTIFICATION_SETTINGS.get('role_grant_max_pending', 5000))
+
+# Fenêtre glissante : seuls les (seuil + 1) derniers instants comptent. Si le plus
+# ancien est encore dans la fenêtre, on a dépassé le seuil → mode rafale.
+member_event_times = deque(maxlen=MEMBER_BURST_THRESHOLD + 1)
+
+# Membres en attente du prochain résumé, par type (join, leave, kick, ban)
+member_summary_batch = {}  # Format: {type: [libellé]}
+member_summary_task = None
+
+role_grant_queue = deque()
+role_grant_wakeup = asyncio.Event()
+role_grant_workers = []
+member_notification_stats = {'single': 0, 'coalesced': 0, 'summaries': 0, 'roles_granted': 0,
+                             'role_failures': 0, 'role_dropped': 0}
+
+MEMBER_SUMMARY_TITLES = {
+    'join': ('🎉', 'Bienvenue aux nouveaux membres', 'nouveaux membres'),
+    'leave': ('👋', 'Départs', 'départs'),
+    'kick': ('👢', 'Kicks', 'kicks'),
+    'ban': ('🔨', 'Bannissements', 'bannissements'),
+}
+
+
+def is_member_burst():
+    """Note un événement membre ; True si le seuil est dépassé dans la fenêtre glissante"""
+    now = time.monotonic()
+    member_event_times.append(now)
+    return (len(member_event_times) == member_event_times.maxlen
+            and now - member_event_times[0] <= MEMBER_BURST_WINDOW_SECONDS)
+
+
+def build_member_summary(batch):
+    """Un seul message pour toute la rafale, noms tronqués au-delà de MEMBER_SUMMARY_MAX_NAMES"""
+    sections = []
+    for kind, (icon, title, noun) in MEMBER_SUMMARY_TITLES.items():
+        labels = batch.get(kind)
+        if not labels:
+            continue
+        shown = ', '.join(labels[:MEMBER_SUMMARY_MAX_NAMES])
+        if len(labels) > MEMBER_SUMMARY_MAX_NAMES:
+            shown += f' … et {len(labels) - MEMBER_SUMMARY_MAX_NAMES} autres'
+        sections.append(f"{icon} **{title}** ({len(labels)} {noun})\n{shown}")
+    return '\n\n'.join(sections)
+
+
+async def flush_member_summary():
+    """Attend la fin de la rafale (délai fixe) puis publie le résumé"""
+    global member_summary_task
+    await asyncio.sleep(MEMBER_SUMMARY_DELAY_SECONDS)
+    batch = dict(member_summary_batch)
+    member_summary_batch.clear()
+    # Les membres arrivant pendant l'envoi ouvrent un nouveau résumé
+    member_summary_task = None
     try:
-        server = await client.fetch_server(SERVER_ID)
+        channel = await get_cached_channel(NOTIFICATION_CHANNEL_ID)
+        await send_message(channel, build_member_summary(batch))
+        member_notification_stats['summaries'] += 1
+        log_event(logging.INFO, 'ok', 'Résumé de rafale envoyé',
+                  **{kind: len(labels) for kind, labels in batch.items()})
     except Exception as e:
-        print(f'[GRADIENT] Impossible de récupérer le serveur: {e}')
+        log_event(logging.ERROR, 'erreur', f'Résumé de rafale: {e}')
+
+
+def queue_member_summary(kind, label):
+    """Ajoute un membre au prochain résumé (programmé au premier ajout)"""
+    global member_summary_task
+    member_summary_batch.setdefault(kind, []).append(label)
+    member_notification_stats['coalesced'] += 1
+    if member_summary_task is None or member_summary_task.done():
+        member_summary_task = asyncio.create_task(flush_member_summary())
+
+
+async def grant_new_member_role(member):
+    """Ajoute NEW_MEMBER_ROLE_ID au membre (stoat.py n'a pas de Member.add_role : la liste est réécrite)"""
+    if NEW_MEMBER_ROLE_ID in member.role_ids:
         return
-    bot_top_rank = None
-    bot_member = None
-    try:
-        bot_member = await server.fetch_member(client.user.id)
-        if bot_member is not None and hasattr(bot_member, 'top_role') and bot_member.top_role is not None:
-            bot_top_rank = bot_member.top_role.rank
-    except Exception as e:
-        print(f'[GRADIENT] Impossible de récupérer le rôle du bot: {e}')
-    roles = list(server.roles.values()) if hasattr(server, 'roles') and server.roles else []
-    roles_sorted = sorted(roles, key=lambda role: role.rank) if roles else []
-    if bot_top_rank is None and bot_member is not None and hasattr(bot_member, 'role_ids'):
-        role_ranks = [server.roles[role_id].rank for role_id in bot_member.role_ids if role_id in server.roles]
-        if role_ranks:
-            bot_top_rank = min(role_ranks)
-    if bot_top_rank is None:
-        print('[GRADIENT] Impossible de déterminer le rang du bot.')
-    start_index = None
-    for index, role in enumerate(roles_sorted):
-        if role.id == GRADIENT_ROLE_ID:
-            start_index = index
-            break
-    if start_index is None:
-        try:
-            role = await server.fetch_role(GRADIENT_ROLE_ID)
-        except Exception as e:
-            print(f'[GRADIENT] Rôle introuvable: {e}')
-            return
+    await member.edit(roles=[*member.role_ids, NEW_MEMBER_ROLE_ID])
+
+
+async def role_grant_worker():
+    """Attribue le rôle des nouveaux membres, au plus ROLE_GRANT_CONCURRENCY appels à la fois"""
+    while True:
+        while not role_grant_queue:
+            role_grant_wakeup.clear()
+            await role_grant_wakeup.wait()
+        member = role_grant_queue.popleft()
         try:
-            await role.edit(color=colors[0])
-            print(f'[GRADIENT] Couleur appliquée au rôle {role.name}.')
+            await grant_new_member_role(member)
+            member_notification_stats['roles_granted'] += 1
         except Exception as e:
-            print(f'[GRADIENT] Échec modification rôle: {e}')
+            member_notification_stats['role_failures'] += 1
+            log_event(logging.ERROR, 'erreur', f'Rôle {NEW_MEMBER_ROLE_ID} pour {member.name}: {e}')
+
+
+def queue_role_grant(member):
+    """Met l'attribution du rôle en file (abandonnée si la file est pleine)"""
+    if len(role_grant_queue) >= ROLE_GRANT_MAX_PENDING:
+        member_notification_stats['role_dropped'] += 1
+        log_event(logging.WARNING, 'bienvenue', f'File des rôles pleine, {member.name} ignoré')
         return
-    updated = 0
-    skipped = 0
-    for offset, color in enumerate(colors):
-        target_index = start_index + offset
-        if target_index >= len(roles_sorted):
-            break
-        target_role = roles_sorted[target_index]
-        try:
-            await target_role.edit(color=color)
-            updated += 1
-        except Exception as e:
-            if "NotElevated" in str(e):
-                skipped += 1
-            print(f'[GRADIENT] Échec pour {target_role.name}: {e}')
-    print(f'[GRADIENT] Rôles mis à jour: {updated} (ignorés: {skipped})')
+    role_grant_queue.append(member)
+    role_grant_workers[:] = [worker for worker in role_grant_workers if not worker.done()]
+    while len(role_grant_workers) < ROLE_GRANT_CONCURRENCY:
+        role_grant_workers.append(asyncio.create_task(role_grant_worker()))
+    role_grant_wakeup.set()
 
-def build_monitoring_services():
-    railway_host = urllib.parse.urlparse("https://quokka-production.up.railway.app/").hostname
-    return [
-        {"label": "Site internet", "kind": "http", "target": "https://quokka.gg"},
-        {"label": "Cloudflare NS houston", "kind": "tcp", "host": "houston.ns.cloudflare.com", "port": 53},
-        {"label": "Cloudflare NS luciana", "kind": "tcp", "host": "luciana.ns.cloudflare.com", "port": 53},
-        {
-            "label": "Front-end Vercel",
-            "kind": "http",
-            "target": "https://quokka-git-main-mcerenzias-projects.vercel.app"
-        },
-        {"label": "Backend Railway HTTP", "kind": "http", "target": "https://quokka-production.up.railway.app/"},
-        {"label": "Backend Railway (port privé)", "kind": "tcp", "host": railway_host, "port": 8080},
-        {"label": "Bot Quokka (privé)", "kind": "tcp", "host": "83.150.218.85", "port": 26002}
-    ]
 
-def tcp_probe(host, port, timeout):
-    with socket.create_connection((host, port), timeout=timeout):
-        return True
+# ============================================================================
+# REPRISE DES SOUMISSIONS
+# ============================================================================
 
-async def check_http(url):
-    start = time.time()
-    try:
-        response = requests.get(url, timeout=8)
-        duration_ms = int((time.time() - start) * 1000)
-        return response.status_code < 400, str(response.status_code), duration_ms
-    except Exception as e:
-        duration_ms = int((time.time() - start) * 1000)
-        return False, str(e), duration_ms
+SUBMISSION_SETTINGS = config.get('submissions', {})
+SUBMISSION_RECONCILE_MAX_SCANNED = int(SUBMISSION_SETTINGS.get('reconcile_max_scanned', 2000))
+SUBMISSION_REACTIONS = ('✅', '❌')
 
-async def check_tcp(host, port):
-    start = time.time()
-    try:
-        await asyncio.to_thread(tcp_probe, host, port, 6)
-        duration_ms = int((time.time() - start) * 1000)
-        return True, "OK", duration_ms
-    except Exception as e:
-        duration_ms = int((time.time() - start) * 1000)
-        return False, str(e), duration_ms
+submission_reconcile_task = None
+submission_reconcile_stats = {'runs': 0, 'scanned': 0, 'recovered': 0}
 
-def format_status_line(label, ok, info, duration_ms):
-    if ok:
-        return f"- ✅ OK - {label} ({duration_ms} ms)"
-    return f"- ❌ ERREUR - {label} ({duration_ms} ms)"
 
-async def build_monitoring_message():
-    services = build_monitoring_services()
-    timestamp = datetime.now(ZoneInfo("Europe/Paris")).strftime('%d/%m/%Y %H:%M:%S')
-    lines = ["📡 **Monitoring services**"]
-    for service in services:
-        if service["kind"] == "http":
-            ok, info, duration_ms = await check_http(service["target"])
-            lines.append(format_status_line(service["label"], ok, info, duration_ms))
-        else:
-            host = service["host"]
-            port = service["port"]
-            if host is None:
-                lines.append(f"- {service['label']}: ❌ ERREUR (hôte invalide)")
-                continue
-            ok, info, duration_ms = await check_tcp(host, port)
-            lines.append(format_status_line(service["label"], ok, info, duration_ms))
-    lines.append(f"🕒 Vérifié le {timestamp}")
-    return "\n".join(lines)
+def is_undecided_submission(msg, bot_id):
+    """Soumission encore en attente : le bot a posé ✅ et ❌ et le message n'a pas été supprimé
 
-async def monitoring_loop():
-    global monitoring_message_id, monitoring_last_content, monitoring_message
-    if not MONITORING_CHANNEL_ID:
-        print('[MONITORING] Canal non défini.')
+    Une décision (approbation ou refus) supprime le message : tout message
+    encore présent avec les deux réactions du bot attend donc un modérateur.
+    """
+    if msg.author_id == bot_id:
+        return False
+    reactions = getattr(msg, 'reactions', None) or {}
+    return all(bot_id in reactions.get(emoji, ()) for emoji in SUBMISSION_REACTIONS)
+
+
+async def reconcile_submissions():
+    """Reconstruit l'index des soumissions à partir de l'historique du canal
+
+    Ne relit que les messages postérieurs au point de reprise (du plus
+    ancien au plus récent, pour que le point de reprise avance même si la
+    limite de SUBMISSION_RECONCILE_MAX_SCANNED messages est atteinte). Sans
+    point de reprise (première exécution), seuls les messages les plus
+    récents sont parcourus.
+    """
+    global submission_checkpoint, submission_reconcile_running
+    if not SUBMISSION_CHANNEL_ID or not getattr(client, 'user', None):
         return
+    bot_id = client.user.id
+    start_checkpoint = submission_checkpoint
+    sort = stoat.MessageSort.latest if start_checkpoint is None else stoat.MessageSort.oldest
+    started = time.perf_counter()
+    scanned = recovered = 0
+    newest = start_checkpoint
+    cursor = None
+    submission_reconcile_running = True
     try:
-        channel = await client.fetch_channel(MONITORING_CHANNEL_ID)
+        while scanned < SUBMISSION_RECONCILE_MAX_SCANNED:
+            if start_checkpoint is None:
+                page = await client.http.get_messages(
+                    SUBMISSION_CHANNEL_ID, limit=CLEAR_PAGE_SIZE, before=cursor, sort=sort, populate_users=True
+                )
+            else:
+                page = await client.http.get_messages(
+                    SUBMISSION_CHANNEL_ID, limit=CLEAR_PAGE_SIZE, after=cursor or start_checkpoint, sort=sort,
+                    populate_users=True
+                )
+            if not page:
+                break
+            for msg in page:
+                scanned += 1
+                if msg.id not in pending_submissions and is_undecided_submission(msg, bot_id):
+                    # msg.author lève NoData si l'auteur n'est pas en cache (membre parti, par exemple)
+                    author = msg.get_author()
+                    remember_submission(msg.id, {
+                        'author': msg.author_id,
+                        'author_name': getattr(author, 'name', None) or msg.author_id,
+                        'content': msg.content,
+                        'channel': msg.channel_id
+                    })
+                    recovered += 1
+                # Le point de reprise n'avance qu'après le traitement du message
+                if newest is None or msg.id > newest:
+                    newest = msg.id
+            if len(page) < CLEAR_PAGE_SIZE:
+                break
+            cursor = page[-1].id
     except Exception as e:
-        print(f'[MONITORING] Impossible de récupérer le canal: {e}')
-        return
-    if monitoring_message_id is None:
-        initial_message = "📡 **Monitoring services**\n⏳ Initialisation..."
-        try:
-            monitoring_message = await channel.send(initial_message)
-            monitoring_message_id = monitoring_message.id
-            monitoring_last_content = initial_message
-        except Exception as e:
-            print(f'[MONITORING] Envoi initial échoué: {e}')
-            return
-    while True:
-        try:
-            content = await build_monitoring_message()
-            if content != monitoring_last_content:
-                try:
-                    if monitoring_message is not None:
-                        await monitoring_message.edit(content=content)
-                    else:
-                        raise RuntimeError("Message monitoring introuvable")
-                except Exception:
-                    previous_message = monitoring_message
-                    monitoring_message = await channel.send(content)
-                    monitoring_message_id = monitoring_message.id
-                    if previous_message is not None:
-                        try:
-                            await previous_message.delete()
-                        except Exception:
-                            pass
-                monitoring_last_content = content
-        except Exception as e:
-            print(f'[MONITORING] Erreur boucle: {e}')
-        await asyncio.sleep(MONITORING_INTERVAL_SECONDS)
+        log_event(logging.ERROR, 'erreur', f'Reprise des soumissions: {e}')
+        if start_checkpoint is None:
+            # Parcours du plus récent au plus ancien interrompu : les messages plus anciens n'ont pas été lus
+            newest = None
+    finally:
+        submission_reconcile_running = False
+    
+    # Les messages parcourus sans être des soumissions (confirmations, discussions) ne seront plus relus
+    if newest is not None and (submission_checkpoint is None or newest > submission_checkpoint):
+        submission_checkpoint = newest
+        queue_moderation_write(SQL_SET_STORE_STATE, ('submission_checkpoint', newest))
+    submission_reconcile_stats['runs'] += 1
+    submission_reconcile_stats['scanned'] += scanned
+    submission_reconcile_stats['recovered'] += recovered
+    log_event(logging.INFO, 'soumission', 'Reprise des soumissions terminée', scanned=scanned,
+              recovered=recovered, pending=len(pending_submissions),
+              duration_ms=round((time.perf_counter() - started) * 1000, 1))
 
 
 # ============================================================================
 # ÉVÉNEMENTS
 # ============================================================================
 
-@client.on(stoat.ReadyEvent)
+@on_event(stoat.ReadyEvent)
 async def on_ready(event, /):
     """Bot connecté et prêt"""
     print('=' * 60)
@@ -692,13 +3289,25 @@ async def on_ready(event, /):
     print('[ATTENTION] Envoyez un message dans le canal de soumission')
     print(f'            pour tester le système de modération!')
     print('=' * 60)
+    hydrate_entity_cache(event.servers, event.channels)
     await apply_role_gradient()
-    global monitoring_task
+    global monitoring_task, moderation_flush_task, sanction_expiry_task, submission_reconcile_task, bot_ready
+    bot_ready = True
+    start_loop_watchdog()
+    start_event_recorder()
+    await start_metrics_server()
     if monitoring_task is None or monitoring_task.done():
         monitoring_task = asyncio.create_task(monitoring_loop())
+    if moderation_flush_task is None or moderation_flush_task.done():
+        moderation_flush_task = asyncio.create_task(moderation_flush_loop())
+    if sanction_expiry_task is None or sanction_expiry_task.done():
+        sanction_expiry_task = asyncio.create_task(sanction_expiry_loop())
+    if submission_reconcile_task is None:
+        # Une seule fois par démarrage : les reconnexions ne perdent pas l'index en mémoire
+        submission_reconcile_task = asyncio.create_task(reconcile_submissions())
 
 
-@client.on(stoat.ServerMemberJoinEvent)
+@on_event(stoat.ServerMemberJoinEvent)
 async def on_member_join(event, /):
     """Nouveau membre rejoint le serveur"""
     try:
@@ -709,10 +3318,17 @@ async def on_member_join(event, /):
             if member.server.id != SERVER_ID:
                 return
         
-        print(f'[BIENVENUE] Nouveau membre: {member.name}')
+        log_event(logging.INFO, 'bienvenue', f'Nouveau membre: {member.name}')
+        
+        # Rafale (raid, promotion) : résumé groupé et rôle via la file bornée
+        if is_member_burst():
+            queue_member_summary('join', member.mention)
+            queue_role_grant(member)
+            return
+        member_notification_stats['single'] += 1
         
         # Récupérer le canal
-        channel = await client.fetch_channel(NOTIFICATION_CHANNEL_ID)
+        channel = await get_cached_channel(NOTIFICATION_CHANNEL_ID)
         
         # Message de bienvenue
         welcome_message = (
@@ -722,18 +3338,18 @@ async def on_member_join(event, /):
             f"Si tu as des questions, n'hésite pas à demander! 😊"
         )
         
-        await channel.send(welcome_message)
-        print(f'[OK] Message envoyé pour {member.name}')
+        await send_message(channel, welcome_message)
+        log_event(logging.INFO, 'ok', f'Message envoyé pour {member.name}')
 
         # Attribuer le rôle
-        await member.add_role(NEW_MEMBER_ROLE_ID)
-        print(f'[OK] Rôle {NEW_MEMBER_ROLE_ID} attribué à {member.name}')
+        await grant_new_member_role(member)
+        log_event(logging.INFO, 'ok', f'Rôle {NEW_MEMBER_ROLE_ID} attribué à {member.name}')
 
     except Exception as e:
-        print(f'[ERREUR] Bienvenue: {e}')
+        log_event(logging.ERROR, 'erreur', f'Bienvenue: {e}')
 
 
-@client.on(stoat.ServerMemberRemoveEvent)
+@on_event(stoat.ServerMemberRemoveEvent)
 async def on_member_remove(event, /):
     """Membre quitte le serveur"""
     try:
@@ -746,6 +3362,12 @@ async def on_member_remove(event, /):
         mention = member.mention if member and hasattr(member, 'mention') else f"<@{event.user_id}>"
         reason = event.reason
         
+        if is_member_burst():
+            kind = {stoat.MemberRemovalIntention.kick: 'kick', stoat.MemberRemovalIntention.ban: 'ban'}.get(reason, 'leave')
+            queue_member_summary(kind, f"**{display_name}**")
+            return
+        member_notification_stats['single'] += 1
+        
         if reason == stoat.MemberRemovalIntention.kick:
             title = f"👢 **{display_name}** a été kick du serveur."
             details = "Le membre a été retiré par un modérateur."
@@ -762,56 +3384,140 @@ async def on_member_remove(event, /):
             f"{mention}"
         )
         
-        channel = await client.fetch_channel(NOTIFICATION_CHANNEL_ID)
-        await channel.send(leave_message)
-        print(f'[OK] Message de départ envoyé pour {display_name}')
+        channel = await get_cached_channel(NOTIFICATION_CHANNEL_ID)
+        await send_message(channel, leave_message)
+        log_event(logging.INFO, 'ok', f'Message de départ envoyé pour {display_name}')
         
     except Exception as e:
-        print(f'[ERREUR] Départ: {e}')
+        log_event(logging.ERROR, 'erreur', f'Départ: {e}')
+
+
+@on_event(stoat.ServerMemberUpdateEvent)
+async def on_member_update(event, /):
+    """Membre modifié (rôles, pseudo...) → invalider le cache"""
+    invalidate_cached_member(event.member.id)
+
+
+@on_event(stoat.ServerMemberRemoveEvent)
+async def on_member_remove_cache(event, /):
+    """Membre parti → invalider le cache"""
+    invalidate_cached_member(event.user_id)
+
+
+@on_event(stoat.RawServerRoleUpdateEvent)
+async def on_role_update(event, /):
+    """Rôle créé ou modifié → vider le cache des permissions, serveur à jour"""
+    clear_member_cache()
+    if event.server is not None:
+        store_cached_entity(entity_servers, event.server)
+    else:
+        invalidate_cached_entity(entity_servers, event.role.server_id)
+
+
+@on_event(stoat.ServerRoleDeleteEvent)
+async def on_role_delete(event, /):
+    """Rôle supprimé → vider le cache des permissions, serveur à jour"""
+    clear_member_cache()
+    if event.server is not None:
+        store_cached_entity(entity_servers, event.server)
+    else:
+        invalidate_cached_entity(entity_servers, event.server_id)
+
+
+@on_event(stoat.ServerRoleRanksUpdateEvent)
+async def on_role_ranks_update(event, /):
+    """Rangs des rôles réordonnés → serveur à jour"""
+    if event.server is not None:
+        store_cached_entity(entity_servers, event.server)
+    else:
+        invalidate_cached_entity(entity_servers, event.server_id)
+
+
+@on_event(stoat.ServerUpdateEvent)
+async def on_server_update(event, /):
+    """Serveur modifié → cache d'entités à jour (invalidé si stoat.py n'a pas de copie)"""
+    if event.after is not None:
+        store_cached_entity(entity_servers, event.after)
+    else:
+        invalidate_cached_entity(entity_servers, event.server.id)
+
 
+@on_event(stoat.ServerDeleteEvent)
+async def on_server_delete(event, /):
+    invalidate_cached_entity(entity_servers, event.server_id)
 
-@client.on(stoat.MessageCreateEvent)
+
+@on_event(stoat.ServerChannelCreateEvent)
+async def on_channel_create(event, /):
+    store_cached_entity(entity_channels, event.channel)
+
+
+@on_event(stoat.ChannelUpdateEvent)
+async def on_channel_update(event, /):
+    """Canal modifié → cache d'entités à jour (invalidé si stoat.py n'a pas de copie)"""
+    if event.after is not None:
+        store_cached_entity(entity_channels, event.after)
+    else:
+        invalidate_cached_entity(entity_channels, event.channel.id)
+
+
+@on_event(stoat.ChannelDeleteEvent)
+async def on_channel_delete(event, /):
+    invalidate_cached_entity(entity_channels, event.channel_id)
+
+
+@on_event(stoat.MessageCreateEvent)
 async def on_message(event, /):
     """Nouveau message reçu"""
     message = event.message
     
     # Debug: afficher les infos du message
-    print(f'[MESSAGE] Reçu de {message.author.name} dans canal {message.channel.id}')
+    log_sampled('message', 'Reçu', author=message.author.name, channel_id=message.channel.id)
     
     # Ignorer les messages du bot
     if message.author.relationship is stoat.RelationshipStatus.user:
-        print(f'[MESSAGE] Ignoré - message du bot')
+        log_sampled('message', 'Ignoré - message du bot')
         return
     
     # Vérifier si l'utilisateur est banni
     if message.author.id in banned_users:
-        print(f'[BANNED] Message ignoré de {message.author.name} (utilisateur banni)')
-        await message.channel.send(
-            f"🚫 {message.author.mention} Tu es actuellement banni et tu ne peux pas envoyer de messages."
+        log_event(logging.INFO, 'banned', f'Message ignoré de {message.author.name} (utilisateur banni)')
+        await send_message(
+            message.channel,
+            f"🚫 {message.author.mention} Tu es actuellement banni et tu ne peux pas envoyer de messages.",
+            priority=PRIORITY_MODERATION
         )
         return
     
     # Vérifier si l'utilisateur est muted
     if message.author.id in muted_users:
-        print(f'[MUTED] Message supprimé de {message.author.name} (utilisateur muted)')
+        log_event(logging.INFO, 'muted', f'Message supprimé de {message.author.name} (utilisateur muted)')
         try:
-            await message.delete()
-            await message.channel.send(
-                f"🔇 {message.author.mention} Tu es actuellement mute. Ton message a été supprimé."
+            await run_on_channel(message.channel.id, message.delete, PRIORITY_MODERATION)
+            await send_message(
+                message.channel,
+                f"🔇 {message.author.mention} Tu es actuellement mute. Ton message a été supprimé.",
+                priority=PRIORITY_MODERATION
             )
         except Exception as e:
-            print(f'[ERREUR] Impossible de supprimer le message muted: {e}')
+            log_event(logging.ERROR, 'erreur', f'Impossible de supprimer le message muted: {e}')
         return
     
+    # Automod : flood et messages répétés → mute automatique
+    if AUTOMOD_ENABLED and not message.author.bot:
+        reason = automod_check(message.author.id, message.content)
+        if reason is not None and await apply_automod_mute(message, reason):
+            return
+    
     # Canal de soumission → Modération
     if message.channel.id == SUBMISSION_CHANNEL_ID:
-        print(f'[MESSAGE] Canal de soumission détecté!')
+        log_event(logging.DEBUG, 'message', 'Canal de soumission détecté!')
         await handle_submission(message)
         return
     
     # Vérifier si le bot est mentionné ou si on pose une question
     if is_bot_mentioned(message, client.user.id):
-        print(f'[AI] Question détectée de {message.author.name}')
+        log_event(logging.INFO, 'ai', f'Question détectée de {message.author.name}')
         
         # Extraire la question (enlever la mention du bot)
         question = message.content
@@ -823,147 +3529,73 @@ async def on_message(event, /):
         if not question:
             question = "Bonjour! Comment puis-je t'aider aujourd'hui?"
         
-        # Obtenir la réponse de Mistral AI
-        mood = pick_mood()
-        await message.channel.send(f"🤖 {pick_thinking_response(mood)}")
-        if is_wellbeing_question(question):
-            await message.channel.send(f"{message.author.mention} {pick_wellbeing_response(mood)}")
-            return
-
-        ai_response = await get_mistral_response(question, message.author.name, mood)
-        
-        # Envoyer la réponse
-        await message.channel.send(f"{message.author.mention} {ai_response}")
-        print(f'[AI] Réponse envoyée à {message.author.name}')
+        # Obtenir la réponse de Mistral AI via la file IA (refus immédiat si elle est pleine)
+        if not submit_ai_job(message.author.id, lambda: answer_ai_question(message, question)):
+            log_event(logging.INFO, 'ai', f'File IA pleine, demande de {message.author.name} refusée',
+                      pending=ai_queue_stats['pending'])
+            await send_message(
+                message.channel,
+                f"⏳ {message.author.mention} Je suis débordé pour le moment, réessaie dans quelques instants !",
+                priority=PRIORITY_CHATTER
+            )
         return
     
     # Commandes
-    content = message.content
-    
-    if content.startswith('!ping'):
-        await message.channel.send('🏓 Pong! Le bot fonctionne!')
-        print(f'[CMD] !ping par {message.author.name}')
-    
-    elif content.startswith('!aide') or content.startswith('!help'):
-        help_msg = (
-            "📚 **Commandes disponibles:**\n\n"
-            "**Tout le monde:**\n"
-            "• `!ping` - Vérifier le statut du bot\n"
-            "• `!aide` / `!help` - Afficher cette aide\n"
-            "• `!moderation` - Informations sur la modération\n"
-            "• Mentionnez le bot pour une réponse IA\n\n"
-            "**Modérateurs uniquement:**\n"
-            "• `!clear <nombre>` - Supprimer des messages (max 100)\n"
-            "  Exemple: `!clear 10`\n\n"
-            "**Administrateurs uniquement:**\n"
-            "• `!ban <@user> <durée> <raison>` - Bannir un utilisateur\n"
-            "  Durées: `perm`, `30m`, `1h`, `1d`, `1w`\n"
-            "  Exemple: `!ban @user perm Spam massif`\n\n"
-            "**Modération automatique:**\n"
-            "Les messages dans le canal de soumission reçoivent les réactions ✅ ❌.\n"
-            "Les modérateurs approuvent/refusent en cliquant."
-        )
-        await message.channel.send(help_msg)
-        print(f'[CMD] !aide par {message.author.name}')
-    
-    elif content.startswith('!moderation'):
-        mod_info = (
-            "🛡️ **Système de modération**\n\n"
-            f"**Canal de soumission:** <#{SUBMISSION_CHANNEL_ID}>\n"
-            f"**Rôles modérateurs:** 2 configurés\n\n"
-            "**Commandes admin disponibles:**\n"
-            "• `!ban <@user> <durée> <raison>` - Bannir un utilisateur\n"
-            "• `!mute <@user> <durée> <raison>` - Muter un utilisateur\n"
-            "• `!unban <@user>` - Débannir un utilisateur\n"
-            "• `!warn <@user> <raison>` - Avertir un utilisateur\n"
-            "• `!warnings <@user>` - Voir les avertissements\n\n"
-            "**Comment ça marche:**\n"
-            "1. L'utilisateur soumet un serveur\n"
-            "2. Le bot ajoute les réactions ✅ ❌\n"
-            "3. Le modérateur approuve/refuse\n"
-            "4. Le message est traité\n\n"
-            "**Statut:** ✅ Actif"
-        )
-        await message.channel.send(mod_info)
-        print(f'[CMD] !moderation par {message.author.name}')
-    
-    elif content.startswith('!clear'):
-        await handle_clear(message)
-    
-    elif content.startswith('!ban'):
-        await handle_ban(message)
-    
-    elif content.startswith('!mute'):
-        await handle_mute(message)
-    
-    elif content.startswith('!unban'):
-        await handle_unban(message)
-    
-    elif content.startswith('!warn'):
-        await handle_warn(message)
-    
-    elif content.startswith('!warnings'):
-        await handle_warnings(message)
+    await dispatch_command(message)
 
 
-@client.on(stoat.MessageReactEvent)
+@on_event(stoat.MessageReactEvent)
 async def on_reaction(event, /):
     """Réaction ajoutée à un message"""
     try:
-        print(f'[REACTION] Event recu: user_id={event.user_id}, message_id={event.message_id}, emoji={event.emoji}')
+        log_sampled('reaction', 'Event reçu', user_id=event.user_id, message_id=event.message_id, emoji=event.emoji)
         
         # Ignorer les réactions du bot
         if hasattr(client, 'user') and client.user and event.user_id == client.user.id:
-            print(f'[REACTION] Ignoree - reaction du bot')
+            log_event(logging.DEBUG, 'reaction', 'Ignoree - reaction du bot')
             return
         
         message_id = event.message_id
         
-        # Debug: afficher les soumissions en attente
-        print(f'[DEBUG] Soumissions en attente: {list(pending_submissions.keys())}')
-        print(f'[DEBUG] Message ID recu: {message_id}')
-        
         # Vérifier si soumission en attente
         if message_id not in pending_submissions:
-            print(f'[REACTION] Message {message_id} non trouvé dans pending_submissions')
+            log_event(logging.DEBUG, 'reaction', 'Message hors soumissions en attente', message_id=message_id,
+                      pending=len(pending_submissions))
             return
         
-        print(f'[REACTION] Soumission trouvée, vérification permissions...')
+        log_event(logging.DEBUG, 'reaction', 'Soumission trouvée, vérification permissions...')
         
         # Vérifier permissions
         has_permission = await check_moderator_permission(event.user_id)
         
         if not has_permission:
-            print(f'[MODERATION] Utilisateur {event.user_id} sans permissions')
-            channel = await client.fetch_channel(SUBMISSION_CHANNEL_ID)
-            await channel.send("⚠️ Seuls les modérateurs peuvent approuver/refuser les soumissions.")
+            log_event(logging.INFO, 'moderation', f'Utilisateur {event.user_id} sans permissions')
+            channel = await get_cached_channel(SUBMISSION_CHANNEL_ID)
+            await send_message(channel, "⚠️ Seuls les modérateurs peuvent approuver/refuser les soumissions.", priority=PRIORITY_MODERATION)
             return
         
-        print(f'[REACTION] Permissions OK, traitement de la réaction...')
+        log_event(logging.DEBUG, 'reaction', 'Permissions OK, traitement de la réaction...')
         
-        # Récupérer le modérateur
-        server = await client.fetch_server(SERVER_ID)
-        moderator = await server.fetch_member(event.user_id)
+        # Récupérer le modérateur (déjà en cache après la vérification)
+        moderator = await get_cached_member(event.user_id)
         
         submission = pending_submissions[message_id]
         emoji = event.emoji
         
-        print(f'[REACTION] Emoji: {emoji} (type: {type(emoji)})')
+        log_event(logging.DEBUG, 'reaction', f'Emoji: {emoji} (type: {type(emoji)})')
         
         # Traiter selon la réaction
         if emoji == '✅' or str(emoji) == '✅':
-            print(f'[REACTION] Approbation détectée')
+            log_event(logging.DEBUG, 'reaction', 'Approbation détectée')
             await handle_approval(message_id, submission, moderator)
         elif emoji == '❌' or str(emoji) == '❌':
-            print(f'[REACTION] Refus détecté')
+            log_event(logging.DEBUG, 'reaction', 'Refus détecté')
             await handle_rejection(message_id, submission, moderator)
         else:
-            print(f'[REACTION] Emoji non reconnu: {emoji}')
+            log_event(logging.DEBUG, 'reaction', f'Emoji non reconnu: {emoji}')
         
     except Exception as e:
-        print(f'[ERREUR] Réaction: {e}')
-        import traceback
-        traceback.print_exc()
+        log_event(logging.ERROR, 'erreur', f'Réaction: {e}', exc_info=True)
 
 
 # ============================================================================
@@ -973,61 +3605,65 @@ async def on_reaction(event, /):
 async def handle_submission(message):
     """Gérer une nouvelle soumission"""
     try:
-        print(f'[SOUMISSION] Par {message.author.name} (ID: {message.author.id})')
-        print(f'[SOUMISSION] Message ID: {message.id}')
-        print(f'[SOUMISSION] Canal ID: {message.channel.id}')
-        print(f'[SOUMISSION] Contenu: {message.content[:100]}...')
+        log_event(logging.DEBUG, 'soumission', f'Par {message.author.name} (ID: {message.author.id})')
+        log_event(logging.DEBUG, 'soumission', f'Message ID: {message.id}')
+        log_event(logging.DEBUG, 'soumission', f'Canal ID: {message.channel.id}')
+        log_event(logging.DEBUG, 'soumission', f'Contenu: {message.content[:100]}...')
         
-        # Ajouter les réactions via le client
+        # Ajouter les réactions via le client (la file sortante garde l'ordre et le rythme)
         try:
             # Méthode 1 : via le client directement
-            await client.add_reaction(message.channel.id, message.id, '✅')
-            await asyncio.sleep(0.5)
-            await client.add_reaction(message.channel.id, message.id, '❌')
-            print(f'[MODERATION] Réactions ajoutées au message {message.id}')
+            for emoji in ('✅', '❌'):
+                await run_on_channel(
+                    message.channel.id,
+                    lambda emoji=emoji: client.add_reaction(message.channel.id, message.id, emoji),
+                    PRIORITY_MODERATION
+                )
+            log_event(logging.INFO, 'moderation', f'Réactions ajoutées au message {message.id}')
         except AttributeError:
             try:
                 # Méthode 2 : via le canal
                 channel = message.channel
-                await channel.add_reaction(message.id, '✅')
-                await asyncio.sleep(0.5)
-                await channel.add_reaction(message.id, '❌')
-                print(f'[MODERATION] Réactions ajoutées au message {message.id}')
+                for emoji in ('✅', '❌'):
+                    await run_on_channel(
+                        channel.id,
+                        lambda emoji=emoji: channel.add_reaction(message.id, emoji),
+                        PRIORITY_MODERATION
+                    )
+                log_event(logging.INFO, 'moderation', f'Réactions ajoutées au message {message.id}')
             except Exception as e2:
-                print(f'[ERREUR] Impossible d\'ajouter les réactions: {e2}')
-                print(f'[DEBUG] Attributs du message: {dir(message)}')
-                print(f'[DEBUG] Attributs du canal: {dir(message.channel)}')
+                log_event(logging.ERROR, 'erreur', f'Impossible d\'ajouter les réactions: {e2}')
+                log_event(logging.DEBUG, 'debug', f'Attributs du message: {dir(message)}')
+                log_event(logging.DEBUG, 'debug', f'Attributs du canal: {dir(message.channel)}')
         
-        # Stocker
-        pending_submissions[message.id] = {
+        # Stocker (persisté : survit à un redémarrage)
+        remember_submission(message.id, {
             'author': message.author.id,
             'author_name': message.author.name,
             'content': message.content,
             'channel': message.channel.id
-        }
+        })
         
-        print(f'[DEBUG] Soumission stockée. Total en attente: {len(pending_submissions)}')
-        print(f'[DEBUG] IDs en attente: {list(pending_submissions.keys())}')
+        log_event(logging.DEBUG, 'soumission', 'Soumission stockée', pending=len(pending_submissions))
         
         # Confirmation
-        await message.channel.send(
+        await send_message(
+            message.channel,
             f"📋 {message.author.mention} Ta soumission a été reçue!\n"
             f"Elle sera examinée par un modérateur. Merci pour ta patience! ⏳"
         )
-        print(f'[OK] Soumission {message.id} en attente de modération')
+        log_event(logging.INFO, 'ok', f'Soumission {message.id} en attente de modération')
         
     except Exception as e:
-        print(f'[ERREUR] Soumission: {e}')
-        import traceback
-        traceback.print_exc()
+        log_event(logging.ERROR, 'erreur', f'Soumission: {e}', exc_info=True)
 
 
 async def handle_approval(message_id, submission, moderator):
     """Approuver une soumission"""
     try:
-        print(f'[APPROBATION] Par {moderator.name}')
+        log_event(logging.INFO, 'approbation', f'Par {moderator.name}')
         
-        channel = await client.fetch_channel(SUBMISSION_CHANNEL_ID)
+        channel = await get_cached_channel(SUBMISSION_CHANNEL_ID)
         
         approved_msg = (
             f"✅ **SERVEUR APPROUVÉ**\n\n"
@@ -1036,30 +3672,30 @@ async def handle_approval(message_id, submission, moderator):
             f"*Approuvé par:* {moderator.mention}"
         )
         
-        await channel.send(approved_msg)
+        await send_message(channel, approved_msg, priority=PRIORITY_MODERATION)
         
         # Supprimer le message original
         try:
             original_message = await channel.fetch_message(message_id)
-            await original_message.delete()
-            print(f'[OK] Message original supprimé')
+            await run_on_channel(channel.id, original_message.delete, PRIORITY_MODERATION)
+            log_event(logging.INFO, 'ok', 'Message original supprimé')
         except Exception as e:
-            print(f'[INFO] Impossible de supprimer le message original: {e}')
+            log_event(logging.INFO, 'info', f'Impossible de supprimer le message original: {e}')
         
-        del pending_submissions[message_id]
+        forget_submission(message_id)
         
-        print(f'[OK] Soumission {message_id} approuvée')
+        log_event(logging.INFO, 'ok', f'Soumission {message_id} approuvée')
         
     except Exception as e:
-        print(f'[ERREUR] Approbation: {e}')
+        log_event(logging.ERROR, 'erreur', f'Approbation: {e}')
 
 
 async def handle_rejection(message_id, submission, moderator):
     """Refuser une soumission"""
     try:
-        print(f'[REFUS] Par {moderator.name}')
+        log_event(logging.INFO, 'refus', f'Par {moderator.name}')
         
-        channel = await client.fetch_channel(SUBMISSION_CHANNEL_ID)
+        channel = await get_cached_channel(SUBMISSION_CHANNEL_ID)
         
         rejection_msg = (
             f"❌ **SOUMISSION REFUSÉE**\n\n"
@@ -1067,152 +3703,373 @@ async def handle_rejection(message_id, submission, moderator):
             f"*Refusé par:* {moderator.mention}"
         )
         
-        await channel.send(rejection_msg)
+        await send_message(channel, rejection_msg, priority=PRIORITY_MODERATION)
         
         # Supprimer le message original
         try:
             message = await channel.fetch_message(message_id)
-            await message.delete()
-            print(f'[OK] Message supprimé')
+            await run_on_channel(channel.id, message.delete, PRIORITY_MODERATION)
+            log_event(logging.INFO, 'ok', 'Message supprimé')
         except Exception as e:
-            print(f'[INFO] Impossible de supprimer: {e}')
+            log_event(logging.INFO, 'info', f'Impossible de supprimer: {e}')
         
-        del pending_submissions[message_id]
-        print(f'[OK] Soumission {message_id} refusée')
+        forget_submission(message_id)
+        log_event(logging.INFO, 'ok', f'Soumission {message_id} refusée')
         
     except Exception as e:
-        print(f'[ERREUR] Refus: {e}')
+        log_event(logging.ERROR, 'erreur', f'Refus: {e}')
 
 
 # ============================================================================
-# HANDLERS - COMMANDES
+# PROFILAGE À LA DEMANDE (!profile)
 # ============================================================================
 
-async def handle_clear(message):
-    """Commande !clear pour supprimer des messages"""
+PROFILING_SETTINGS = config.get('profiling', {})
+PROFILE_MAX_SECONDS = int(PROFILING_SETTINGS.get('max_seconds', 120))
+PROFILE_TOP_N = int(PROFILING_SETTINGS.get('top_n', 15))
+PROFILE_DIR = PROFILING_SETTINGS.get('dir', 'profiles')
+
+PROFILE_IDLE_FUNCTIONS = ("<method 'poll' of 'select.", "<method 'select' of 'select.", "<method 'control' of 'select.")
+
+# Aucun hook n'est installé hors d'une fenêtre de profilage : coût nul au repos
+active_profile = None
+
+
+def format_profile_report(stats, top_n=PROFILE_TOP_N):
+    """Top-N des fonctions par temps propre (tottime), en lignes courtes"""
+    # L'attente I/O du sélecteur (boucle au repos) n'est pas du travail du bot
+    rows = [item for item in stats.stats.items() if not item[0][2].startswith(PROFILE_IDLE_FUNCTIONS)]
+    rows = sorted(rows, key=lambda item: item[1][2], reverse=True)[:top_n]
+    lines = []
+    for (filename, line, function), (_, ncalls, tottime, cumtime, _) in rows:
+        location = f"{os.path.basename(filename)}:{line}" if line else filename
+        lines.append(f"`{tottime * 1000:8.1f} ms` `{cumtime * 1000:8.1f} ms` {ncalls:>7} × {function} ({location})")
+    return lines
+
+
+async def profile_event_loop(seconds, profiler):
+    """Profile le thread de la boucle pendant `seconds` ; retourne (pstats.Stats, chemin du fichier)"""
+    profiler.enable()
     try:
-        # Vérifier permissions
-        has_permission = await check_moderator_permission(message.author.id)
-        
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof")
+    stats = pstats.Stats(profiler)
+    await asyncio.to_thread(stats.dump_stats, path)
+    return stats, path
+
+
+# ============================================================================
+# ROUTEUR DE COMMANDES
+# ============================================================================
+
+COMMAND_PREFIX = config.get('commands', {}).get('prefix', '!')
+
+# Table des commandes : le nom et chaque alias pointent vers la même entrée
+COMMANDS = {}  # Format: {nom: {'name': str, 'handler': coroutine, 'permission': str|None, 'denied': str}}
+
+PERMISSION_CHECKS = {
+    'moderator': check_moderator_permission,
+    'admin': check_admin_permission
+}
+
+
+def command(name, aliases=(), permission=None, denied=None):
+    """Décorateur : enregistre un handler `handler(message, args)` dans la table"""
+    def decorator(handler):
+        entry = {
+            'name': name,
+            'handler': handler,
+            'permission': permission,
+            'denied': denied or "Tu n'as pas les droits nécessaires."
+        }
+        for key in (name, *aliases):
+            COMMANDS[key] = entry
+        return handler
+    return decorator
+
+
+def resolve_command(content):
+    """Retourne (entrée, arguments) pour un message de commande, sinon None"""
+    if not content.startswith(COMMAND_PREFIX):
+        return None
+    parts = content[len(COMMAND_PREFIX):].split()
+    if not parts:
+        return None
+    entry = COMMANDS.get(parts[0].lower())
+    if entry is None:
+        return None
+    return entry, parts[1:]
+
+
+def parse_user_mention(token):
+    """Extrait l'ID utilisateur d'une mention <@id> / <@!id>, None si invalide"""
+    if not token.startswith('<@') or not token.endswith('>'):
+        return None
+    user_id = token[2:-1]  # Enlever <@ et >
+    if user_id.startswith('!'):
+        user_id = user_id[1:]  # Enlever le ! si présent
+    return user_id or None
+
+
+async def dispatch_command(message):
+    """Exécute la commande du message (vérification des permissions incluse)"""
+    resolved = resolve_command(message.content)
+    if resolved is None:
+        return False
+    entry, args = resolved
+    
+    if not config.get('commands', {}).get(entry['name'], {}).get('enabled', True):
+        return False
+    
+    if entry['permission'] is not None:
+        has_permission = await PERMISSION_CHECKS[entry['permission']](message.author.id)
         if not has_permission:
-            print(f'[CLEAR] {message.author.name} sans permissions')
-            await message.channel.send(
+            log_event(logging.INFO, entry['name'], f'{message.author.name} sans permissions')
+            await send_message(
+                message.channel,
                 f"❌ {message.author.mention} Tu n'as pas la permission d'utiliser cette commande.\n"
-                f"Seuls les modérateurs peuvent supprimer des messages."
+                f"{entry['denied']}"
             )
-            return
-        
-        # Parser le nombre
-        parts = message.content.split()
-        
-        if len(parts) < 2:
-            await message.channel.send(
-                "📋 **Usage:** `!clear <nombre>`\n"
-                "Exemple: `!clear 10` pour supprimer 10 messages\n"
-                "Maximum: 100 messages"
+            return True
+    
+    await entry['handler'](message, args)
+    return True
+
+
+# ============================================================================
+# HANDLERS - COMMANDES
+# ============================================================================
+
+@command('ping')
+async def handle_ping(message, args):
+    """Commande !ping"""
+    await send_message(message.channel, '🏓 Pong! Le bot fonctionne!', priority=PRIORITY_CHATTER)
+    log_event(logging.INFO, 'cmd', f'!ping par {message.author.name}')
+
+
+@command('aide', aliases=('help',))
+async def handle_help(message, args):
+    """Commande !aide / !help"""
+    help_msg = (
+        "📚 **Commandes disponibles:**\n\n"
+        "**Tout le monde:**\n"
+        "• `!ping` - Vérifier le statut du bot\n"
+        "• `!aide` / `!help` - Afficher cette aide\n"
+        "• `!moderation` - Informations sur la modération\n"
+        "• `!uptime <service>` - Disponibilité et latence d'un service surveillé\n"
+        "• Mentionnez le bot pour une réponse IA\n\n"
+        "**Modérateurs uniquement:**\n"
+        f"• `!clear <nombre> [filtres]` - Supprimer des messages (max {CLEAR_MAX_MESSAGES})\n"
+        "  Filtres: `user:@user`, `contains:mot`, `before:1h`, `after:1h`, `bots`\n"
+        "  Exemple: `!clear 10`\n\n"
+        "**Administrateurs uniquement:**\n"
+        "• `!ban <@user> <durée> <raison>` - Bannir un utilisateur\n"
+        "  Durées: `perm`, `30m`, `1h`, `1d`, `1w`\n"
+        "  Exemple: `!ban @user perm Spam massif`\n"
+        "• `!profile <secondes>` - Profiler le bot et publier les fonctions les plus coûteuses\n\n"
+        "**Modération automatique:**\n"
+        "Les messages dans le canal de soumission reçoivent les réactions ✅ ❌.\n"
+        "Les modérateurs approuvent/refusent en cliquant."
+    )
+    await send_message(message.channel, help_msg, priority=PRIORITY_CHATTER)
+    log_event(logging.INFO, 'cmd', f'!aide par {message.author.name}')
+
+
+@command('moderation')
+async def handle_moderation_info(message, args):
+    """Commande !moderation"""
+    mod_info = (
+        "🛡️ **Système de modération**\n\n"
+        f"**Canal de soumission:** <#{SUBMISSION_CHANNEL_ID}>\n"
+        f"**Rôles modérateurs:** 2 configurés\n\n"
+        "**Commandes admin disponibles:**\n"
+        "• `!ban <@user> <durée> <raison>` - Bannir un utilisateur\n"
+        "• `!mute <@user> <durée> <raison>` - Muter un utilisateur\n"
+        "• `!unban <@user>` - Débannir un utilisateur\n"
+        "• `!warn <@user> <raison>` - Avertir un utilisateur\n"
+        "• `!warnings <@user>` - Voir les avertissements\n\n"
+        "**Comment ça marche:**\n"
+        "1. L'utilisateur soumet un serveur\n"
+        "2. Le bot ajoute les réactions ✅ ❌\n"
+        "3. Le modérateur approuve/refuse\n"
+        "4. Le message est traité\n\n"
+        "**Statut:** ✅ Actif"
+    )
+    await send_message(message.channel, mod_info, priority=PRIORITY_CHATTER)
+    log_event(logging.INFO, 'cmd', f'!moderation par {message.author.name}')
+
+
+@command('uptime')
+async def handle_uptime(message, args):
+    """Commande !uptime <service>"""
+    services = build_monitoring_services()
+    if not args:
+        names = ', '.join(f"`{monitoring_service_id(service)}`" for service in services)
+        await send_message(
+            message.channel,
+            "📋 **Usage:** `!uptime <service>`\n"
+            f"**Services:** {names}",
+            priority=PRIORITY_CHATTER
+        )
+        return
+    
+    query = ' '.join(args).lower()
+    matches = [
+        service for service in services
+        if query == monitoring_service_id(service) or query in service['label'].lower()
+    ]
+    if not matches:
+        await send_message(message.channel, f"❌ Service inconnu : `{query}`. Tape `!uptime` pour la liste.", priority=PRIORITY_CHATTER)
+        return
+    
+    service = matches[0]
+    history = get_probe_history(service)
+    lines = [f"📈 **Uptime - {service['label']}**"]
+    if history.last is not None:
+        timestamp, latency_ms, ok = history.last
+        checked = datetime.fromtimestamp(timestamp, ZoneInfo("Europe/Paris")).strftime('%d/%m/%Y %H:%M:%S')
+        lines.append(f"**Dernière sonde:** {'✅ OK' if ok else '❌ ERREUR'} ({latency_ms} ms, {checked})")
+    for window, label in (('24h', '24 heures'), ('7d', '7 jours')):
+        summary = history.summary(window)
+        lines.append(
+            f"**{label}:** {format_uptime(summary)} sur {summary['samples']} sondes · "
+            f"p50/p95/p99 {format_percentiles(summary)}"
+        )
+    await send_message(message.channel, "\n".join(lines), priority=PRIORITY_CHATTER)
+    log_event(logging.INFO, 'cmd', f'!uptime par {message.author.name}', service=monitoring_service_id(service))
+
+
+@command('clear', permission='moderator', denied="Seuls les modérateurs peuvent supprimer des messages.")
+async def handle_clear(message, args):
+    """Commande !clear pour supprimer des messages (avec filtres)"""
+    try:
+        if not args:
+            await send_message(
+                message.channel,
+                "📋 **Usage:** `!clear <nombre> [filtres]`\n"
+                "**Filtres:** `user:@utilisateur`, `contains:mot`, `before:<durée|ID>`, `after:<durée|ID>`, `bots`\n"
+                "**Exemples:**\n"
+                "`!clear 10` pour supprimer les 10 derniers messages\n"
+                "`!clear 50 user:@utilisateur after:1h` pour ses messages de la dernière heure\n"
+                f"Maximum: {CLEAR_MAX_MESSAGES} messages",
+                priority=PRIORITY_MODERATION
             )
             return
         
         try:
-            count = int(parts[1])
+            count = int(args[0])
         except ValueError:
-            await message.channel.send("❌ Merci de fournir un nombre valide.")
+            await send_message(message.channel, "❌ Merci de fournir un nombre valide.", priority=PRIORITY_MODERATION)
             return
         
-        if count < 1 or count > 100:
-            await message.channel.send("❌ Le nombre doit être entre 1 et 100.")
+        if count < 1 or count > CLEAR_MAX_MESSAGES:
+            await send_message(message.channel, f"❌ Le nombre doit être entre 1 et {CLEAR_MAX_MESSAGES}.", priority=PRIORITY_MODERATION)
             return
         
-        print(f'[CLEAR] {message.author.name} supprime {count} messages')
+        try:
+            filters = parse_clear_filters(args[1:])
+        except ValueError as e:
+            await send_message(message.channel, f"❌ {e}", priority=PRIORITY_MODERATION)
+            return
+        
+        log_event(logging.INFO, 'clear', f'{message.author.name} supprime {count} messages',
+                  channel_id=message.channel.id, filters=sorted(filters))
         
         # Supprimer le message de commande
         try:
-            await message.delete()
+            await run_on_channel(message.channel.id, message.delete, PRIORITY_MODERATION)
         except Exception as e:
-            print(f'[INFO] Impossible de supprimer la commande: {e}')
+            log_event(logging.INFO, 'info', f'Impossible de supprimer la commande: {e}')
+        
+        # Un seul message de statut, édité au fil de la progression
+        status = await send_message(message.channel, "🧹 Nettoyage en cours...", priority=PRIORITY_MODERATION)
+        last_edit = time.monotonic()
         
-        # Pour l'instant, informer que la fonction est en développement
-        # L'API Stoat peut ne pas supporter la récupération de messages historiques
-        await message.channel.send(
-            f"ℹ️ Fonction clear en cours de développement. "
-            f"La suppression de messages historiques nécessite une API spécifique."
+        async def edit_status(content):
+            try:
+                await run_on_channel(message.channel.id, lambda: status.edit(content=content), PRIORITY_MODERATION)
+            except Exception as e:
+                log_sampled('clear', f'Mise à jour du statut impossible: {e}')
+        
+        async def on_progress(stats):
+            nonlocal last_edit
+            if time.monotonic() - last_edit < CLEAR_PROGRESS_INTERVAL_SECONDS:
+                return
+            last_edit = time.monotonic()
+            await edit_status(
+                f"🧹 Nettoyage en cours... {stats['deleted']} supprimé(s), {stats['scanned']} analysé(s)"
+            )
+        
+        stats = await clear_channel_messages(
+            message.channel.id, count, filters,
+            exclude={message.id, status.id},
+            on_progress=on_progress
         )
         
-        # TODO: Implémenter la suppression une fois l'API Stoat documentée
-        # Pour l'instant, cette fonctionnalité est désactivée
-        print(f'[CLEAR] Fonction clear non implémentée - API Stoat limitée')
+        summary = f"✅ **{stats['deleted']}** message(s) supprimé(s) sur {stats['scanned']} analysé(s)"
+        if stats['failed']:
+            summary += f" ({stats['failed']} échec(s))"
+        await edit_status(summary)
         
-        print(f'[OK] Commande clear exécutée')
+        log_event(logging.INFO, 'ok', 'Commande clear exécutée', **stats)
         
     except Exception as e:
-        print(f'[ERREUR] Clear: {e}')
+        log_event(logging.ERROR, 'erreur', f'Clear: {e}')
 
 
-async def handle_ban(message):
+@command('ban', permission='admin', denied="Seuls les administrateurs peuvent bannir des utilisateurs.")
+async def handle_ban(message, args):
     """Commande !ban pour bannir un utilisateur"""
     try:
-        # Vérifier permissions admin
-        has_permission = await check_admin_permission(message.author.id)
-        
-        if not has_permission:
-            print(f'[BAN] {message.author.name} sans permissions')
-            await message.channel.send(
-                f"❌ {message.author.mention} Tu n'as pas la permission d'utiliser cette commande.\n"
-                f"Seuls les administrateurs peuvent bannir des utilisateurs."
-            )
-            return
-        
-        # Parser la commande
-        parts = message.content.split()
-        
-        if len(parts) < 3:
-            await message.channel.send(
+        if len(args) < 2:
+            await send_message(
+                message.channel,
                 "📋 **Usage:** `!ban <@utilisateur> <durée> <raison>`\n"
                 "**Durées:** `perm` (permanent), `30m`, `1h`, `1d`, `1w`\n"
                 "**Exemples:**\n"
                 "`!ban @utilisateur perm Spam massif`\n"
-                "`!ban @utilisateur 1d Comportement inapproprié`"
+                "`!ban @utilisateur 1d Comportement inapproprié`",
+                priority=PRIORITY_MODERATION
             )
             return
         
         # Extraire l'utilisateur mentionné
-        user_mention = parts[1]
-        if not user_mention.startswith('<@') or not user_mention.endswith('>'):
-            await message.channel.send("❌ Merci de mentionner un utilisateur valide (@username).")
+        user_mention = args[0]
+        user_id = parse_user_mention(user_mention)
+        if user_id is None:
+            await send_message(message.channel, "❌ Merci de mentionner un utilisateur valide (@username).", priority=PRIORITY_MODERATION)
             return
         
-        # Extraire l'ID de l'utilisateur
-        user_id = user_mention[2:-1]  # Enlever <@ et >
-        if user_id.startswith('!'):
-            user_id = user_id[1:]  # Enlever le ! si présent
-        
         # Vérifier que l'utilisateur n'est pas déjà banni
         if is_user_banned(user_id):
-            await message.channel.send(f"❌ Cet utilisateur est déjà banni.")
+            await send_message(message.channel, f"❌ Cet utilisateur est déjà banni.", priority=PRIORITY_MODERATION)
             return
         
         # Parser la durée
-        duration_str = parts[2].lower()
+        duration_str = args[1].lower()
         if duration_str == 'perm':
             duration_seconds = None
             expires_at = None
         else:
             duration_seconds = parse_duration(duration_str)
             if duration_seconds is None:
-                await message.channel.send("❌ Durée invalide. Utilise `perm`, `30m`, `1h`, `1d`, ou `1w`.")
+                await send_message(message.channel, "❌ Durée invalide. Utilise `perm`, `30m`, `1h`, `1d`, ou `1w`.", priority=PRIORITY_MODERATION)
                 return
             expires_at = time.time() + duration_seconds
         
         # Extraire la raison
-        reason = ' '.join(parts[3:]) if len(parts) > 3 else 'Aucune raison fournie'
+        reason = ' '.join(args[2:]) if len(args) > 2 else 'Aucune raison fournie'
         
         # Créer le ban
-        banned_users[user_id] = {
+        set_sanction('ban', user_id, {
             'reason': reason,
             'duration': duration_seconds,
             'expires_at': expires_at,
             'banned_by': message.author.name
-        }
+        })
         
         # Construire le message de confirmation
         if duration_seconds is None:
@@ -1220,86 +4077,73 @@ async def handle_ban(message):
         else:
             duration_text = f"**{duration_str}**"
         
-        await message.channel.send(
+        await send_message(
+            message.channel,
             f"✅ **Utilisateur banni**\n\n"
             f"👤 **Utilisateur:** {user_mention}\n"
             f"⏱️ **Durée:** {duration_text}\n"
             f"📝 **Raison:** {reason}\n"
-            f"👮 **Banni par:** {message.author.mention}"
+            f"👮 **Banni par:** {message.author.mention}",
+            priority=PRIORITY_MODERATION
         )
         
-        print(f'[BAN] {message.author.name} a banni {user_mention} ({duration_text}) - Raison: {reason}')
+        log_event(logging.INFO, 'ban', f'{message.author.name} a banni {user_mention} ({duration_text}) - Raison: {reason}')
         
     except Exception as e:
-        print(f'[ERREUR] Ban: {e}')
-        await message.channel.send("❌ Une erreur est survenue lors du bannissement.")
+        log_event(logging.ERROR, 'erreur', f'Ban: {e}')
+        await send_message(message.channel, "❌ Une erreur est survenue lors du bannissement.", priority=PRIORITY_MODERATION)
 
 
-async def handle_mute(message):
+@command('mute', permission='admin', denied="Seuls les administrateurs peuvent muter des utilisateurs.")
+async def handle_mute(message, args):
     """Commande !mute pour muter un utilisateur"""
     try:
-        # Vérifier permissions admin
-        has_permission = await check_admin_permission(message.author.id)
-        
-        if not has_permission:
-            print(f'[MUTE] {message.author.name} sans permissions')
-            await message.channel.send(
-                f"❌ {message.author.mention} Tu n'as pas la permission d'utiliser cette commande.\n"
-                f"Seuls les administrateurs peuvent muter des utilisateurs."
-            )
-            return
-        
-        # Parser la commande
-        parts = message.content.split()
-        
-        if len(parts) < 3:
-            await message.channel.send(
+        if len(args) < 2:
+            await send_message(
+                message.channel,
                 "📋 **Usage:** `!mute <@utilisateur> <durée> <raison>`\n"
                 "**Durées:** `perm` (permanent), `30m`, `1h`, `1d`, `1w`\n"
                 "**Exemples:**\n"
                 "`!mute @utilisateur perm Spam répétitif`\n"
-                "`!mute @utilisateur 1h Trop de messages`"
+                "`!mute @utilisateur 1h Trop de messages`",
+                priority=PRIORITY_MODERATION
             )
             return
         
         # Extraire l'utilisateur mentionné
-        user_mention = parts[1]
-        if not user_mention.startswith('<@') or not user_mention.endswith('>'):
-            await message.channel.send("❌ Merci de mentionner un utilisateur valide (@username).")
+        user_mention = args[0]
+        user_id = parse_user_mention(user_mention)
+        if user_id is None:
+            await send_message(message.channel, "❌ Merci de mentionner un utilisateur valide (@username).", priority=PRIORITY_MODERATION)
             return
         
-        # Extraire l'ID de l'utilisateur
-        user_id = user_mention[2:-1]  # Enlever <@ et >
-        if user_id.startswith('!'):
-            user_id = user_id[1:]  # Enlever le ! si présent
-        
         # Vérifier que l'utilisateur n'est pas déjà muté
         if is_user_muted(user_id):
-            await message.channel.send(f"❌ Cet utilisateur est déjà muté.")
+            await send_message(message.channel, f"❌ Cet utilisateur est déjà muté.", priority=PRIORITY_MODERATION)
             return
         
         # Parser la durée
-        duration_str = parts[2].lower()
+        duration_str = args[1].lower()
         if duration_str == 'perm':
             duration_seconds = None
             expires_at = None
         else:
             duration_seconds = parse_duration(duration_str)
             if duration_seconds is None:
-                await message.channel.send("❌ Durée invalide. Utilise `perm`, `30m`, `1h`, `1d`, ou `1w`.")
+                await send_message(message.channel, "❌ Durée invalide. Utilise `perm`, `30m`, `1h`, `1d`, ou `1w`.", priority=PRIORITY_MODERATION)
                 return
             expires_at = time.time() + duration_seconds
         
         # Extraire la raison
-        reason = ' '.join(parts[3:]) if len(parts) > 3 else 'Aucune raison fournie'
+        reason = ' '.join(args[2:]) if len(args) > 2 else 'Aucune raison fournie'
         
         # Créer le mute
-        muted_users[user_id] = {
+        set_sanction('mute', user_id, {
             'reason': reason,
             'duration': duration_seconds,
             'expires_at': expires_at,
             'muted_by': message.author.name
-        }
+        })
         
         # Nettoyer les messages de l'utilisateur dans le canal
         deleted_count = await cleanup_user_messages(message.channel, user_id, 50)
@@ -1312,178 +4156,140 @@ async def handle_mute(message):
         
         cleanup_text = f"🗑️ **Messages supprimés:** {deleted_count}\n" if deleted_count > 0 else ""
         
-        await message.channel.send(
+        await send_message(
+            message.channel,
             f"🔇 **Utilisateur muté**\n\n"
             f"👤 **Utilisateur:** {user_mention}\n"
             f"⏱️ **Durée:** {duration_text}\n"
             f"📝 **Raison:** {reason}\n"
             f"{cleanup_text}"
-            f"👮 **Muté par:** {message.author.mention}"
+            f"👮 **Muté par:** {message.author.mention}",
+            priority=PRIORITY_MODERATION
         )
         
-        print(f'[MUTE] {message.author.name} a muté {user_mention} ({duration_text}) - Raison: {reason}')
+        log_event(logging.INFO, 'mute', f'{message.author.name} a muté {user_mention} ({duration_text}) - Raison: {reason}')
         
     except Exception as e:
-        print(f'[ERREUR] Mute: {e}')
-        await message.channel.send("❌ Une erreur est survenue lors du muting.")
+        log_event(logging.ERROR, 'erreur', f'Mute: {e}')
+        await send_message(message.channel, "❌ Une erreur est survenue lors du muting.", priority=PRIORITY_MODERATION)
 
 
-async def handle_unban(message):
+@command('unban', permission='admin', denied="Seuls les administrateurs peuvent débannir des utilisateurs.")
+async def handle_unban(message, args):
     """Commande !unban pour débannir un utilisateur"""
     try:
-        # Vérifier permissions admin
-        has_permission = await check_admin_permission(message.author.id)
-        
-        if not has_permission:
-            print(f'[UNBAN] {message.author.name} sans permissions')
-            await message.channel.send(
-                f"❌ {message.author.mention} Tu n'as pas la permission d'utiliser cette commande.\n"
-                f"Seuls les administrateurs peuvent débannir des utilisateurs."
-            )
-            return
-        
-        # Parser la commande
-        parts = message.content.split()
-        
-        if len(parts) < 2:
-            await message.channel.send(
+        if not args:
+            await send_message(
+                message.channel,
                 "📋 **Usage:** `!unban <@utilisateur>`\n"
-                "**Exemple:** `!unban @utilisateur`"
+                "**Exemple:** `!unban @utilisateur`",
+                priority=PRIORITY_MODERATION
             )
             return
         
         # Extraire l'utilisateur mentionné
-        user_mention = parts[1]
-        if not user_mention.startswith('<@') or not user_mention.endswith('>'):
-            await message.channel.send("❌ Merci de mentionner un utilisateur valide (@username).")
+        user_mention = args[0]
+        user_id = parse_user_mention(user_mention)
+        if user_id is None:
+            await send_message(message.channel, "❌ Merci de mentionner un utilisateur valide (@username).", priority=PRIORITY_MODERATION)
             return
         
-        # Extraire l'ID de l'utilisateur
-        user_id = user_mention[2:-1]  # Enlever <@ et >
-        if user_id.startswith('!'):
-            user_id = user_id[1:]  # Enlever le ! si présent
-        
         # Vérifier que l'utilisateur est banni
         if user_id not in banned_users:
-            await message.channel.send(f"❌ Cet utilisateur n'est pas banni.")
+            await send_message(message.channel, f"❌ Cet utilisateur n'est pas banni.", priority=PRIORITY_MODERATION)
             return
         
         # Retirer le ban
-        ban_info = banned_users[user_id]
-        del banned_users[user_id]
+        ban_info = remove_sanction('ban', user_id)
         
-        await message.channel.send(
+        await send_message(
+            message.channel,
             f"✅ **Utilisateur débanni**\n\n"
             f"👤 **Utilisateur:** {user_mention}\n"
             f"📝 **Raison du ban:** {ban_info['reason']}\n"
-            f"👮 **Débanni par:** {message.author.mention}"
+            f"👮 **Débanni par:** {message.author.mention}",
+            priority=PRIORITY_MODERATION
         )
         
-        print(f'[UNBAN] {message.author.name} a débanni {user_mention}')
+        log_event(logging.INFO, 'unban', f'{message.author.name} a débanni {user_mention}')
         
     except Exception as e:
-        print(f'[ERREUR] Unban: {e}')
-        await message.channel.send("❌ Une erreur est survenue lors du débannissement.")
+        log_event(logging.ERROR, 'erreur', f'Unban: {e}')
+        await send_message(message.channel, "❌ Une erreur est survenue lors du débannissement.", priority=PRIORITY_MODERATION)
 
 
-async def handle_warn(message):
+@command('warn', permission='admin', denied="Seuls les administrateurs peuvent avertir des utilisateurs.")
+async def handle_warn(message, args):
     """Commande !warn pour avertir un utilisateur"""
     try:
-        # Vérifier permissions admin
-        has_permission = await check_admin_permission(message.author.id)
-        
-        if not has_permission:
-            print(f'[WARN] {message.author.name} sans permissions')
-            await message.channel.send(
-                f"❌ {message.author.mention} Tu n'as pas la permission d'utiliser cette commande.\n"
-                f"Seuls les administrateurs peuvent avertir des utilisateurs."
-            )
-            return
-        
-        # Parser la commande
-        parts = message.content.split()
-        
-        if len(parts) < 3:
-            await message.channel.send(
+        if len(args) < 2:
+            await send_message(
+                message.channel,
                 "📋 **Usage:** `!warn <@utilisateur> <raison>`\n"
-                "**Exemple:** `!warn @utilisateur Spam répétitif`"
+                "**Exemple:** `!warn @utilisateur Spam répétitif`",
+                priority=PRIORITY_MODERATION
             )
             return
         
         # Extraire l'utilisateur mentionné
-        user_mention = parts[1]
-        if not user_mention.startswith('<@') or not user_mention.endswith('>'):
-            await message.channel.send("❌ Merci de mentionner un utilisateur valide (@username).")
+        user_mention = args[0]
+        user_id = parse_user_mention(user_mention)
+        if user_id is None:
+            await send_message(message.channel, "❌ Merci de mentionner un utilisateur valide (@username).", priority=PRIORITY_MODERATION)
             return
         
-        # Extraire l'ID de l'utilisateur
-        user_id = user_mention[2:-1]  # Enlever <@ et >
-        if user_id.startswith('!'):
-            user_id = user_id[1:]  # Enlever le ! si présent
-        
         # Extraire la raison
-        reason = ' '.join(parts[2:])
+        reason = ' '.join(args[1:])
         
         # Ajouter l'avertissement
         warning_count = add_warning(user_id, reason, message.author.name)
         
-        await message.channel.send(
+        await send_message(
+            message.channel,
             f"⚠️ **Utilisateur averti**\n\n"
             f"👤 **Utilisateur:** {user_mention}\n"
             f"📝 **Raison:** {reason}\n"
             f"📊 **Nombre total d'avertissements:** {warning_count}\n"
-            f"👮 **Averti par:** {message.author.mention}"
+            f"👮 **Averti par:** {message.author.mention}",
+            priority=PRIORITY_MODERATION
         )
         
-        print(f'[WARN] {message.author.name} a averti {user_mention} - Raison: {reason} (Total: {warning_count})')
+        log_event(logging.INFO, 'warn', f'{message.author.name} a averti {user_mention} - Raison: {reason} (Total: {warning_count})')
         
     except Exception as e:
-        print(f'[ERREUR] Warn: {e}')
-        await message.channel.send("❌ Une erreur est survenue lors de l'avertissement.")
+        log_event(logging.ERROR, 'erreur', f'Warn: {e}')
+        await send_message(message.channel, "❌ Une erreur est survenue lors de l'avertissement.", priority=PRIORITY_MODERATION)
 
 
-async def handle_warnings(message):
+@command('warnings', permission='admin', denied="Seuls les administrateurs peuvent consulter les avertissements.")
+async def handle_warnings(message, args):
     """Commande !warnings pour voir les avertissements d'un utilisateur"""
     try:
-        # Vérifier permissions admin
-        has_permission = await check_admin_permission(message.author.id)
-        
-        if not has_permission:
-            print(f'[WARNINGS] {message.author.name} sans permissions')
-            await message.channel.send(
-                f"❌ {message.author.mention} Tu n'as pas la permission d'utiliser cette commande.\n"
-                f"Seuls les administrateurs peuvent consulter les avertissements."
-            )
-            return
-        
-        # Parser la commande
-        parts = message.content.split()
-        
-        if len(parts) < 2:
-            await message.channel.send(
+        if not args:
+            await send_message(
+                message.channel,
                 "📋 **Usage:** `!warnings <@utilisateur>`\n"
-                "**Exemple:** `!warnings @utilisateur`"
+                "**Exemple:** `!warnings @utilisateur`",
+                priority=PRIORITY_MODERATION
             )
             return
         
         # Extraire l'utilisateur mentionné
-        user_mention = parts[1]
-        if not user_mention.startswith('<@') or not user_mention.endswith('>'):
-            await message.channel.send("❌ Merci de mentionner un utilisateur valide (@username).")
+        user_mention = args[0]
+        user_id = parse_user_mention(user_mention)
+        if user_id is None:
+            await send_message(message.channel, "❌ Merci de mentionner un utilisateur valide (@username).", priority=PRIORITY_MODERATION)
             return
         
-        # Extraire l'ID de l'utilisateur
-        user_id = user_mention[2:-1]  # Enlever <@ et >
-        if user_id.startswith('!'):
-            user_id = user_id[1:]  # Enlever le ! si présent
-        
         # Récupérer les avertissements
         warnings = get_user_warnings(user_id)
         
         if not warnings:
-            await message.channel.send(
+            await send_message(
+                message.channel,
                 f"📋 **Avertissements de {user_mention}**\n\n"
-                f"✅ Aucun avertissement pour cet utilisateur."
+                f"✅ Aucun avertissement pour cet utilisateur.",
+                priority=PRIORITY_MODERATION
             )
             return
         
@@ -1500,13 +4306,57 @@ async def handle_warnings(message):
             warnings_msg += f"📝 **Raison:** {warning['reason']}\n"
             warnings_msg += f"👮 **Par:** {warning['warned_by']}\n\n"
         
-        await message.channel.send(warnings_msg)
+        await send_message(message.channel, warnings_msg, priority=PRIORITY_MODERATION)
+        
+        log_event(logging.INFO, 'warnings', f'{message.author.name} a consulté les avertissements de {user_mention} ({len(warnings)} warnings)')
         
-        print(f'[WARNINGS] {message.author.name} a consulté les avertissements de {user_mention} ({len(warnings)} warnings)')
+    except Exception as e:
+        log_event(logging.ERROR, 'erreur', f'Warnings: {e}')
+        await send_message(message.channel, "❌ Une erreur est survenue lors de la consultation des avertissements.", priority=PRIORITY_MODERATION)
+
+
+@command('profile', permission='admin', denied="Seuls les administrateurs peuvent profiler le bot.")
+async def handle_profile(message, args):
+    """Commande !profile pour profiler la boucle d'événements"""
+    global active_profile
+    try:
+        try:
+            seconds = int(args[0]) if args else 0
+        except ValueError:
+            seconds = 0
+        if seconds < 1 or seconds > PROFILE_MAX_SECONDS:
+            await send_message(
+                message.channel,
+                f"📋 **Usage:** `!profile <secondes>` (1 à {PROFILE_MAX_SECONDS})\n"
+                "**Exemple:** `!profile 30`",
+                priority=PRIORITY_MODERATION
+            )
+            return
+        if active_profile is not None:
+            await send_message(message.channel, "⏳ Un profilage est déjà en cours.", priority=PRIORITY_MODERATION)
+            return
+        # Réservé avant le premier await : deux !profile rapprochés ne peuvent pas passer tous les deux
+        profiler = active_profile = cProfile.Profile()
+        try:
+            log_event(logging.INFO, 'profile', f'{message.author.name} lance un profilage de {seconds}s')
+            await send_message(message.channel, f"🔬 Profilage pendant {seconds}s...", priority=PRIORITY_MODERATION)
+            stats, path = await profile_event_loop(seconds, profiler)
+        finally:
+            active_profile = None
+        
+        lines = [
+            f"🔬 **Profil sur {seconds}s** · {stats.total_calls} appels",
+            f"**Top {PROFILE_TOP_N}** hors attente I/O (temps propre · cumulé · appels):"
+        ]
+        lines += format_profile_report(stats)
+        lines.append(f"💾 Profil complet : `{path}`")
+        report = "\n".join(lines)
+        await send_message(message.channel, report[:1990], priority=PRIORITY_MODERATION)
+        log_event(logging.INFO, 'profile', 'Profil enregistré', path=path, calls=stats.total_calls)
         
     except Exception as e:
-        print(f'[ERREUR] Warnings: {e}')
-        await message.channel.send("❌ Une erreur est survenue lors de la consultation des avertissements.")
+        log_event(logging.ERROR, 'erreur', f'Profile: {e}')
+        await send_message(message.channel, "❌ Une erreur est survenue pendant le profilage.", priority=PRIORITY_MODERATION)
 
 
 # ============================================================================
@@ -1553,7 +4403,15 @@ def main():
         input('Appuie sur Entrée pour quitter...')
         return
     
+    setup_logging()
     print('[INFO] Configuration validée')
+    
+    try:
+        open_moderation_store()
+        load_moderation_store()
+    except Exception as e:
+        print(f'[ERREUR] Base de modération indisponible ({MODERATION_DB_PATH}): {e}')
+    
     print('[INFO] Démarrage du bot...')
     print()
     
@@ -1572,6 +4430,15 @@ def main():
         print()
         print('[AIDE] Consulte docs/TROUBLESHOOTING_INVALIDSESSION.md')
         print('       si l\'erreur est "InvalidSession"')
+    finally:
+        try:
+            flush_moderation_store_sync()
+        except Exception as e:
+            print(f'[STORE] Flush final échoué: {e}')
+        close_probe_histories()
+        stop_loop_watchdog()
+        stop_event_recorder()
+        stop_logging()
 
 
 if __name__ == '__main__':